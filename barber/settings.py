@@ -28,7 +28,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv('SECRET_KEY')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# На сервере DEBUG=0 (и перед запуском manage.py collectstatic)
+DEBUG = os.getenv('DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = [
     "127.0.0.1",
@@ -62,12 +63,20 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Статика и загруженные файлы - до всего остального (core/serving.py)
+    'core.serving.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    # Повторные отправки записи и лимиты - после проверки CSRF, до БД (core/ratelimit.py)
+    # (повтор формы не должен расходовать лимит)
+    'core.ratelimit.DuplicateBookingMiddleware',
+    'core.ratelimit.RateLimitMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Кэш страниц для анонимных посетителей, должен быть последним
+    'core.middleware.PageCacheMiddleware',
 ]
 
 ROOT_URLCONF = 'barber.urls'
@@ -94,13 +103,119 @@ WSGI_APPLICATION = 'barber.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+# По умолчанию SQLite. PostgreSQL: DB_ENGINE=postgresql и DB_NAME, DB_USER,
+# DB_PASSWORD, DB_HOST, DB_PORT. Сравнить скорость записи: manage.py bench_booking
+DB_ENGINE = os.getenv('DB_ENGINE', 'sqlite')
+
+# Настройки соединения SQLite (выполняются при каждом подключении):
+# - WAL: чтение не ждет запись, а запись - чтение; писатель по-прежнему один;
+# - synchronous=NORMAL: в режиме WAL fsync при checkpoint, а не на каждый коммит
+#   (при сбое питания теряется последняя транзакция, но база не портится);
+# - mmap и кэш страниц - чтение без лишних системных вызовов
+SQLITE_PRAGMAS = [
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA mmap_size=134217728',
+    'PRAGMA cache_size=-20000',
+    'PRAGMA temp_store=MEMORY',
+]
+
+if DB_ENGINE == 'postgresql':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DB_NAME', 'barber'),
+            'USER': os.getenv('DB_USER', 'barber'),
+            'PASSWORD': os.getenv('DB_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', '127.0.0.1'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            # Постоянные соединения: без нового подключения на каждый запрос
+            'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {},
+        }
     }
+    # Пул соединений psycopg (DB_POOL_SIZE > 0) - для ASGI и потоков, где
+    # постоянные соединения не переиспользуются. Вместе с CONN_MAX_AGE нельзя
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '0'))
+    if DB_POOL_SIZE:
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {'min_size': 2, 'max_size': DB_POOL_SIZE, 'timeout': 10}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': BASE_DIR / 'db.sqlite3',
+            'CONN_MAX_AGE': int(os.getenv('CONN_MAX_AGE', '0')),
+            'OPTIONS': {
+                # Транзакция сразу берет блокировку на запись (BEGIN IMMEDIATE).
+                # При BEGIN по умолчанию вторая пишущая транзакция не ждет первую,
+                # а сразу падает с "database is locked" - например, при одновременной
+                # записи на одно время (core/scheduling.py)
+                'transaction_mode': 'IMMEDIATE',
+                # Сколько секунд ждать блокировку на запись, прежде чем вернуть "database is locked"
+                'timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '20')),
+                'init_command': ';'.join(SQLITE_PRAGMAS),
+            },
+            # Тестовая база - файл, а не память: в общей in-memory базе SQLite
+            # параллельные транзакции не ждут блокировку, а сразу падают,
+            # и тесты одновременного бронирования (core/tests.py) не работают
+            'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
+        }
+    }
+
+# Кэш (каталог главной страницы и т.п.)
+# По умолчанию - в памяти процесса. Если воркеров несколько, нужен общий бэкенд,
+# иначе сброс кэша в одном процессе не увидят остальные, например:
+# CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+# CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKEND,
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+        # Кэш в памяти по умолчанию хранит 300 ключей, а карты свободного
+        # времени (core/availability.py) - ключ на каждого мастера и день
+        **({'OPTIONS': {'MAX_ENTRIES': 20000}} if CACHE_BACKEND.endswith('LocMemCache') else {}),
+    },
+    # Готовые страницы для PageCacheMiddleware. Можно хранить в файлах:
+    # PAGE_CACHE_BACKEND=django.core.cache.backends.filebased.FileBasedCache
+    # PAGE_CACHE_LOCATION=/var/tmp/barber_pages
+    'pages': {
+        'BACKEND': os.getenv('PAGE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.getenv('PAGE_CACHE_LOCATION', 'pages'),
+    },
 }
 
+# Кэшировать каталог (мастера и услуги) на главной странице
+CATALOG_CACHE = True
+
+# Кэш страниц (core/middleware.py): какие адреса кэшировать для анонимов,
+# от версий каких данных зависит страница и сколько секунд ее хранить
+PAGE_CACHE_PATHS = ['/', '/thanks/', '/review/create/', '/reviews/']
+PAGE_CACHE_VERSIONS = ['catalog', 'ratings', 'reviews', 'availability']
+PAGE_CACHE_ALIAS = 'pages'
+PAGE_CACHE_TIMEOUT = 60 * 60
+
+# Ограничение частоты POST-запросов к формам (core/ratelimit.py).
+# Лимит - (capacity, period): capacity запросов подряд, дальше не чаще capacity за period секунд.
+# Для нагрузочных тестов отключается: RATELIMIT_ENABLED=0
+RATELIMIT_ENABLED = os.getenv('RATELIMIT_ENABLED', '1') == '1'
+# 'memory' - в памяти процесса, 'cache' - в общем кэше RATELIMIT_CACHE_ALIAS (несколько воркеров)
+RATELIMIT_BACKEND = os.getenv('RATELIMIT_BACKEND', 'memory')
+RATELIMIT_CACHE_ALIAS = 'default'
+# За nginx: RATELIMIT_IP_HEADER=HTTP_X_REAL_IP
+RATELIMIT_IP_HEADER = os.getenv('RATELIMIT_IP_HEADER')
+BOOKING_RATELIMIT = {'ip': (10, 60), 'phone': (3, 600)}
+RATELIMIT_RULES = {
+    '/': BOOKING_RATELIMIT,
+    '/book/': BOOKING_RATELIMIT,
+    '/review/create/': {'ip': (5, 600)},
+}
+# Одинаковые отправки формы записи в течение окна дают одну запись
+BOOKING_PATHS = ['/', '/book/']
+BOOKING_DEDUP_WINDOW = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -146,6 +261,25 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    # Без DEBUG: имена с хэшем содержимого и .br/.gz копии после collectstatic (core/storage.py)
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        if DEBUG else 'core.storage.CompressedManifestStaticFilesStorage',
+    },
+}
+
+# Кто отдает тело файлов статики и медиа (core/serving.py):
+# '' - сам Django, 'nginx' - X-Accel-Redirect, 'apache' - X-Sendfile
+SENDFILE = os.getenv('SENDFILE', '')
+# Внутренние location-ы nginx, например:
+#   location /protected/static/ { internal; alias /app/staticfiles/; }
+SENDFILE_LOCATIONS = {
+    'static': '/protected/static/',
+    'media': '/protected/media/',
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -182,6 +316,19 @@ JAZZMIN_SETTINGS = {
         "core.master": "fas fa-cut",               # Мастер (ножницы)
         "core.service": "fas fa-list-alt",         # Услуга
         "core.review": "fas fa-star",              # Отзыв (звезда)
+        "core.notification": "fas fa-paper-plane", # Очередь уведомлений
+        "core.dailymasterstat": "fas fa-chart-bar",  # Дневные сводки
+        "core.dailyservicestat": "fas fa-chart-pie",
+    },
+
+    # Панель аналитики по дневным сводкам (core/rollups.py)
+    "custom_links": {
+        "core": [{
+            "name": "Аналитика",
+            "url": "admin:core_dailymasterstat_dashboard",
+            "icon": "fas fa-chart-line",
+            "permissions": ["core.view_dailymasterstat"],
+        }],
     },
     
     # Добавляем связанные модели для удобной навигации
@@ -1,17 +1,19 @@
 from django.contrib import admin
 from django.urls import path
-from django.conf import settings
-from django.conf.urls.static import static
-from core import views
-from core.views import VisitListView, ReviewCreateView
+from core import api, views
+from core.views import VisitListView, ReviewCreateView, ReviewListView
 
+# Статику и медиа отдает core.serving.StaticFilesMiddleware
 urlpatterns = (
     [   path("", views.IndexView.as_view(), name="index"),
         path("admin/", admin.site.urls),
         path("thanks/", views.ThanksView.as_view(), name="thanks"),
         path('visits/', VisitListView.as_view(), name='visit_list'),
         path('review/create/', ReviewCreateView.as_view(), name='review_create'),
+        path('reviews/', ReviewListView.as_view(), name='reviews'),
+        path("api/catalog/", api.catalog, name="api_catalog"),
+        path("api/slots/", api.slots, name="api_slots"),
+        path("api/next-free/", api.next_free_slots, name="api_next_free"),
+        path("book/", views.AsyncBookingView.as_view(), name="book"),
     ]
-    + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
-    + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
 )
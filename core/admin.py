@@ -1,15 +1,26 @@
 
 from django.contrib import admin
-from .models import Master, Service, Visit, Review
-from django.db.models import Sum, Count, Q
+from django.db.models import FloatField, Value
+from django.db.models.functions import Cast, NullIf
+from .models import Master, Service, Visit, Review, Notification, ModerationVerdict, DailyMasterStat, DailyServiceStat, WorkingHours
 from django.contrib import messages
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from .exports import export_visits
+from .forms import VisitAdminForm
+from .pagination import KeysetChangeList
+from .ratings import set_review_status
+from .rollups import dashboard_data
+from django.template.response import TemplateResponse
+from django.urls import path
 
 # Функции-обработчики для массового изменения статусов отзывов
 
 
 def make_published(modeladmin, request, queryset):
     """Установить статус 'Опубликован' для выбранных отзывов"""
-    updated = queryset.update(status=0)
+    # Через set_review_status, чтобы обновились рейтинги мастеров
+    updated = set_review_status(queryset, 0)
     modeladmin.message_user(
         request, f"{updated} отзывов успешно опубликовано", messages.SUCCESS
     )
@@ -20,7 +31,8 @@ make_published.short_description = "Опубликовать выбранные
 
 def mark_as_unverified(modeladmin, request, queryset):
     """Установить статус 'Не проверен' для выбранных отзывов"""
-    updated = queryset.update(status=1)
+    # Через set_review_status, чтобы обновились рейтинги мастеров
+    updated = set_review_status(queryset, 1)
     modeladmin.message_user(
         request, f"{updated} отзывов отмечено как непроверенные", messages.SUCCESS
     )
@@ -31,7 +43,8 @@ mark_as_unverified.short_description = "Отметить как непровер
 
 def approve_reviews(modeladmin, request, queryset):
     """Установить статус 'Одобрен' для выбранных отзывов"""
-    updated = queryset.update(status=2)
+    # Через set_review_status, чтобы обновились рейтинги мастеров
+    updated = set_review_status(queryset, 2)
     modeladmin.message_user(request, f"{updated} отзывов одобрено", messages.SUCCESS)
 
 
@@ -40,13 +53,29 @@ approve_reviews.short_description = "Одобрить выбранные отз
 
 def reject_reviews(modeladmin, request, queryset):
     """Установить статус 'Отклонен' для выбранных отзывов"""
-    updated = queryset.update(status=3)
+    # Через set_review_status, чтобы обновились рейтинги мастеров
+    updated = set_review_status(queryset, 3)
     modeladmin.message_user(request, f"{updated} отзывов отклонено", messages.SUCCESS)
 
 
 reject_reviews.short_description = "Отклонить выбранные отзывы"
 
 
+def export_visits_action(fmt):
+    """Экшен выгрузки выбранных записей (с учетом фильтров) в файл fmt"""
+
+    def action(modeladmin, request, queryset):
+        content, content_type = export_visits(queryset, fmt)
+        response = StreamingHttpResponse(content, content_type=content_type)
+        filename = f"visits-{timezone.localdate():%Y-%m-%d}.{fmt}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+    action.__name__ = f"export_{fmt}"
+    action.short_description = f"Выгрузить в {fmt.upper()}"
+    return action
+
+
 # Определяем кастомные фильтры
 class PriceRangeFilter(admin.SimpleListFilter):
     # Заголовок фильтра в боковой панели
@@ -64,25 +93,8 @@ class PriceRangeFilter(admin.SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
-        # Логика фильтрации
-        if self.value() == "low":
-            # Используем подзапрос для вычисления суммы цен услуг
-            # Аннотируем каждую запись суммой цен всех выбранных услуг
-            return queryset.annotate(total_price=Sum("services__price")).filter(
-                total_price__lte=1000
-            )
-
-        if self.value() == "medium":
-            return queryset.annotate(total_price=Sum("services__price")).filter(
-                total_price__gt=1000, total_price__lte=3000
-            )
-
-        if self.value() == "high":
-            return queryset.annotate(total_price=Sum("services__price")).filter(
-                total_price__gt=3000
-            )
-
-        return queryset
+        # Логика фильтрации в VisitQuerySet.price_range, ее же использует выгрузка
+        return queryset.price_range(self.value())
 
 
 class RegularClientsFilter(admin.SimpleListFilter):
@@ -100,32 +112,8 @@ class RegularClientsFilter(admin.SimpleListFilter):
         )
 
     def queryset(self, request, queryset):
-        # Логика фильтрации
-        if self.value() == "yes":
-            # Получаем телефоны клиентов, у которых 3 и более записей
-            regular_phones = (
-                Visit.objects.values("phone")
-                .annotate(visit_count=Count("id"))
-                .filter(visit_count__gte=3)
-                .values_list("phone", flat=True)
-            )
-
-            # Фильтруем записи по этим телефонам
-            return queryset.filter(phone__in=regular_phones)
-
-        if self.value() == "no":
-            # Получаем телефоны клиентов с менее чем 3 записями
-            non_regular_phones = (
-                Visit.objects.values("phone")
-                .annotate(visit_count=Count("id"))
-                .filter(visit_count__lt=3)
-                .values_list("phone", flat=True)
-            )
-
-            # Фильтруем записи по этим телефонам
-            return queryset.filter(phone__in=non_regular_phones)
-
-        return queryset
+        # Логика фильтрации в VisitQuerySet.regular_clients, ее же использует выгрузка
+        return queryset.regular_clients(self.value())
 
 
 # Определяем классы инлайнов
@@ -147,20 +135,48 @@ class VisitInline(admin.TabularInline):
     ordering = ("-created_at",)
 
 
+class WorkingHoursInline(admin.TabularInline):
+    model = WorkingHours
+    extra = 0
+    max_num = 7
+
+
 @admin.register(Master)
 class MasterAdmin(admin.ModelAdmin):
     # Отображаемые поля в списке записей (порядок учитывается)
-    list_display = ("first_name", "last_name", "phone")
+    list_display = ("first_name", "last_name", "phone", "get_rating", "get_review_count")
+    # Рейтинг хранится в MasterRating (core/ratings.py), подтягиваем его тем же запросом
+    list_select_related = ("rating_stats",)
+
+    def get_queryset(self, request):
+        # Средняя оценка для сортировки; без видимых отзывов (count=0) - NULL
+        return super().get_queryset(request).annotate(
+            rating_average=Cast("rating_stats__total", FloatField()) / NullIf("rating_stats__count", Value(0))
+        )
+
+    def get_rating(self, obj):
+        rating = getattr(obj, "rating_stats", None)
+        return rating.average if rating and rating.count else "-"
+
+    get_rating.short_description = "Рейтинг"
+    get_rating.admin_order_field = "rating_average"
+
+    def get_review_count(self, obj):
+        rating = getattr(obj, "rating_stats", None)
+        return rating.count if rating else 0
+
+    get_review_count.short_description = "Отзывов"
+    get_review_count.admin_order_field = "rating_stats__count"
 
     # inlines - добавляем наши инлайны
-    inlines = [VisitInline, ReviewInline]
+    inlines = [WorkingHoursInline, VisitInline, ReviewInline]
     filter_horizontal = ("services",)  # улучшенный виджет для ManyToMany поля
 
 
 @admin.register(Service)
 class ServiceAdmin(admin.ModelAdmin):
     # Отображаемые поля в списке записей (порядок учитывается)
-    list_display = ("name", "price")
+    list_display = ("name", "price", "duration")
     # Поля которые будут учитываться в поиске
     search_fields = ("name", "description")
     # Кликабельные ссылки на поля
@@ -172,7 +188,7 @@ class ServiceAdmin(admin.ModelAdmin):
 @admin.register(Review)
 class ReviewAdmin(admin.ModelAdmin):
     # Эти поля будут закрыты на редактирование для ВСЕХ!
-    readonly_fields = ("text", "rating", "master")
+    readonly_fields = ("text", "rating", "master", "moderated_at")
     # Поля которые будут учитываться в поиске
     search_fields = ("text", "name", "master")
     # Отображаемые столбцы в таблице
@@ -191,22 +207,28 @@ class ReviewAdmin(admin.ModelAdmin):
 # Visit
 @admin.register(Visit)
 class VisitAdmin(admin.ModelAdmin):
+    # Проверка времени мастера при смене статуса или мастера
+    form = VisitAdminForm
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("master")
+
+    # Переход по страницам по курсору (created_at, id) вместо OFFSET
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    keyset_ordering = ("created_at", "id")
 
     # Метод для кастомного столбца
     # Добавляем custom метод для отображения общей суммы
     def get_total_price(self, obj):
-        # Вычисляем сумму всех услуг для данного визита
-        total = obj.services.aggregate(total=Sum("price"))["total"]
-        # Проверяем, что сумма не None (если услуг нет)
-        if total:
-            # Форматируем с символом рубля
-            return f"{total:.2f} ₽"
-        return "0.00 ₽"
+        # Сумма хранится в записи (Visit.total_price), дополнительных запросов нет
+        return f"{obj.total_price:.2f} ₽"
 
     # Задаем название столбца в админке
     get_total_price.short_description = "Общая сумма"
     # Включаем возможность сортировки по этому полю
-    get_total_price.admin_order_field = "services__price"
+    get_total_price.admin_order_field = "total_price"
 
     # Поля которые будут учитываться в поиске
     search_fields = ("phone", "name", "comment", "services__name")
@@ -215,10 +237,14 @@ class VisitAdmin(admin.ModelAdmin):
         "name",
         "phone",
         "created_at",
+        "start_at",
         "status",
         "master",
         "get_total_price",
     )
+    # Время меняется только через бронирование (core/scheduling.py),
+    # иначе расписание мастера разойдется с записями
+    readonly_fields = ("start_at",)
     # Сортировка по дате
     ordering = ("created_at", "master")
     # Фильтры. По услуге, мастеру, клиенту и дате
@@ -228,3 +254,83 @@ class VisitAdmin(admin.ModelAdmin):
 
     # Делаем поле status редактируемым прямо в списке
     list_editable = ("status",)
+    # Каждая строка списка - форма со своим виджетом статуса, ее рендер
+    # дороже запросов к БД: 100 строк на странице рендерятся в несколько раз дольше
+    list_per_page = 25
+
+    def get_changelist_form(self, request, **kwargs):
+        # Статус в списке проверяется той же формой, что и на странице записи
+        return super().get_changelist_form(request, form=VisitAdminForm, **kwargs)
+
+    # Выгрузка: выберите записи или "Выбрать все" - учитываются текущие фильтры
+    actions = [export_visits_action("csv"), export_visits_action("xlsx")]
+
+
+# Очередь уведомлений в Telegram
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ("created_at", "status", "attempts", "next_attempt_at", "sent_at")
+    list_filter = ("status",)
+    readonly_fields = ("text", "chat_id", "attempts", "last_error", "created_at", "sent_at")
+    ordering = ("-created_at",)
+
+
+# Кэш вердиктов автомодерации. Ошибочный вердикт можно удалить,
+# тогда такой текст снова уйдет на проверку в Mistral
+@admin.register(ModerationVerdict)
+class ModerationVerdictAdmin(admin.ModelAdmin):
+    list_display = ("text_hash", "verdict", "created_at")
+    list_filter = ("verdict",)
+    readonly_fields = ("text_hash", "verdict", "created_at")
+
+
+# Дневные сводки (core/rollups.py) заполняются автоматически, руками не редактируются
+class DailyStatAdmin(admin.ModelAdmin):
+    list_display_fields = ("visits", "completed", "cancelled", "revenue")
+    date_hierarchy = "day"
+    ordering = ("-day",)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(DailyMasterStat)
+class DailyMasterStatAdmin(DailyStatAdmin):
+    list_display = ("day", "master") + DailyStatAdmin.list_display_fields
+    list_filter = ("master",)
+    list_select_related = ("master",)
+
+    def get_urls(self):
+        # Панель аналитики: /admin/core/dailymasterstat/dashboard/
+        return [
+            path(
+                "dashboard/",
+                self.admin_site.admin_view(self.dashboard_view),
+                name="core_dailymasterstat_dashboard",
+            ),
+        ] + super().get_urls()
+
+    def dashboard_view(self, request):
+        try:
+            days = min(max(int(request.GET.get("days", 30)), 1), 366)
+        except ValueError:
+            days = 30
+        context = {
+            **self.admin_site.each_context(request),
+            "title": "Аналитика",
+            "opts": self.model._meta,
+            "days": days,
+            "periods": (7, 30, 90, 365),
+            "data": dashboard_data(days),
+        }
+        return TemplateResponse(request, "admin/core/dashboard.html", context)
+
+
+@admin.register(DailyServiceStat)
+class DailyServiceStatAdmin(DailyStatAdmin):
+    list_display = ("day", "service") + DailyStatAdmin.list_display_fields
+    list_filter = ("service",)
+    list_select_related = ("service",)
@@ -0,0 +1,90 @@
+"""
+Денормализованные значения и их пересчет.
+
+- Visit.total_price - сумма цен услуг записи
+- ClientStats.visit_count - количество записей на один телефон (Visit.phone_digits)
+
+Сигналы (core/signals.py) пересчитывают только затронутые записи и телефоны,
+rebuild_* пересчитывают все целиком (миграция, manage.py check_denormalized --fix).
+"""
+from django.db.models import Count, DecimalField, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+from .models import ClientStats, Visit
+
+
+def services_total():
+    """Подзапрос: сумма цен услуг записи OuterRef('pk')"""
+    total = (
+        Visit.services.through.objects.filter(visit=OuterRef("pk"))
+        .values("visit")
+        .annotate(total=Sum("service__price"))
+        .values("total")
+    )
+    return Coalesce(
+        Subquery(total), 0, output_field=DecimalField(max_digits=10, decimal_places=2)
+    )
+
+
+def refresh_visit_totals(visits):
+    """Пересчитать total_price для QuerySet записей одним UPDATE"""
+    return visits.update(total_price=services_total())
+
+
+def refresh_client_stats(phones):
+    """Пересчитать счетчики записей для указанных телефонов (только цифры)"""
+    phones = {phone for phone in phones if phone}
+    if not phones:
+        return
+    counts = dict(
+        Visit.objects.filter(phone_digits__in=phones)
+        .values("phone_digits")
+        .annotate(visit_count=Count("id"))
+        .values_list("phone_digits", "visit_count")
+    )
+    # Телефоны, у которых записей не осталось, удаляем из статистики
+    ClientStats.objects.filter(phone__in=phones - set(counts)).delete()
+    ClientStats.objects.bulk_create(
+        [ClientStats(phone=phone, visit_count=count) for phone, count in counts.items()],
+        update_conflicts=True,
+        unique_fields=["phone"],
+        update_fields=["visit_count"],
+    )
+
+
+def rebuild_client_stats(batch_size=5000, using="default"):
+    stats = ClientStats.objects.using(using)
+    stats.all().delete()
+    rows = Visit.objects.using(using).values_list("phone_digits").annotate(visit_count=Count("id")).order_by()
+    # Пачками, чтобы не держать в памяти статистику всех телефонов сразу
+    batch = []
+    for phone, visit_count in rows.iterator(chunk_size=batch_size):
+        batch.append(ClientStats(phone=phone, visit_count=visit_count))
+        if len(batch) >= batch_size:
+            stats.bulk_create(batch)
+            batch = []
+    stats.bulk_create(batch)
+
+
+def wrong_visit_totals():
+    """Записи, у которых сохраненная сумма не совпадает с суммой услуг"""
+    return Visit.objects.annotate(actual=services_total()).filter(~Q(total_price=F("actual")))
+
+
+def wrong_client_stats():
+    """
+    Телефоны, для которых счетчик в ClientStats не совпадает с количеством записей:
+    {телефон: (в ClientStats, на самом деле)}
+    """
+    actual = dict(
+        Visit.objects.values("phone_digits")
+        .annotate(visit_count=Count("id"))
+        .order_by()
+        .values_list("phone_digits", "visit_count")
+    )
+    stored = dict(ClientStats.objects.values_list("phone", "visit_count"))
+    return {
+        phone: (stored.get(phone, 0), actual.get(phone, 0))
+        for phone in set(actual) | set(stored)
+        if stored.get(phone, 0) != actual.get(phone, 0)
+    }
@@ -0,0 +1,125 @@
+"""
+JSON API для виджета записи: каталог (мастера, услуги и какие услуги
+оказывает каждый мастер) и свободное время мастеров (core/scheduling.py,
+core/availability.py).
+
+Ответ собирается из values()-запросов, сжимается (gzip, brotli - если
+установлен пакет brotli) и хранится в кэше под версией каталога
+(core.catalog.get_version). ETag - та же версия плюс кодировка ответа
+(сжатые и несжатые байты - разные представления), поэтому повторный запрос
+с If-None-Match получает 304, не обращаясь к БД.
+"""
+import gzip
+import hashlib
+import json
+
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import HttpResponse, HttpResponseBadRequest, HttpResponseNotModified, JsonResponse
+from django.utils import timezone
+from django.utils.cache import patch_vary_headers
+from django.views.decorators.http import require_safe
+
+from .availability import next_free
+from .catalog import get_catalog, get_version
+from .models import Master, Service
+from .scheduling import DAYS_AHEAD, free_slots
+from .serving import accepted_encodings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Клиенты могут использовать ответ без перепроверки минуту,
+# дальше - перепроверка по ETag
+CACHE_CONTROL = "public, max-age=60, must-revalidate"
+
+
+def load_catalog_data():
+    photo_storage = Master._meta.get_field("photo").storage
+    masters = list(Master.objects.values("id", "first_name", "last_name", "photo"))
+    for master in masters:
+        master["photo"] = photo_storage.url(master["photo"]) if master["photo"] else None
+    services = list(Service.objects.values("id", "name", "description", "price", "duration"))
+    master_services = {}
+    for master_id, service_id in Master.services.through.objects.values_list(
+        "master_id", "service_id"
+    ).order_by("master_id", "service_id"):
+        master_services.setdefault(str(master_id), []).append(service_id)
+    return {"masters": masters, "services": services, "master_services": master_services}
+
+
+def get_catalog_body(version):
+    """Тело ответа в разных кодировках: {'identity': ..., 'gzip': ..., 'br': ...}"""
+    key = f"api:catalog:{version}"
+    body = cache.get(key)
+    if body is None:
+        data = json.dumps(load_catalog_data(), cls=DjangoJSONEncoder, ensure_ascii=False).encode()
+        body = {"identity": data, "gzip": gzip.compress(data)}
+        if brotli is not None:
+            body["br"] = brotli.compress(data)
+        cache.set(key, body, None)
+    return body
+
+
+def choose_encoding(request):
+    # Учитывает q=0 ("br;q=0" - brotli не принимается), как и отдача статики
+    accepted = accepted_encodings(request)
+    for encoding in ("br", "gzip"):
+        if encoding in accepted and (encoding != "br" or brotli is not None):
+            return encoding
+    return "identity"
+
+
+def catalog_etag(version, encoding):
+    digest = hashlib.md5(f"api:catalog:{version}".encode()).hexdigest()
+    return f'"{digest}"' if encoding == "identity" else f'"{digest}-{encoding}"'
+
+
+@require_safe
+def catalog(request):
+    version = get_version("catalog")
+    encoding = choose_encoding(request)
+    etag = catalog_etag(version, encoding)
+
+    if etag in [tag.strip() for tag in request.headers.get("If-None-Match", "").split(",")]:
+        response = HttpResponseNotModified()
+    else:
+        body = get_catalog_body(version)
+        if encoding not in body:
+            # Тело в кэше собрал процесс без пакета brotli
+            encoding = "identity"
+            etag = catalog_etag(version, encoding)
+        response = HttpResponse(body[encoding], content_type="application/json")
+        if encoding != "identity":
+            response["Content-Encoding"] = encoding
+    response["ETag"] = etag
+    response["Cache-Control"] = CACHE_CONTROL
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+@require_safe
+def slots(request):
+    """Свободное время мастера: ?master=1&services=2&services=3[&days=14]"""
+    try:
+        master_id = int(request.GET["master"])
+        service_ids = [int(pk) for pk in request.GET.getlist("services")]
+        days = min(int(request.GET.get("days", DAYS_AHEAD)), DAYS_AHEAD)
+    except (KeyError, ValueError):
+        return HttpResponseBadRequest("master, services, days - числа")
+    starts = free_slots(master_id, service_ids, days=days)
+    return JsonResponse({"slots": [timezone.localtime(start).isoformat() for start in starts]})
+
+
+@require_safe
+def next_free_slots(request):
+    """Ближайшее свободное время каждого мастера, из кэша (core/availability.py)"""
+    masters = [master.pk for master in get_catalog()["masters"]]
+    return JsonResponse({
+        "masters": {
+            str(master_id): timezone.localtime(start).isoformat() if start else None
+            for master_id, start in next_free(masters).items()
+        }
+    })
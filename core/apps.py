@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class CoreConfig(AppConfig):
@@ -6,4 +7,8 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
-        import core.signals
\ No newline at end of file
+        import core.signals
+        from core.search import ensure_search_indexes
+
+        # Индексы для поиска по имени (FTS5 / pg_trgm), см. core/search.py
+        post_migrate.connect(ensure_search_indexes, sender=self)
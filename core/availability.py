@@ -0,0 +1,205 @@
+"""
+Кэш свободного времени мастеров: битовая карта на каждый день.
+
+Карта дня (мастер, день) - пара (начало рабочего дня, целое число), где бит i
+равен 1, если i-й интервал рабочего дня (core/scheduling.py, SLOT_MINUTES минут)
+свободен. Рабочий день - 40-50 бит, выходной - (None, 0). Карты хранятся в кэше
+под версией 'schedule', которую сбрасывает изменение рабочего времени мастеров.
+
+Бронирование и освобождение времени отправляют сигнал slots_changed, и после
+коммита транзакции карты затронутых дней собираются заново одним запросом
+по индексу (master, start) - как дневные сводки в core/rollups.py. Карта
+всегда строится из БД, поэтому гонка двух обновлений не оставляет в кэше
+неверных данных.
+
+Ближайшее свободное время мастера (next_free) тоже хранится в кэше и
+сбрасывается вместе с картами мастера, а также при изменении каталога: оно
+зависит от длительности самой короткой услуги. Главная страница и API
+получают его одним get_many, а на холодном кэше карты всех мастеров
+собираются двумя запросами. manage.py warm_availability заполняет кэш при запуске.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import bump_version, get_catalog, get_version
+from .models import VisitSlot, WorkingHours
+from .scheduling import DAYS_AHEAD, SLOT, day_slots, visit_length, working_period
+
+CACHE_TIMEOUT = 60 * 60 * 24 * 7
+DAY_OFF = (None, 0)
+
+
+def map_key(version, master_id, day):
+    return f"availability:{version}:{master_id}:{day:%Y%m%d}"
+
+
+def next_version():
+    return f"{get_version('schedule')}:{get_version('catalog')}"
+
+
+def next_key(version, master_id):
+    """version - next_version(): ближайшее время зависит и от расписания, и от длительностей услуг"""
+    return f"availability:next:{version}:{master_id}"
+
+
+def build_maps(master_ids, first_day, days):
+    """{(id мастера, день): карта дня} по рабочему времени и VisitSlot, два запроса на всех мастеров"""
+    hours = defaultdict(dict)
+    for row in WorkingHours.objects.filter(master_id__in=master_ids):
+        hours[row.master_id][row.weekday] = row
+    start = timezone.make_aware(datetime.combine(first_day, time.min))
+    busy = set(
+        VisitSlot.objects.filter(
+            master_id__in=master_ids, start__gte=start, start__lt=start + timedelta(days=days)
+        ).values_list('master_id', 'start')
+    )
+    maps = {}
+    for master_id in master_ids:
+        for offset in range(days):
+            day = first_day + timedelta(days=offset)
+            row = hours[master_id].get(day.weekday())
+            if row is None:
+                maps[master_id, day] = DAY_OFF
+                continue
+            day_start, day_end = working_period(day, row)
+            bits = 0
+            for i, slot in enumerate(day_slots(day_start, day_end)):
+                if (master_id, slot) not in busy:
+                    bits |= 1 << i
+            maps[master_id, day] = (day_start, bits)
+    return maps
+
+
+def store_maps(maps):
+    version = get_version('schedule')
+    cache.set_many(
+        {map_key(version, master_id, day): value for (master_id, day), value in maps.items()}, CACHE_TIMEOUT
+    )
+
+
+def get_maps(master_ids, first_day, days):
+    """
+    {id мастера: карты дней подряд}. Мастера, чьих карт нет в кэше, собираются
+    из БД вместе - два запроса на всех, а не на каждого
+    """
+    version = get_version('schedule')
+    day_list = [first_day + timedelta(days=offset) for offset in range(days)]
+    keys = {
+        master_id: [map_key(version, master_id, day) for day in day_list] for master_id in master_ids
+    }
+    cached = cache.get_many([key for master_keys in keys.values() for key in master_keys])
+    result, missing = {}, []
+    for master_id, master_keys in keys.items():
+        if all(key in cached for key in master_keys):
+            result[master_id] = [cached[key] for key in master_keys]
+        else:
+            missing.append(master_id)
+    if missing:
+        maps = build_maps(missing, first_day, days)
+        store_maps(maps)
+        for master_id in missing:
+            result[master_id] = [maps[master_id, day] for day in day_list]
+    return result
+
+
+def first_free(day_start, bits, length, now):
+    """Начало первых length свободных интервалов подряд после now, или None"""
+    runs = bits
+    for shift in range(1, length):
+        runs &= bits >> shift
+    if now >= day_start:
+        # Интервалы, которые уже начались, не предлагаем
+        passed = (now - day_start) // SLOT + 1
+        runs = runs >> passed << passed
+    if not runs:
+        return None
+    return day_start + SLOT * ((runs & -runs).bit_length() - 1)
+
+
+def shortest_length():
+    """Сколько интервалов занимает самая короткая услуга"""
+    return min((visit_length([service.pk]) for service in get_catalog()['services']), default=1)
+
+
+def find_next_free(maps, now, length):
+    """Ближайшее свободное время по картам дней мастера"""
+    for day_start, bits in maps:
+        if bits:
+            start = first_free(day_start, bits, length, now)
+            if start is not None:
+                return start
+    return None
+
+
+def next_free(master_ids, now=None):
+    """{id мастера: ближайшее свободное время или None} на DAYS_AHEAD дней вперед"""
+    now = now or timezone.now()
+    version = next_version()
+    keys = {next_key(version, master_id): master_id for master_id in master_ids}
+    cached = cache.get_many(keys)
+    result, stale = {}, {}
+    for key, master_id in keys.items():
+        # В кэше (время, действительно до): найденное время устаревает, когда наступает,
+        # "свободного времени нет" - в конце дня, когда в горизонт входит новый день
+        entry = cached.get(key)
+        if entry is not None and now < entry[1]:
+            result[master_id] = entry[0]
+        else:
+            stale[key] = master_id
+    if not stale:
+        return result
+    length = shortest_length()
+    maps = get_maps(list(stale.values()), timezone.localdate(now), DAYS_AHEAD)
+    tomorrow = next_day_start(now)
+    entries = {}
+    for key, master_id in stale.items():
+        start = find_next_free(maps[master_id], now, length)
+        entries[key] = (start, start or tomorrow)
+        result[master_id] = start
+    cache.set_many(entries, CACHE_TIMEOUT)
+    return result
+
+
+def next_day_start(now):
+    return timezone.make_aware(datetime.combine(timezone.localdate(now) + timedelta(days=1), time.min))
+
+
+def valid_until(free, now=None):
+    """
+    Когда результат next_free устареет: наступит самое раннее найденное время
+    или, если у кого-то времени нет, начнется новый день
+    """
+    now = now or timezone.now()
+    return min((start or next_day_start(now) for start in free.values()), default=None)
+
+
+def refresh_days(master_id, days):
+    """Собрать заново карты дней мастера и сбросить его ближайшее время"""
+    maps = {}
+    for day in days:
+        maps.update(build_maps([master_id], day, 1))
+    store_maps(maps)
+    cache.delete(next_key(next_version(), master_id))
+    bump_version('availability')
+
+
+def refresh_on_commit(master_id, days):
+    """refresh_days после коммита: пока транзакция не завершена, другие процессы видят старые данные"""
+    days = set(days)
+    transaction.on_commit(lambda: refresh_days(master_id, days))
+
+
+def warm(master_ids, days=DAYS_AHEAD, chunk_size=50):
+    """Заполнить кэш карт и ближайшего времени для мастеров на days дней вперед"""
+    today = timezone.localdate()
+    master_ids = list(master_ids)
+    for start in range(0, len(master_ids), chunk_size):
+        chunk = master_ids[start:start + chunk_size]
+        store_maps(build_maps(chunk, today, days))
+        cache.delete_many([next_key(next_version(), master_id) for master_id in chunk])
+        next_free(chunk)
+    bump_version('availability')
@@ -0,0 +1,50 @@
+"""
+Вспомогательные функции для команд-бенчмарков (manage.py bench_*).
+
+Бенчмарки никогда не трогают рабочую базу: данные создаются
+во временной тестовой БД, которая удаляется после замера.
+"""
+import time
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+# Данные для бенчмарков - тот же генератор, что у manage.py seed_scale (core/seeding.py)
+from .seeding import seed_catalog, seed_reviews, seed_visits
+
+
+@contextmanager
+def temporary_database():
+    """Создать пустую тестовую БД с примененными миграциями и удалить ее после"""
+    setup_test_environment()
+    old_name = connection.settings_dict["NAME"]
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+
+def measure(func, repeat):
+    """Выполнить func repeat раз, вернуть (среднее время в мс, операций в секунду)"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    elapsed = time.perf_counter() - start
+    return elapsed / repeat * 1000, repeat / elapsed
+
+
+def count_queries(func):
+    """Сколько SQL-запросов выполняет func (через execute_wrapper, а не queries_log:
+    тестовый клиент сбрасывает queries_log в начале каждого запроса)"""
+    counter = []
+
+    def wrapper(execute, sql, params, many, context):
+        counter.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(wrapper):
+        func()
+    return len(counter)
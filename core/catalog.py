@@ -0,0 +1,58 @@
+"""
+Кэш каталога для главной страницы: мастера и услуги.
+
+Каталог меняется редко, поэтому списки мастеров и услуг хранятся в кэше
+под ключом с номером версии. Сигналы (core/signals.py) увеличивают версию
+при любом изменении Master/Service, и следующий запрос собирает каталог заново.
+В остальное время главная страница не делает ни одного запроса к каталогу.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .models import Master, Service
+
+
+def get_version(name="catalog"):
+    """
+    Версия набора данных - время последнего изменения (unix time).
+    Если в кэше версии нет (перезапуск, вытеснение), считаем, что данные
+    изменились только что: так старые ETag клиентов гарантированно не совпадут.
+    """
+    key = f"version:{name}"
+    version = cache.get(key)
+    if version is None:
+        version = time.time()
+        # add, а не set: если параллельный процесс успел записать версию, берем ее
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(name="catalog"):
+    """Отметить изменение данных: версия растет строго монотонно"""
+    key = f"version:{name}"
+    version = max(time.time(), (cache.get(key) or 0) + 0.001)
+    cache.set(key, version, None)
+    return version
+
+
+def get_catalog():
+    """Словарь {'masters': [...], 'services': [...]} из кэша или из БД"""
+    if not getattr(settings, "CATALOG_CACHE", True):
+        return load_catalog()
+    key = f"catalog:{get_version()}"
+    catalog = cache.get(key)
+    if catalog is None:
+        catalog = load_catalog()
+        # Старые версии не удаляем явно: их вытеснит сам бэкенд кэша
+        cache.set(key, catalog, None)
+    return catalog
+
+
+def load_catalog():
+    return {
+        "masters": list(Master.objects.all()),
+        "services": list(Service.objects.all()),
+    }
@@ -0,0 +1,168 @@
+"""
+Потоковая выгрузка записей в CSV и XLSX.
+
+Записи читаются через QuerySet.iterator(chunk_size): в памяти одновременно
+только одна пачка, услуги для нее подгружаются одним запросом
+(prefetch_related работает с iterator по пачкам). Файл отдается частями
+через генератор, поэтому выгрузка за год не упирается ни в память,
+ни в таймаут ответа.
+
+XLSX - zip-архив с XML-листами. Лист пишется в архив построчно, строки
+хранятся как inline-строки, без таблицы sharedStrings, которую пришлось бы
+собирать целиком в памяти.
+"""
+import csv
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Service
+
+CHUNK_SIZE = 2000
+
+COLUMNS = ["Дата", "Имя", "Телефон", "Статус", "Мастер", "Услуги", "Сумма"]
+# С этих символов Excel начинает формулу; имя и телефон вводят посетители
+FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def export_rows(queryset, chunk_size=CHUNK_SIZE):
+    """Строки выгрузки: списки значений в порядке COLUMNS"""
+    queryset = (
+        queryset.select_related("master")
+        .prefetch_related(Prefetch("services", queryset=Service.objects.only("name").order_by("name")))
+        .order_by("created_at", "id")
+    )
+    statuses = dict(queryset.model.STATUS_CHOICES)
+    for visit in queryset.iterator(chunk_size=chunk_size):
+        yield [
+            timezone.localtime(visit.created_at).strftime("%d.%m.%Y %H:%M"),
+            visit.name,
+            visit.phone,
+            statuses.get(visit.status, visit.status),
+            str(visit.master),
+            ", ".join(service.name for service in visit.services.all()),
+            visit.total_price,
+        ]
+
+
+class Buffer:
+    """Файлоподобный объект, из которого генератор забирает накопленные данные"""
+
+    def __init__(self):
+        self.chunks = []
+
+    def write(self, data):
+        self.chunks.append(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b"".join(chunk.encode() if isinstance(chunk, str) else chunk for chunk in self.chunks)
+        self.chunks = []
+        return data
+
+
+def csv_safe(value):
+    """Текст, похожий на формулу, с апострофом впереди: Excel покажет его как текст"""
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_stream(rows, flush_every=500):
+    buffer = Buffer()
+    writer = csv.writer(buffer)
+    # BOM, чтобы Excel открыл файл в UTF-8
+    buffer.write("﻿")
+    writer.writerow(COLUMNS)
+    for number, row in enumerate(rows, start=1):
+        writer.writerow([csv_safe(value) for value in row])
+        if number % flush_every == 0:
+            yield buffer.take()
+    yield buffer.take()
+
+
+XLSX_FILES = {
+    "[Content_Types].xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        "</Types>"
+    ),
+    "_rels/.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+        'Target="xl/workbook.xml"/>'
+        "</Relationships>"
+    ),
+    "xl/workbook.xml": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Записи" sheetId="1" r:id="rId1"/></sheets>'
+        "</workbook>"
+    ),
+    "xl/_rels/workbook.xml.rels": (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+        'Target="worksheets/sheet1.xml"/>'
+        "</Relationships>"
+    ),
+}
+
+
+def xlsx_cell(value):
+    if isinstance(value, (int, float)) or hasattr(value, "as_tuple"):
+        return f"<c><v>{value}</v></c>"
+    return f'<c t="inlineStr"><is><t>{escape(str(value))}</t></is></c>'
+
+
+def xlsx_row(values):
+    return "<row>" + "".join(xlsx_cell(value) for value in values) + "</row>"
+
+
+def xlsx_stream(rows, flush_every=500):
+    buffer = Buffer()
+    # Буфер не поддерживает seek: zipfile пишет размеры после данных (data descriptor)
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_FILES.items():
+            archive.writestr(name, content)
+        yield buffer.take()
+
+        with archive.open("xl/worksheets/sheet1.xml", "w", force_zip64=True) as sheet:
+            sheet.write(
+                b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+            )
+            sheet.write(xlsx_row(COLUMNS).encode())
+            for number, row in enumerate(rows, start=1):
+                sheet.write(xlsx_row(row).encode())
+                if number % flush_every == 0:
+                    yield buffer.take()
+            sheet.write(b"</sheetData></worksheet>")
+    yield buffer.take()
+
+
+FORMATS = {
+    "csv": (csv_stream, "text/csv; charset=utf-8"),
+    "xlsx": (xlsx_stream, "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+}
+
+
+def export_visits(queryset, fmt="csv"):
+    """Генератор байтов файла выгрузки и его content type"""
+    stream, content_type = FORMATS[fmt]
+    return stream(export_rows(queryset)), content_type
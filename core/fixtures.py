@@ -0,0 +1,243 @@
+"""
+Потоковая загрузка дампа (manage.py dumpdata) без чтения файла целиком.
+
+- Файл - JSON-массив объектов dumpdata или JSONL (объект на строку),
+  объекты разбираются по одному через JSONDecoder.raw_decode.
+- Порядок моделей вычисляется по графу ForeignKey/ManyToMany: модели
+  разбиваются на уровни, каждый уровень загружается за один проход по файлу,
+  поэтому число проходов равно глубине графа, а не числу моделей.
+- Объекты вставляются пачками в "сыром" режиме, как делает loaddata
+  (raw=True): без save(), без pre_save полей (auto_now_add) и без сигналов.
+  Существующие строки с тем же pk обновляются, но только полями, которые
+  есть в дампе: в старом дампе нет новых колонок, и их значения сохраняются.
+- После загрузки пересчитываются денормализованные данные (core/aggregates.py),
+  дневные сводки (core/rollups.py), рейтинги мастеров и сбрасываются кэши
+  каталога, ленты отзывов и свободного времени.
+"""
+import json
+from collections import Counter, defaultdict
+
+from django.apps import apps
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import connections, reset_queries, transaction
+from django.db.models.constants import OnConflict
+
+from .aggregates import rebuild_client_stats, refresh_visit_totals
+from .catalog import bump_version
+from .models import Visit, normalize_phone
+from .ratings import rebuild_master_ratings
+from .rollups import rebuild_daily_stats
+
+READ_SIZE = 1 << 16
+
+
+def reset_sequences(models, using="default"):
+    """После вставки с явными pk счетчики id (PostgreSQL) нужно сдвинуть"""
+    connection = connections[using]
+    sql = connection.ops.sequence_reset_sql(no_style(), models)
+    if sql:
+        with connection.cursor() as cursor:
+            for statement in sql:
+                cursor.execute(statement)
+
+
+def iter_objects(file):
+    """Объекты из JSON-массива или JSONL по одному, файл читается кусками"""
+    decoder = json.JSONDecoder()
+    buffer, pos, eof = "", 0, False
+    while True:
+        # Между объектами: пробелы, запятые и скобки массива
+        while pos < len(buffer) and buffer[pos] in " \t\r\n,[]":
+            pos += 1
+        if pos == len(buffer):
+            if eof:
+                return
+            buffer, pos = file.read(READ_SIZE), 0
+            eof = not buffer
+            continue
+        try:
+            obj, pos = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            # Объект не поместился в буфер - дочитываем
+            if eof:
+                raise
+            chunk = file.read(READ_SIZE)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield obj
+
+
+def model_dependencies(model):
+    """Модели, строки которых должны быть загружены раньше строк model"""
+    dependencies = set()
+    for field in model._meta.get_fields():
+        if field.concrete and field.is_relation and (field.many_to_one or field.one_to_one or field.many_to_many):
+            if field.related_model is not model:
+                dependencies.add(field.related_model._meta.concrete_model)
+    return dependencies
+
+
+def dependency_levels(models):
+    """
+    Разбить модели на уровни: модели уровня зависят только от моделей
+    предыдущих уровней. Модели из циклов попадают в последний уровень.
+    """
+    remaining = {model: model_dependencies(model) & set(models) for model in models}
+    levels = []
+    while remaining:
+        level = [model for model, deps in remaining.items() if not deps]
+        if not level:
+            levels.append(sorted(remaining, key=lambda m: m._meta.label))
+            break
+        levels.append(sorted(level, key=lambda m: m._meta.label))
+        for model in level:
+            del remaining[model]
+        for deps in remaining.values():
+            deps.difference_update(level)
+    return levels
+
+
+class DumpLoader:
+    def __init__(self, path, using="default", chunk_size=2000, exclude=(), stdout=None):
+        self.path = path
+        self.using = using
+        self.chunk_size = chunk_size
+        self.exclude = {label.lower() for label in exclude}
+        self.stdout = stdout
+        self.loaded = Counter()
+        self.errors = {}
+
+    def log(self, message):
+        if self.stdout:
+            self.stdout.write(message)
+
+    def read(self):
+        with open(self.path, encoding="utf-8") as file:
+            yield from iter_objects(file)
+
+    def load(self):
+        counts = Counter(obj["model"] for obj in self.read())
+        models = []
+        for label in counts:
+            app_label, _, model_name = label.partition(".")
+            if label in self.exclude or app_label in self.exclude:
+                continue
+            models.append(apps.get_model(app_label, model_name))
+
+        connection = connections[self.using]
+        # Как loaddata: проверка внешних ключей - один раз в конце
+        with connection.constraint_checks_disabled():
+            for level in dependency_levels(models):
+                self.load_level(level)
+        connection.check_constraints(table_names=[model._meta.db_table for model in self.loaded_models()])
+        reset_sequences(self.loaded_models(), self.using)
+        self.after_load()
+        return self.loaded
+
+    def loaded_models(self):
+        return [apps.get_model(label) for label in self.loaded]
+
+    def load_level(self, level):
+        labels = {model._meta.label_lower: model for model in level}
+        buffers = defaultdict(list)
+        for obj in self.read():
+            model = labels.get(obj["model"])
+            if model is None or model in self.errors:
+                continue
+            buffers[model].append(obj)
+            if len(buffers[model]) >= self.chunk_size:
+                self.flush(model, buffers.pop(model))
+        for model, objects in buffers.items():
+            self.flush(model, objects)
+        for model in level:
+            if model in self.errors:
+                self.log(f"Ошибка при загрузке {model._meta.label}: {self.errors[model]}")
+            elif self.loaded[model._meta.label]:
+                self.log(f"Загружено {model._meta.label}: {self.loaded[model._meta.label]}")
+
+    def flush(self, model, objects):
+        if model in self.errors:
+            return
+        # Объекты с разным набором полей (дампы разных версий) обновляются отдельно
+        groups = defaultdict(list)
+        for obj in objects:
+            groups[frozenset(obj.get("fields", ()))].append(obj)
+        try:
+            with transaction.atomic(using=self.using):
+                for names, group in groups.items():
+                    self.insert(model, list(Deserializer(group, using=self.using)), names)
+        except Exception as e:
+            # Как в старом loaddata.py: ошибка одной модели не останавливает остальные
+            self.errors[model] = e
+            return
+        self.loaded[model._meta.label] += len(objects)
+        # При DEBUG=True Django хранит текст последних запросов, а это мегабайты на пачку
+        reset_queries()
+
+    def insert(self, model, deserialized, names):
+        """names - поля, которые есть в дампе: только они обновляются у существующих строк"""
+        objects = [item.object for item in deserialized]
+        names = set(names)
+        if model is Visit:
+            # Visit.save() не вызывается, нормализованный телефон заполняем сами
+            for visit in objects:
+                visit.phone_digits = normalize_phone(visit.phone)
+            if "phone" in names:
+                names.add("phone_digits")
+
+        opts = model._meta
+        fields = [field for field in opts.local_concrete_fields]
+        update_fields = [field for field in fields if not field.primary_key and field.name in names]
+        manager = model._base_manager.using(self.using)
+        batch_size = connections[self.using].ops.bulk_batch_size(fields, objects) or len(objects)
+        for start in range(0, len(objects), batch_size):
+            manager._insert(
+                objects[start:start + batch_size],
+                fields=fields,
+                raw=True,
+                using=self.using,
+                on_conflict=OnConflict.UPDATE if update_fields else OnConflict.IGNORE,
+                update_fields=update_fields or None,
+                unique_fields=[opts.pk],
+            )
+
+        # Связи ManyToMany заменяются целиком, как при save() в loaddata
+        for field in opts.many_to_many:
+            through = field.remote_field.through
+            if not through._meta.auto_created:
+                continue
+            source = field.m2m_field_name()
+            target = field.m2m_reverse_field_name()
+            pks = [item.object.pk for item in deserialized if field.name in item.m2m_data]
+            through._base_manager.using(self.using).filter(**{f"{source}__in": pks}).delete()
+            through._base_manager.using(self.using).bulk_create(
+                [
+                    through(**{f"{source}_id": item.object.pk, f"{target}_id": pk})
+                    for item in deserialized
+                    for pk in item.m2m_data.get(field.name, [])
+                ],
+                batch_size=self.chunk_size,
+            )
+
+    def after_load(self):
+        """Денормализованные данные не обновлялись сигналами - пересчитываем"""
+        labels = set(self.loaded)
+        if labels & {"core.Visit", "core.Service"}:
+            refresh_visit_totals(Visit.objects.using(self.using))
+            rebuild_client_stats(using=self.using)
+            rebuild_daily_stats(self.using)
+        if "core.Review" in labels:
+            rebuild_master_ratings(self.using)
+            bump_version("reviews")
+        if labels & {"core.Master", "core.Service"}:
+            bump_version("catalog")
+        if labels & {"core.Visit", "core.VisitSlot", "core.WorkingHours"}:
+            bump_version("schedule")
+            bump_version("availability")
+
+
+def load_dump(path, **kwargs):
+    """Загрузить дамп, вернуть {модель: количество объектов}"""
+    return DumpLoader(path, **kwargs).load()
@@ -1,11 +1,13 @@
 from .models import Visit, Review
+from .scheduling import SlotTaken, check_free, visit_length, visit_slots
 from django import forms
+from django.utils import timezone
 
 
 class VisitForm(forms.ModelForm):
     class Meta:
         model = Visit
-        fields = ["name", "phone", "comment", "master", "services"]
+        fields = ["name", "phone", "comment", "master", "services", "start_at"]
         widgets = {
             "name": forms.TextInput(
                 attrs={"class": "form-control", "placeholder": "Имя"}
@@ -18,8 +20,52 @@ class VisitForm(forms.ModelForm):
             ),
             "master": forms.Select(attrs={"class": "form-control"}),
             "services": forms.SelectMultiple(attrs={"class": "form-control"}),
+            "start_at": forms.DateTimeInput(
+                attrs={"class": "form-control", "type": "datetime-local", "step": 900},
+                format="%Y-%m-%dT%H:%M",
+            ),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        start_at = cleaned_data.get("start_at")
+        master = cleaned_data.get("master")
+        services = cleaned_data.get("services")
+        # Рабочее время проверяем сразу, занятость - при бронировании (core/scheduling.py)
+        if start_at and master and services:
+            try:
+                visit_slots(master.pk, start_at, visit_length([service.pk for service in services]))
+            except SlotTaken as e:
+                self.add_error("start_at", str(e))
+        return cleaned_data
+
+
+class VisitAdminForm(forms.ModelForm):
+    """
+    Запись в админке (и статус в списке записей): отмененную запись вернули в
+    работу или сменили мастера - время мастера занимается заново (core/signals.py),
+    поэтому свободно ли оно, проверяем до сохранения
+    """
+
+    def clean(self):
+        cleaned_data = super().clean()
+        visit = self.instance
+        if not visit.pk or not visit.start_at or visit.start_at <= timezone.now():
+            return cleaned_data
+        status = cleaned_data.get("status", visit.status)
+        master = cleaned_data.get("master")
+        master_id = master.pk if master else visit.master_id
+        if status in (2, 3):
+            return cleaned_data
+        if visit.status in (2, 3) or master_id != visit.master_id:
+            services = cleaned_data.get("services") if "services" in self.fields else visit.services.all()
+            try:
+                check_free(visit.pk, master_id, visit.start_at, visit_length([service.pk for service in services or []]))
+            except SlotTaken as e:
+                self.add_error(None, str(e))
+        return cleaned_data
+
+
 class ReviewForm(forms.ModelForm):
     class Meta:
         model = Review
@@ -0,0 +1,133 @@
+"""
+Уменьшенные копии фотографий мастеров для главной страницы.
+
+Из оригинала (Master.photo) делаются варианты нескольких ширин (WIDTHS) в
+форматах AVIF (если Pillow собран с его поддержкой), WebP и JPEG. Они лежат
+в MEDIA_ROOT/masters/variants/<hash>/<ширина>.<расширение>, где hash -
+хэш содержимого оригинала (Master.photo_hash). Одинаковые фото не
+пережимаются повторно, а адрес варианта меняется вместе с содержимым,
+поэтому его можно кэшировать в браузере без ограничения срока. Фото не
+увеличиваются: у оригинала уже самой большой ширины варианты - ширины из
+WIDTHS меньше него и его собственная (Master.photo_width).
+
+Если оригинал не читается (файла нет, не картинка), ошибка пишется в лог, а
+на странице остается оригинал - сохранение мастера из-за этого не падает.
+
+Варианты создаются при загрузке фото (сигнал post_save мастера) и командой
+manage.py backfill_photos для уже загруженных. Разметку <picture> со srcset
+выводит тег {% master_photo %} (core/templatetags/photos.py).
+"""
+import hashlib
+import logging
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, UnidentifiedImageError, features
+
+from .catalog import bump_version
+from .models import Master
+
+WIDTHS = (160, 320, 640)
+VARIANTS_DIR = "masters/variants"
+# Формат: (формат Pillow, расширение, MIME-тип, параметры сохранения)
+FORMATS = [
+    ("AVIF", "avif", "image/avif", {"quality": 50}),
+    ("WEBP", "webp", "image/webp", {"quality": 75, "method": 6}),
+    ("JPEG", "jpg", "image/jpeg", {"quality": 80, "optimize": True, "progressive": True}),
+]
+if not features.check("avif"):
+    FORMATS = FORMATS[1:]
+# Ориентация EXIF 5-8 - фото повернуто на 90 градусов, ширина и высота меняются местами
+ROTATED = {5, 6, 7, 8}
+
+logger = logging.getLogger(__name__)
+
+
+def content_hash(file):
+    """Хэш содержимого файла, читается кусками"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(1 << 16), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()[:20]
+
+
+def variant_name(photo_hash, width, extension):
+    return f"{VARIANTS_DIR}/{photo_hash}/{width}.{extension}"
+
+
+def variant_url(photo_hash, width, extension):
+    return default_storage.url(variant_name(photo_hash, width, extension))
+
+
+def variant_widths(original_width):
+    """Ширины вариантов фото шириной original_width: без увеличения"""
+    widths = [width for width in WIDTHS if width < original_width]
+    return widths + [min(original_width, WIDTHS[-1])]
+
+
+def photo_width(image):
+    """Ширина фото с учетом поворота из EXIF, без чтения пикселей"""
+    width, height = image.size
+    return height if image.getexif().get(0x0112) in ROTATED else width
+
+
+def make_variants(file, photo_hash, storage=default_storage):
+    """Сохранить недостающие варианты фото с хэшем photo_hash: (ширина оригинала, создано файлов)"""
+    file.seek(0)
+    with Image.open(file) as image:
+        original_width = photo_width(image)
+        missing = [
+            (width, fmt)
+            for width in variant_widths(original_width)
+            for fmt in FORMATS
+            if not storage.exists(variant_name(photo_hash, width, fmt[1]))
+        ]
+        if not missing:
+            return original_width, 0
+        # Фото с телефона хранят поворот в EXIF
+        image = ImageOps.exif_transpose(image).convert("RGB")
+        resized = {}
+        for width, (pillow_format, extension, _, options) in missing:
+            if width not in resized:
+                resized[width] = image.copy()
+                resized[width].thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+            buffer = BytesIO()
+            resized[width].save(buffer, pillow_format, **options)
+            storage.save(variant_name(photo_hash, width, extension), ContentFile(buffer.getvalue()))
+    return original_width, len(missing)
+
+
+def process_photo(name, storage=default_storage):
+    """Хэш, ширина и варианты фото по имени файла в хранилище: (hash, ширина, создано файлов)"""
+    with storage.open(name, "rb") as file:
+        photo_hash = content_hash(file)
+        return (photo_hash, *make_variants(file, photo_hash, storage))
+
+
+def refresh_master_photo(master):
+    """
+    Пересчитать хэш и варианты фото мастера после загрузки или удаления фото.
+    Нечитаемое фото оставляет мастера без вариантов (показывается оригинал)
+    """
+    photo_hash, width = "", None
+    if master.photo:
+        try:
+            photo_hash, width, _ = process_photo(master.photo.name)
+        except (OSError, UnidentifiedImageError) as e:
+            logger.error(f"Фото мастера {master.pk} ({master.photo.name}): {e}")
+    if (photo_hash, width) != (master.photo_hash, master.photo_width):
+        Master.objects.filter(pk=master.pk).update(photo_hash=photo_hash, photo_width=width)
+        master.photo_hash, master.photo_width = photo_hash, width
+        bump_version("catalog")
+
+
+def srcset(photo_hash, widths, extension):
+    return ", ".join(f"{variant_url(photo_hash, width, extension)} {width}w" for width in widths)
+
+
+def picture_sources(photo_hash, widths):
+    """[(MIME-тип, srcset)] для <source> в порядке предпочтения; JPEG - последним, для <img>"""
+    return [(mime, srcset(photo_hash, widths, extension)) for _, extension, mime, _ in FORMATS]
@@ -0,0 +1,158 @@
+"""
+Массовый импорт записей (старая CRM, исторические выгрузки).
+
+import_visits() принимает поток словарей и сохраняет их пачками: в одной
+транзакции - bulk_create записей и bulk_create связей Visit.services.through.
+Сигналы при этом не срабатывают, поэтому денормализованные значения
+(total_price, phone_digits, ClientStats, дневные сводки) заполняются здесь же, а вместо
+сообщения в Telegram на каждую запись ставится одно итоговое.
+
+Поля строки: name, phone, comment, master (id), services (список id или строка
+"1;2;3"), status, created_at (ISO 8601). Обязательны name, master и services.
+"""
+import csv
+import json
+from dataclasses import dataclass, field
+from decimal import Decimal
+from itertools import islice
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .aggregates import refresh_client_stats
+from .models import Master, Service, Visit, normalize_phone
+from .notifications import enqueue_notification, suppress_notifications
+from .rollups import refresh_master_days, refresh_service_days
+
+
+@dataclass
+class ImportResult:
+    imported: int = 0
+    skipped: int = 0
+    # Первые ошибки для отчета: (номер строки, текст)
+    errors: list = field(default_factory=list)
+
+    MAX_ERRORS = 20
+
+    def skip(self, line, error):
+        self.skipped += 1
+        if len(self.errors) < self.MAX_ERRORS:
+            self.errors.append((line, error))
+
+
+def read_csv(file):
+    """Строки CSV с заголовком как словари, без чтения файла целиком"""
+    yield from csv.DictReader(file)
+
+
+def read_jsonl(file):
+    for line in file:
+        line = line.strip()
+        if line:
+            yield json.loads(line)
+
+
+def parse_row(row, masters, prices):
+    """Visit и id его услуг из строки импорта, ValueError - строка с ошибкой"""
+    name = (row.get('name') or '').strip()
+    if not name:
+        raise ValueError('не указано имя')
+    try:
+        master_id = int(row.get('master'))
+    except (TypeError, ValueError):
+        raise ValueError(f"неверный мастер: {row.get('master')!r}")
+    if master_id not in masters:
+        raise ValueError(f'мастер {master_id} не найден')
+
+    services = row.get('services') or []
+    if isinstance(services, str):
+        services = [item for item in services.replace(',', ';').split(';') if item.strip()]
+    try:
+        service_ids = sorted({int(item) for item in services})
+    except (TypeError, ValueError):
+        raise ValueError(f'неверные услуги: {services!r}')
+    if not service_ids:
+        raise ValueError('не указаны услуги')
+    unknown = [pk for pk in service_ids if pk not in prices]
+    if unknown:
+        raise ValueError(f'услуги не найдены: {unknown}')
+
+    created_at = timezone.now()
+    if row.get('created_at'):
+        created_at = parse_datetime(str(row['created_at']))
+        if created_at is None:
+            raise ValueError(f"неверная дата: {row['created_at']!r}")
+        if timezone.is_naive(created_at):
+            created_at = timezone.make_aware(created_at)
+
+    status = int(row.get('status') or 0)
+    if status not in dict(Visit.STATUS_CHOICES):
+        raise ValueError(f'неверный статус: {status}')
+
+    phone = (row.get('phone') or '').strip()
+    visit = Visit(
+        name=name,
+        phone=phone,
+        phone_digits=normalize_phone(phone),
+        comment=row.get('comment') or '',
+        master_id=master_id,
+        status=status,
+        created_at=created_at,
+        total_price=sum((prices[pk] for pk in service_ids), Decimal(0)),
+    )
+    return visit, service_ids
+
+
+def import_visits(rows, chunk_size=2000, notify=True, progress=None):
+    """
+    Импортировать записи из итерируемого набора словарей.
+    Каждая пачка из chunk_size строк сохраняется в своей транзакции.
+    progress(result) вызывается после каждой пачки.
+    """
+    masters = set(Master.objects.values_list('id', flat=True))
+    prices = dict(Service.objects.values_list('id', 'price'))
+    through = Visit.services.through
+    result = ImportResult()
+    # Затронутые дни сводок (core/rollups.py) пересчитываются один раз в конце
+    master_days, service_days = set(), set()
+    numbered = enumerate(rows, start=1)
+
+    with suppress_notifications():
+        while chunk := list(islice(numbered, chunk_size)):
+            visits, links = [], []
+            for line, row in chunk:
+                try:
+                    visit, service_ids = parse_row(row, masters, prices)
+                except (ValueError, TypeError, AttributeError) as e:
+                    result.skip(line, str(e))
+                    continue
+                visits.append(visit)
+                links.append(service_ids)
+
+            with transaction.atomic():
+                # bulk_create заполняет pk на SQLite и PostgreSQL
+                Visit.objects.bulk_create(visits)
+                through.objects.bulk_create(
+                    through(visit_id=visit.pk, service_id=service_id)
+                    for visit, service_ids in zip(visits, links)
+                    for service_id in service_ids
+                )
+                refresh_client_stats({visit.phone_digits for visit in visits})
+            for visit, service_ids in zip(visits, links):
+                day = timezone.localdate(visit.created_at)
+                master_days.add((day, visit.master_id))
+                service_days.update((day, pk) for pk in service_ids)
+            result.imported += len(visits)
+            if progress:
+                progress(result)
+
+        with transaction.atomic():
+            refresh_master_days(master_days)
+            refresh_service_days(service_days)
+
+    if notify and result.imported:
+        enqueue_notification(
+            f"*Импорт записей*\n\nЗагружено: {result.imported}\nПропущено с ошибками: {result.skipped}"
+        )
+    return result
@@ -0,0 +1,51 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from core.catalog import bump_version
+from core.images import process_photo
+from core.models import Master
+
+
+class Command(BaseCommand):
+    help = """Создать уменьшенные копии (WebP/JPEG/AVIF) для уже загруженных фото мастеров.
+    Фото пережимаются параллельно в нескольких процессах, готовые варианты не пересоздаются."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Число процессов")
+        parser.add_argument("--all", action="store_true", help="Проверить все фото, а не только необработанные")
+
+    def handle(self, *args, **options):
+        masters = Master.objects.exclude(photo="").exclude(photo__isnull=True)
+        if not options["all"]:
+            masters = masters.filter(photo_width__isnull=True)
+        photos = dict(masters.values_list("id", "photo"))
+        start = time.perf_counter()
+        created = updated = 0
+        # В процессах только работа с файлами, в БД пишет основной процесс
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            futures = {pool.submit(process_photo, name): master_id for master_id, name in photos.items()}
+            for future in as_completed(futures):
+                master_id = futures[future]
+                try:
+                    photo_hash, width, count = future.result()
+                except (OSError, UnidentifiedImageError) as e:
+                    self.stderr.write(f"Мастер {master_id}, {photos[master_id]}: {e}")
+                    continue
+                created += count
+                updated += (
+                    Master.objects.filter(pk=master_id)
+                    .exclude(photo_hash=photo_hash, photo_width=width)
+                    .update(photo_hash=photo_hash, photo_width=width)
+                )
+        if updated:
+            bump_version("catalog")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Фото: {len(photos)}, новых файлов: {created}, обновлено мастеров: {updated} "
+                f"за {time.perf_counter() - start:.1f} с"
+            )
+        )
@@ -0,0 +1,81 @@
+import random
+from datetime import datetime, time, timedelta
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import availability
+from core.bench import measure, seed_catalog, temporary_database
+from core.models import Visit, VisitSlot, WorkingHours
+from core.scheduling import SLOT, day_slots, free_slots
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк кэша свободного времени: ближайшее время мастеров из БД и из битовых карт"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--masters", type=int, default=50)
+        parser.add_argument("--days", type=int, default=90)
+        parser.add_argument("--busy", type=float, default=0.6, help="Доля занятого времени")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            masters, services = seed_catalog(options["masters"], 4)
+            master_ids = [master.pk for master in masters]
+            slots = self.seed_schedule(master_ids, options["days"], options["busy"])
+            self.stdout.write(f"Мастеров: {len(master_ids)}, дней: {options['days']}, занятых интервалов: {slots}")
+            service_ids = [services[0].pk]
+            repeat = options["repeat"]
+
+            # Без кэша: ближайшее время - первый результат free_slots() из БД
+            ms, _ = measure(lambda: [free_slots(pk, service_ids)[:1] for pk in master_ids], repeat)
+            self.stdout.write(f"Ближайшее время всех мастеров из БД (free_slots): {ms:.1f} мс")
+
+            cache.clear()
+            ms, _ = measure(lambda: availability.warm(master_ids, days=options["days"]), 1)
+            self.stdout.write(f"Прогрев кэша (warm_availability): {ms:.1f} мс")
+
+            ms, _ = measure(lambda: availability.next_free(master_ids), repeat * 10)
+            self.stdout.write(f"Ближайшее время всех мастеров из кэша: {ms:.3f} мс")
+
+            def cold():
+                version = availability.next_version()
+                cache.delete_many([availability.next_key(version, pk) for pk in master_ids])
+                availability.next_free(master_ids)
+
+            ms, _ = measure(cold, repeat)
+            self.stdout.write(f"Ближайшее время всех мастеров по картам дней: {ms:.2f} мс")
+
+            day = timezone.localdate() + timedelta(days=1)
+            ms, _ = measure(lambda: availability.refresh_days(master_ids[0], [day]), repeat * 10)
+            self.stdout.write(f"Обновление карты одного дня после записи: {ms:.2f} мс")
+
+    def seed_schedule(self, master_ids, days, busy, seed=1):
+        """Рабочее время 10-20 каждый день и записи на часть интервалов (без сигналов)"""
+        rng = random.Random(seed)
+        WorkingHours.objects.bulk_create(
+            WorkingHours(master_id=master_id, weekday=weekday, start=time(10), end=time(20))
+            for master_id in master_ids
+            for weekday in range(7)
+        )
+        today = timezone.localdate()
+        created = 0
+        for master_id in master_ids:
+            visits, starts = [], []
+            for offset in range(days):
+                day_start = timezone.make_aware(datetime.combine(today + timedelta(days=offset), time(10)))
+                # Записи по 30 минут: каждая занимает два интервала подряд
+                for start in day_slots(day_start, day_start + timedelta(hours=10))[::2]:
+                    if rng.random() < busy:
+                        visits.append(Visit(name="Клиент", phone="+79990000000", master_id=master_id, start_at=start))
+                        starts.append(start)
+            Visit.objects.bulk_create(visits)
+            VisitSlot.objects.bulk_create(
+                VisitSlot(master_id=master_id, start=start + SLOT * i, visit=visit)
+                for visit, start in zip(visits, starts)
+                for i in range(2)
+            )
+            created += len(visits) * 2
+        return created
@@ -0,0 +1,129 @@
+import random
+import statistics
+import threading
+import time
+from datetime import datetime, timedelta
+from datetime import time as day_time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection, transaction
+from django.utils import timezone
+
+from core.bench import seed_catalog, temporary_database
+from core.models import Visit, WorkingHours
+from core.scheduling import SLOT, SlotTaken, day_slots, reserve
+
+# Настройки SQLite по умолчанию - для сравнения с settings.SQLITE_PRAGMAS
+SQLITE_DEFAULTS = [
+    "PRAGMA journal_mode=DELETE",
+    "PRAGMA synchronous=FULL",
+    "PRAGMA mmap_size=0",
+]
+
+
+class Command(BaseCommand):
+    help = """Бенчмарк одновременных записей: потоки записывают клиентов к мастерам
+    (запись, услуги и время мастера в одной транзакции, как IndexView) в базе из
+    настроек (DB_ENGINE). Для SQLite сравниваются настройки соединения по умолчанию
+    и settings.SQLITE_PRAGMAS (WAL и т.д.). Данные создаются во временной тестовой БД."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", default="1,4,16", help="Числа потоков через запятую")
+        parser.add_argument("--bookings", type=int, default=50, help="Записей на поток")
+        parser.add_argument("--masters", type=int, default=10)
+        parser.add_argument("--seed", type=int, default=1)
+
+    def handle(self, *args, **options):
+        thread_counts = [int(value) for value in options["threads"].split(",")]
+        with temporary_database():
+            masters, _ = seed_catalog(options["masters"], 6)
+            self.master_services = {master.pk: list(master.services.all()) for master in masters}
+            WorkingHours.objects.bulk_create(
+                WorkingHours(master=master, weekday=weekday, start=day_time(8), end=day_time(22))
+                for master in masters
+                for weekday in range(7)
+            )
+            self.stdout.write(f"База: {connection.vendor}, мастеров: {len(masters)}, записей на поток: {options['bookings']}")
+            options_dict = connection.settings_dict["OPTIONS"]
+            old_init_command = options_dict.get("init_command")
+            first_day = timezone.localdate() + timedelta(days=1)
+            try:
+                for name, init_command in self.modes():
+                    if init_command is not None:
+                        # Потоки открывают свои соединения с этими же настройками
+                        connection.close()
+                        options_dict["init_command"] = init_command
+                    for threads in thread_counts:
+                        # У каждого прогона свой день, чтобы записи не конфликтовали с прошлыми
+                        result = self.run(threads, options["bookings"], first_day, options["seed"])
+                        first_day += timedelta(days=1)
+                        self.stdout.write(
+                            f"{name}, потоков {threads}: {result['rps']:.0f} записей/с, "
+                            f"p50 {result['p50']:.1f} мс, p95 {result['p95']:.1f} мс, "
+                            f"время занято: {result['taken']}, ошибок: {result['errors']}"
+                        )
+            finally:
+                connection.close()
+                if old_init_command is None:
+                    options_dict.pop("init_command", None)
+                else:
+                    options_dict["init_command"] = old_init_command
+
+    def modes(self):
+        """[(название, init_command или None - не менять)]"""
+        if connection.vendor != "sqlite":
+            return [(connection.vendor, None)]
+        return [
+            ("SQLite по умолчанию", ";".join(SQLITE_DEFAULTS)),
+            ("SQLite с SQLITE_PRAGMAS", ";".join(settings.SQLITE_PRAGMAS)),
+        ]
+
+    def run(self, threads, bookings, day, seed):
+        day_start = timezone.make_aware(datetime.combine(day, day_time(8)))
+        starts = day_slots(day_start, day_start + timedelta(hours=14) - SLOT)
+        master_ids = list(self.master_services)
+        latencies, taken, errors = [], [], []
+        barrier = threading.Barrier(threads)
+
+        def worker(number):
+            rng = random.Random(seed * 1000 + number)
+            try:
+                barrier.wait()
+                for i in range(bookings):
+                    master_id = rng.choice(master_ids)
+                    begin = time.perf_counter()
+                    try:
+                        self.book(master_id, rng.choice(self.master_services[master_id]), rng.choice(starts), number, i)
+                    except SlotTaken:
+                        taken.append(1)
+                    except OperationalError:
+                        # "database is locked" - то, от чего защищают WAL и timeout
+                        errors.append(1)
+                    latencies.append((time.perf_counter() - begin) * 1000)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=worker, args=(number,)) for number in range(threads)]
+        start = time.perf_counter()
+        for thread in workers:
+            thread.start()
+        for thread in workers:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+        return {
+            "rps": len(latencies) / elapsed,
+            "p50": quantiles[49],
+            "p95": quantiles[94],
+            "taken": len(taken),
+            "errors": len(errors),
+        }
+
+    def book(self, master_id, service, start, thread, number):
+        with transaction.atomic():
+            visit = Visit.objects.create(
+                name=f"Клиент {thread}-{number}", phone="+79991112233", master_id=master_id, start_at=start
+            )
+            visit.services.set([service])
+            reserve(visit)
@@ -0,0 +1,36 @@
+from django.core.cache import cache, caches
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+
+from core.bench import count_queries, measure, seed_catalog, temporary_database
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк главной страницы: запросов в секунду без кэша, с кэшем каталога и с кэшем страниц"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=300, help="Запросов на каждый замер")
+        parser.add_argument("--masters", type=int, default=6)
+        parser.add_argument("--services", type=int, default=12)
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            seed_catalog(options["masters"], options["services"])
+            client = Client()
+            runs = (
+                ("без кэша", False, []),
+                ("с кэшем каталога", True, []),
+                ("с кэшем страниц", True, ["/"]),
+            )
+            for title, catalog_cache, page_cache_paths in runs:
+                with override_settings(CATALOG_CACHE=catalog_cache, PAGE_CACHE_PATHS=page_cache_paths):
+                    cache.clear()
+                    caches["pages"].clear()
+                    # Прогрев: первый запрос заполняет кэш
+                    client.get("/")
+                    queries = count_queries(lambda: client.get("/"))
+                    ms, rps = measure(lambda: client.get("/"), options["requests"])
+                self.stdout.write(
+                    f"GET / {title}: {rps:.0f} запросов/с, {ms:.2f} мс на запрос, "
+                    f"SQL-запросов: {queries}"
+                )
@@ -0,0 +1,48 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from core.bench import measure, seed_catalog, seed_visits, temporary_database
+from core.models import Visit
+from core.search import search_visits
+
+# Запросы, которые вводят в поиск на странице заявок
+QUERIES = ["Иван", "Сидоров", "+7 912", "8 999 12", "Никита Попов"]
+
+
+def legacy_search(query):
+    """Поиск до индексов: icontains по имени и телефону"""
+    return Visit.objects.filter(Q(name__icontains=query) | Q(phone__icontains=query))
+
+
+def first_page(queryset):
+    # То же, что делает страница заявок: одна страница и общее количество
+    list(queryset.select_related("master").order_by("-created_at")[:5])
+    return queryset.count()
+
+
+class Command(BaseCommand):
+    help = "Бенчмарк поиска на странице заявок: icontains против индексов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--visits", type=int, default=1_000_000, help="Сколько записей создать")
+        parser.add_argument("--repeat", type=int, default=5, help="Повторов каждого запроса")
+
+    def handle(self, *args, **options):
+        with temporary_database():
+            masters, _ = seed_catalog()
+            start = time.perf_counter()
+            seed_visits(options["visits"], masters)
+            self.stdout.write(
+                f"Создано записей: {options['visits']} за {time.perf_counter() - start:.1f} с"
+            )
+            for query in QUERIES:
+                before, _ = measure(lambda: first_page(legacy_search(query)), options["repeat"])
+                after, _ = measure(
+                    lambda: first_page(search_visits(Visit.objects.all(), query)), options["repeat"]
+                )
+                found = search_visits(Visit.objects.all(), query).count()
+                self.stdout.write(
+                    f"{query!r:16} было {before:8.1f} мс, стало {after:8.1f} мс (найдено {found})"
+                )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+
+from core.aggregates import (
+    rebuild_client_stats,
+    refresh_visit_totals,
+    wrong_client_stats,
+    wrong_visit_totals,
+)
+from core.ratings import rebuild_master_ratings, wrong_master_ratings
+
+
+class Command(BaseCommand):
+    help = "Проверка денормализованных данных: суммы записей, счетчики записей клиентов и рейтинги мастеров"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fix", action="store_true", help="Пересчитать найденные расхождения")
+
+    def handle(self, *args, **options):
+        totals = wrong_visit_totals()
+        totals_count = totals.count()
+        self.stdout.write(f"Записей с неверной суммой: {totals_count}")
+        for visit in totals[:10]:
+            self.stdout.write(f"  #{visit.pk}: сохранено {visit.total_price}, должно быть {visit.actual}")
+
+        stats = wrong_client_stats()
+        self.stdout.write(f"Телефонов с неверным счетчиком: {len(stats)}")
+        for phone, (stored, actual) in list(stats.items())[:10]:
+            self.stdout.write(f"  {phone}: сохранено {stored}, должно быть {actual}")
+
+        ratings = wrong_master_ratings()
+        self.stdout.write(f"Мастеров с неверным рейтингом: {len(ratings)}")
+        for master_id, (stored, actual) in list(ratings.items())[:10]:
+            self.stdout.write(
+                f"  мастер #{master_id}: сохранено {stored['count']} отзывов / {stored['total']}, "
+                f"должно быть {actual['count']} / {actual['total']}"
+            )
+
+        if not options["fix"]:
+            if totals_count or stats or ratings:
+                self.stdout.write(self.style.WARNING("Для исправления запустите с --fix"))
+            return
+        if totals_count:
+            refresh_visit_totals(totals)
+        if stats:
+            rebuild_client_stats()
+        if ratings:
+            rebuild_master_ratings()
+        self.stdout.write(self.style.SUCCESS("Исправлено"))
@@ -0,0 +1,44 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core.exports import FORMATS, export_visits
+from core.models import Visit, VisitQuerySet
+
+
+class Command(BaseCommand):
+    help = "Выгрузка записей в CSV или XLSX с теми же фильтрами, что в админке"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=list(FORMATS), default="csv")
+        parser.add_argument("-o", "--output", default="-", help="Файл, по умолчанию stdout")
+        parser.add_argument("--master", type=int, action="append", help="id мастера, можно несколько раз")
+        parser.add_argument("--price-range", choices=list(VisitQuerySet.PRICE_RANGES))
+        parser.add_argument("--regular", choices=["yes", "no"], help="Постоянные клиенты (3+ записи)")
+        parser.add_argument("--date-from", type=parse_date, help="ГГГГ-ММ-ДД")
+        parser.add_argument("--date-to", type=parse_date, help="ГГГГ-ММ-ДД")
+
+    def handle(self, *args, **options):
+        queryset = (
+            Visit.objects.price_range(options["price_range"])
+            .regular_clients(options["regular"])
+            .created_between(options["date_from"], options["date_to"])
+        )
+        if options["master"]:
+            queryset = queryset.filter(master_id__in=options["master"])
+
+        content, _ = export_visits(queryset, options["format"])
+        if options["output"] == "-":
+            output = sys.stdout.buffer
+        else:
+            try:
+                output = open(options["output"], "wb")
+            except OSError as e:
+                raise CommandError(e)
+        try:
+            for chunk in content:
+                output.write(chunk)
+        finally:
+            if output is not sys.stdout.buffer:
+                output.close()
@@ -0,0 +1,60 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.imports import import_visits, read_csv, read_jsonl
+
+
+class Command(BaseCommand):
+    help = """Массовый импорт записей из CSV (с заголовком) или JSONL, файл читается потоком.
+    Колонки: name, phone, comment, master, services ("1;2"), status, created_at.
+    Уведомления по отдельным записям не отправляются, в Telegram уходит одно итоговое."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к файлу или - для stdin")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="По умолчанию - по расширению файла")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Записей в одной транзакции")
+        parser.add_argument("--no-notify", action="store_true", help="Не отправлять итоговое сообщение")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        fmt = options["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        reader = read_jsonl if fmt == "jsonl" else read_csv
+
+        try:
+            file = sys.stdin if path == "-" else open(path, encoding="utf-8", newline="")
+        except OSError as e:
+            raise CommandError(e)
+
+        start = time.perf_counter()
+
+        def progress(result):
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"\r{result.imported} записей, {result.imported / elapsed:.0f} записей/с", ending="")
+            self.stdout.flush()
+
+        try:
+            result = import_visits(
+                reader(file),
+                chunk_size=options["chunk_size"],
+                notify=not options["no_notify"],
+                progress=progress,
+            )
+        except ValueError as e:
+            # Испорченный JSON: уже загруженные пачки остаются в БД
+            raise CommandError(f"Ошибка формата файла: {e}")
+        finally:
+            if file is not sys.stdin:
+                file.close()
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write("")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Импортировано {result.imported} записей за {elapsed:.1f} с "
+                f"({result.imported / elapsed:.0f} записей/с), пропущено: {result.skipped}"
+            )
+        )
+        for line, error in result.errors:
+            self.stdout.write(f"  строка {line}: {error}")
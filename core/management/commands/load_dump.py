@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.fixtures import load_dump
+
+
+class Command(BaseCommand):
+    help = """Потоковая загрузка дампа dumpdata (JSON-массив или JSONL) без чтения файла в память.
+    Порядок моделей определяется по внешним ключам, сигналы не отправляются."""
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="dump.json")
+        parser.add_argument("--database", default="default")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Объектов в одной транзакции")
+        parser.add_argument(
+            "-e", "--exclude", action="append", default=[],
+            help="Не загружать приложение или модель (app или app.model), можно несколько раз",
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        try:
+            loaded = load_dump(
+                options["path"],
+                using=options["database"],
+                chunk_size=options["chunk_size"],
+                exclude=options["exclude"],
+                stdout=self.stdout,
+            )
+        except (OSError, ValueError, LookupError) as e:
+            raise CommandError(e)
+        total = sum(loaded.values())
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Загружено объектов: {total} за {elapsed:.1f} с ({total / elapsed:.0f} объектов/с)")
+        )
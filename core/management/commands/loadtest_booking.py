@@ -0,0 +1,100 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urljoin
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Notification, Visit
+
+# Имя клиента у тестовых записей, по нему --cleanup их удаляет
+NAME_PREFIX = "Нагрузочный тест"
+
+
+class Command(BaseCommand):
+    help = """Нагрузочный тест записи: одновременные POST-запросы к запущенным серверам.
+
+    Каждая цель задается как имя=адрес формы записи, например:
+        gunicorn barber.wsgi --bind 127.0.0.1:8000 --workers 2
+        uvicorn barber.asgi:application --port 8001 --workers 2
+        manage.py loadtest_booking wsgi=http://127.0.0.1:8000/ asgi=http://127.0.0.1:8001/book/
+
+    Серверы запускаются с RATELIMIT_ENABLED=0, иначе лимиты (core/ratelimit.py) ответят 429.
+    Тест создает настоящие записи в БД сервера, удалить их: manage.py loadtest_booking --cleanup"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("targets", nargs="*", help="имя=URL, например asgi=http://127.0.0.1:8001/book/")
+        parser.add_argument("--requests", type=int, default=500, help="Запросов на каждую цель")
+        parser.add_argument("--concurrency", type=int, default=50, help="Одновременных запросов")
+        parser.add_argument("--cleanup", action="store_true", help="Удалить тестовые записи из локальной БД")
+
+    def handle(self, *args, **options):
+        if options["cleanup"]:
+            visits, _ = Visit.objects.filter(name__startswith=NAME_PREFIX).delete()
+            notifications, _ = Notification.objects.filter(text__contains=NAME_PREFIX).delete()
+            self.stdout.write(f"Удалено записей: {visits}, уведомлений: {notifications}")
+            return
+        if not options["targets"]:
+            raise CommandError("Укажите хотя бы одну цель: имя=URL")
+
+        for target in options["targets"]:
+            name, sep, url = target.partition("=")
+            if not sep:
+                raise CommandError(f"Цель должна иметь вид имя=URL: {target}")
+            result = asyncio.run(self.run_target(url, options["requests"], options["concurrency"]))
+            self.stdout.write(
+                f"{name}: {result['rps']:.0f} записей/с, "
+                f"p50 {result['p50']:.1f} мс, p95 {result['p95']:.1f} мс, p99 {result['p99']:.1f} мс, "
+                f"ошибок: {result['errors']} из {options['requests']}"
+            )
+
+    async def run_target(self, url, requests, concurrency):
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(limits=limits, timeout=30) as client:
+            # Мастер и его услуги из API каталога, CSRF-кука с главной страницы
+            catalog = (await client.get(urljoin(url, "/api/catalog/"))).json()
+            master_id, service_ids = next(iter(catalog["master_services"].items()))
+            await client.get(urljoin(url, "/"))
+            token = client.cookies.get("csrftoken")
+            if not token:
+                raise CommandError(f"{url}: сервер не выдал CSRF-куку")
+
+            semaphore = asyncio.Semaphore(concurrency)
+            latencies = []
+            errors = 0
+
+            async def book(number):
+                nonlocal errors
+                data = {
+                    "name": f"{NAME_PREFIX} {number}",
+                    "phone": f"+7900{number:07d}",
+                    "comment": "",
+                    "master": master_id,
+                    "services": service_ids[:2],
+                }
+                async with semaphore:
+                    start = time.perf_counter()
+                    try:
+                        response = await client.post(
+                            url, data=data, headers={"X-CSRFToken": token, "Referer": url}
+                        )
+                        ok = response.status_code == 302
+                    except httpx.HTTPError:
+                        ok = False
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    if not ok:
+                        errors += 1
+
+            start = time.perf_counter()
+            await asyncio.gather(*(book(number) for number in range(requests)))
+            elapsed = time.perf_counter() - start
+
+        percentiles = statistics.quantiles(latencies, n=100)
+        return {
+            "rps": requests / elapsed,
+            "p50": percentiles[49],
+            "p95": percentiles[94],
+            "p99": percentiles[98],
+            "errors": errors,
+        }
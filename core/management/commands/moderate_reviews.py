@@ -0,0 +1,53 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+
+from core.moderation import moderate_pending
+from core.utlils import FakeMistral, get_mistral_client, moderation_stats
+
+
+class Command(BaseCommand):
+    help = "Воркер автомодерации отзывов через Mistral"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=20, help="Отзывов за один проход")
+        parser.add_argument("--concurrency", type=int, default=5, help="Одновременных запросов к модели")
+        parser.add_argument("--timeout", type=float, default=30, help="Таймаут ответа модели, сек")
+        parser.add_argument("--interval", type=float, default=5.0, help="Пауза между проходами, сек")
+        parser.add_argument("--once", action="store_true", help="Разобрать очередь один раз и выйти")
+        parser.add_argument("--fake", action="store_true", help="Заглушка вместо Mistral (без сети)")
+        parser.add_argument("--stats", action="store_true", help="Только показать счетчики кэша модерации")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            self.write_stats()
+            return
+        client = FakeMistral() if options["fake"] else get_mistral_client()
+        try:
+            asyncio.run(self.run(client, options))
+        except KeyboardInterrupt:
+            self.stdout.write("Остановлено")
+
+    async def run(self, client, options):
+        while True:
+            checked, approved, failed = await moderate_pending(
+                client, options["batch_size"], options["concurrency"], options["timeout"]
+            )
+            if checked or failed:
+                self.stdout.write(
+                    f"Проверено: {checked}, одобрено: {approved}, без ответа модели: {failed}"
+                )
+                await sync_to_async(self.write_stats)()
+            # Пачка была полной и обработана - сразу берем следующую
+            if checked and checked + failed >= options["batch_size"]:
+                continue
+            if options["once"]:
+                return
+            await asyncio.sleep(options["interval"])
+
+    def write_stats(self):
+        self.stdout.write(
+            "Кэш модерации: фильтр {prefilter}, память {memory_hit}, БД {db_hit}, "
+            "запросов к модели {miss}".format_map(moderation_stats())
+        )
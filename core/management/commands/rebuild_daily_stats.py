@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from core.models import DailyMasterStat, DailyServiceStat
+from core.rollups import rebuild_daily_stats, wrong_daily_stats
+
+
+class Command(BaseCommand):
+    help = "Полный пересчет дневных сводок по мастерам и услугам (панель аналитики)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--check", action="store_true", help="Только проверить расхождения, не пересчитывая")
+
+    def handle(self, *args, **options):
+        if options["check"]:
+            masters, services = wrong_daily_stats()
+            self.stdout.write(f"Неверных строк: мастера - {masters}, услуги - {services}")
+            return
+        with transaction.atomic():
+            rebuild_daily_stats()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Пересчитано строк: мастера - {DailyMasterStat.objects.count()}, "
+                f"услуги - {DailyServiceStat.objects.count()}"
+            )
+        )
@@ -0,0 +1,55 @@
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core import seeding
+
+
+class Command(BaseCommand):
+    help = """Заполнить БД данными реального объема для нагрузочных тестов:
+    мастера, услуги, записи (с услугами) и отзывы. Данные добавляются к уже
+    имеющимся, сигналы не отправляются, денормализованные данные пересчитываются
+    в конце. Одинаковые --seed и --end на пустой базе дают одинаковые данные.
+        manage.py seed_scale --visits 10000000 --reviews 200000 --masters 50"""
+
+    def add_arguments(self, parser):
+        parser.add_argument("--visits", type=int, default=100000)
+        parser.add_argument("--reviews", type=int, default=5000)
+        parser.add_argument("--masters", type=int, default=10)
+        parser.add_argument("--services", type=int, default=12)
+        parser.add_argument("--years", type=int, default=3, help="За сколько лет создаются записи и отзывы")
+        parser.add_argument("--end", help="Дата последней записи, ГГГГ-ММ-ДД (по умолчанию сегодня)")
+        parser.add_argument("--seed", type=int, default=1)
+        parser.add_argument("--chunk-size", type=int, default=10000, help="Строк в одной транзакции")
+
+    def handle(self, *args, **options):
+        end = None
+        if options["end"]:
+            try:
+                end = timezone.make_aware(datetime.strptime(options["end"], "%Y-%m-%d"))
+            except ValueError:
+                raise CommandError("--end: дата в формате ГГГГ-ММ-ДД")
+        if options["masters"] < 1:
+            raise CommandError("--masters: нужен хотя бы один мастер")
+        if options["services"] < 1:
+            raise CommandError("--services: нужна хотя бы одна услуга, записи без услуг не создаются")
+        start = time.perf_counter()
+        masters, services = seeding.seed_catalog(options["masters"], options["services"], working_hours=True)
+        self.stdout.write(f"Мастеров: {len(masters)}, услуг: {len(services)}")
+
+        def progress(created):
+            elapsed = time.perf_counter() - start
+            self.stdout.write(f"\rЗаписей: {created} ({created / elapsed:.0f}/с)", ending="")
+            self.stdout.flush()
+
+        seed = options["seed"]
+        common = {"seed": seed, "years": options["years"], "end": end, "chunk_size": options["chunk_size"]}
+        seeding.seed_visits(options["visits"], masters, on_chunk=progress, **common)
+        self.stdout.write("")
+        seeding.seed_reviews(options["reviews"], masters, **common)
+        self.stdout.write(f"Отзывов: {options['reviews']}")
+        self.stdout.write("Пересчет статистики клиентов, дневных сводок и рейтингов...")
+        seeding.finish()
+        self.stdout.write(self.style.SUCCESS(f"Готово за {time.perf_counter() - start:.1f} с"))
@@ -0,0 +1,52 @@
+import asyncio
+
+import telegram
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.notifications import dispatch_batch, queue_depth
+
+
+class Command(BaseCommand):
+    help = "Воркер очереди уведомлений: отправляет сообщения из outbox в Telegram"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50, help="Сообщений за один проход")
+        parser.add_argument("--interval", type=float, default=2.0, help="Пауза между проходами, сек")
+        parser.add_argument("--once", action="store_true", help="Разобрать очередь один раз и выйти")
+        parser.add_argument("--stats", action="store_true", help="Только показать размер очереди")
+
+    def handle(self, *args, **options):
+        try:
+            asyncio.run(self.run(options))
+        except KeyboardInterrupt:
+            self.stdout.write("Остановлено")
+
+    async def run(self, options):
+        if options["stats"]:
+            self.stdout.write(f"В очереди: {await queue_depth()}")
+            return
+
+        # Один клиент на все время работы воркера.
+        # Если Telegram недоступен на старте, не падаем: сообщения
+        # останутся в очереди и уйдут на следующих попытках
+        bot = telegram.Bot(token=settings.TELEGRAM_BOT_TOKEN)
+        try:
+            await bot.initialize()
+        except telegram.error.TelegramError as e:
+            self.stderr.write(f"Не удалось инициализировать бота: {e}")
+        try:
+            while True:
+                sent, failed = await dispatch_batch(bot, options["batch_size"])
+                if sent or failed:
+                    self.stdout.write(
+                        f"Отправлено: {sent}, ошибок: {failed}, в очереди: {await queue_depth()}"
+                    )
+                # Пачка была полной - сразу берем следующую
+                if sent + failed >= options["batch_size"]:
+                    continue
+                if options["once"]:
+                    return
+                await asyncio.sleep(options["interval"])
+        finally:
+            await bot.shutdown()
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from core.availability import warm
+from core.models import Master
+from core.scheduling import DAYS_AHEAD
+
+
+class Command(BaseCommand):
+    help = "Заполнить кэш свободного времени мастеров после деплоя (имеет смысл с общим кэшем, CACHE_BACKEND)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=DAYS_AHEAD, help="На сколько дней вперед")
+
+    def handle(self, *args, **options):
+        master_ids = list(Master.objects.values_list("id", flat=True))
+        warm(master_ids, days=options["days"])
+        self.stdout.write(
+            self.style.SUCCESS(f"Кэш свободного времени заполнен: мастеров - {len(master_ids)}, дней - {options['days']}")
+        )
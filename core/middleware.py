@@ -0,0 +1,152 @@
+"""
+Кэш готовых страниц для анонимных посетителей.
+
+Страницы из settings.PAGE_CACHE_PATHS после первого рендера хранятся в кэше
+settings.PAGE_CACHE_ALIAS в виде шаблона с "дырками": вместо CSRF-токена и
+блока сообщений (messages) в HTML стоят метки, которые на каждом запросе
+заменяются значениями текущего посетителя. Ключ кэша и ETag зависят от версий
+данных (core.catalog.get_version), поэтому любое изменение каталога сразу
+дает новую страницу без явной очистки кэша.
+
+Страница, которая устаревает со временем (ближайшее свободное время мастеров
+на главной), задает срок в request.page_cache_expires: до него ограничивается
+время хранения в кэше, и он входит в ETag.
+"""
+import hashlib
+import math
+import re
+import time
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotModified
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.http import http_date, parse_http_date_safe
+
+from .catalog import get_version
+
+CSRF_HOLE = "<!--page-cache:csrf-->"
+MESSAGES_HOLE = "<!--page-cache:messages-->"
+
+# Значение CSRF-токена в отрендеренной форме ({% csrf_token %})
+CSRF_VALUE_RE = re.compile(r'(name="csrfmiddlewaretoken" value=")[^"]*(")')
+# Блок сообщений в base.html обрамлен этими комментариями
+MESSAGES_BLOCK_RE = re.compile(r"<!--messages-->.*?<!--/messages-->", re.DOTALL)
+
+
+class PageCacheMiddleware:
+    """
+    Должен стоять после SessionMiddleware, AuthenticationMiddleware и MessageMiddleware.
+    Работает и под ASGI: некэшируемые пути проходят без перехода в синхронный поток,
+    чтобы асинхронные представления (AsyncBookingView) оставались асинхронными.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process(request, self.get_response)
+
+    async def __acall__(self, request):
+        if request.path not in settings.PAGE_CACHE_PATHS:
+            return await self.get_response(request)
+        return await sync_to_async(self.process)(request, async_to_sync(self.get_response))
+
+    def process(self, request, get_response):
+        if not self.is_cacheable_request(request):
+            return get_response(request)
+
+        versions = [get_version(name) for name in settings.PAGE_CACHE_VERSIONS]
+        tag = hashlib.md5(f"{request.path}:{versions}".encode()).hexdigest()
+        cache = caches[settings.PAGE_CACHE_ALIAS]
+        key = f"page:{tag}"
+
+        entry = cache.get(key)
+        if entry is None or (entry["expires"] and entry["expires"] <= time.time()):
+            response = get_response(request)
+            if self.is_cacheable_response(response):
+                entry = self.make_entry(request, response)
+                timeout = settings.PAGE_CACHE_TIMEOUT
+                if entry["expires"]:
+                    timeout = min(timeout, math.ceil(entry["expires"] - time.time()))
+                if timeout > 0:
+                    cache.set(key, entry, timeout)
+                response["X-Page-Cache"] = "miss"
+                self.set_validators(response, tag, entry)
+            return response
+
+        storage = get_messages(request)
+        # 304 только если у клиента уже есть CSRF-кука, к которой подходит
+        # токен из его копии страницы, и ему нечего показать из сообщений
+        if (
+            self.not_modified(request, self.etag(tag, entry), entry["created"])
+            and settings.CSRF_COOKIE_NAME in request.COOKIES
+            and not len(storage)
+        ):
+            response = HttpResponseNotModified()
+            self.set_validators(response, tag, entry)
+            return response
+
+        content = entry["content"].replace(CSRF_HOLE, get_token(request))
+        content = content.replace(
+            MESSAGES_HOLE, render_to_string("includes/messages.html", {"messages": storage})
+        )
+        response = HttpResponse(content, content_type=entry["content_type"])
+        response["X-Page-Cache"] = "hit"
+        self.set_validators(response, tag, entry)
+        return response
+
+    def is_cacheable_request(self, request):
+        return (
+            request.method in ("GET", "HEAD")
+            and request.path in settings.PAGE_CACHE_PATHS
+            and not request.GET
+            and not request.user.is_authenticated
+        )
+
+    def is_cacheable_response(self, response):
+        # Страницы, которые ставят свои куки (кроме CSRF), не кэшируем
+        return (
+            response.status_code == 200
+            and not response.streaming
+            and not (set(response.cookies) - {settings.CSRF_COOKIE_NAME})
+        )
+
+    def not_modified(self, request, etag, created):
+        if "If-None-Match" in request.headers:
+            return request.headers["If-None-Match"] == etag
+        since = parse_http_date_safe(request.headers.get("If-Modified-Since"))
+        return since is not None and since >= int(created)
+
+    def make_entry(self, request, response):
+        content = response.content.decode(response.charset)
+        content = CSRF_VALUE_RE.sub(rf"\g<1>{CSRF_HOLE}\g<2>", content)
+        content = MESSAGES_BLOCK_RE.sub(MESSAGES_HOLE, content)
+        expires = getattr(request, "page_cache_expires", None)
+        return {
+            "content": content,
+            "content_type": response["Content-Type"],
+            "created": time.time(),
+            "expires": expires.timestamp() if expires else None,
+        }
+
+    def etag(self, tag, entry):
+        # Та же страница после срока - другое представление: старая копия не получит 304
+        return f'W/"{tag}-{int(entry["expires"])}"' if entry["expires"] else f'W/"{tag}"'
+
+    def set_validators(self, response, tag, entry):
+        response["ETag"] = self.etag(tag, entry)
+        response["Last-Modified"] = http_date(entry["created"])
+        # Страница содержит CSRF-токен посетителя: общим кэшам (CDN, прокси)
+        # хранить ее нельзя, а браузер должен перепроверять ее по ETag
+        response["Cache-Control"] = "private, no-cache"
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:52
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_alter_review_options'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Notification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField(verbose_name='Текст')),
+                ('chat_id', models.CharField(max_length=64, verbose_name='ID чата')),
+                ('status', models.IntegerField(choices=[(0, 'В очереди'), (1, 'Отправлено'), (2, 'Ошибка')], default=0, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('next_attempt_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Следующая попытка')),
+                ('last_error', models.TextField(blank=True, verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Дата отправки')),
+            ],
+            options={
+                'verbose_name': 'Уведомление',
+                'verbose_name_plural': 'Уведомления',
+                'indexes': [models.Index(fields=['status', 'next_attempt_at'], name='core_notifi_status_7787d3_idx')],
+            },
+        ),
+    ]
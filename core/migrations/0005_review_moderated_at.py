@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:53
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_moderated(apps, schema_editor):
+    # Старые отзывы уже проверялись синхронно при создании,
+    # воркер не должен отправлять их в Mistral повторно
+    Review = apps.get_model('core', 'Review')
+    Review.objects.update(moderated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_notification'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='moderated_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Дата автомодерации'),
+        ),
+        migrations.RunPython(mark_existing_moderated, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_review_moderated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModerationVerdict',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_hash', models.CharField(max_length=64, unique=True, verbose_name='Хэш текста')),
+                ('verdict', models.BooleanField(verbose_name='Отзыв корректный')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')),
+            ],
+            options={
+                'verbose_name': 'Вердикт модерации',
+                'verbose_name_plural': 'Вердикты модерации',
+            },
+        ),
+    ]
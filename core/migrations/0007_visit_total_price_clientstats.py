@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_moderationverdict'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClientStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('phone', models.CharField(max_length=20, unique=True, verbose_name='Телефон')),
+                ('visit_count', models.PositiveIntegerField(db_index=True, default=0, verbose_name='Количество записей')),
+            ],
+            options={
+                'verbose_name': 'Статистика клиента',
+                'verbose_name_plural': 'Статистика клиентов',
+            },
+        ),
+        migrations.AddField(
+            model_name='visit',
+            name='total_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='Общая сумма'),
+        ),
+        migrations.AlterField(
+            model_name='visit',
+            name='phone',
+            field=models.CharField(db_index=True, max_length=20, verbose_name='Телефон'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+from django.db.models import Count, DecimalField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def backfill(apps, schema_editor):
+    Visit = apps.get_model('core', 'Visit')
+    ClientStats = apps.get_model('core', 'ClientStats')
+
+    # Сумма услуг каждой записи одним UPDATE с подзапросом
+    total = (
+        Visit.services.through.objects.filter(visit=OuterRef('pk'))
+        .values('visit')
+        .annotate(total=Sum('service__price'))
+        .values('total')
+    )
+    Visit.objects.update(
+        total_price=Coalesce(Subquery(total), 0, output_field=DecimalField(max_digits=10, decimal_places=2))
+    )
+
+    # Количество записей по телефонам
+    ClientStats.objects.bulk_create(
+        ClientStats(phone=row['phone'], visit_count=row['visit_count'])
+        for row in Visit.objects.values('phone').annotate(visit_count=Count('id')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_visit_total_price_clientstats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,70 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:00
+
+import re
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def normalize_phone(phone):
+    # Копия core.models.normalize_phone на момент миграции
+    digits = re.sub(r'\D', '', phone or '')
+    if len(digits) == 11 and digits.startswith('8'):
+        digits = '7' + digits[1:]
+    elif len(digits) == 10 and digits.startswith('9'):
+        digits = '7' + digits
+    return digits
+
+
+def fill_phone_digits(apps, schema_editor):
+    Visit = apps.get_model('core', 'Visit')
+    ClientStats = apps.get_model('core', 'ClientStats')
+
+    batch = []
+    for visit in Visit.objects.only('id', 'phone').iterator(chunk_size=2000):
+        visit.phone_digits = normalize_phone(visit.phone)
+        batch.append(visit)
+        if len(batch) >= 2000:
+            Visit.objects.bulk_update(batch, ['phone_digits'])
+            batch = []
+    Visit.objects.bulk_update(batch, ['phone_digits'])
+
+    # Постоянные клиенты теперь считаются по нормализованному номеру
+    ClientStats.objects.all().delete()
+    ClientStats.objects.bulk_create(
+        ClientStats(phone=row['phone_digits'], visit_count=row['visit_count'])
+        for row in Visit.objects.values('phone_digits').annotate(visit_count=Count('id')).order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_backfill_visit_totals'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='visit',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=20, verbose_name='Телефон (цифры)'),
+        ),
+        migrations.AlterField(
+            model_name='visit',
+            name='phone',
+            field=models.CharField(max_length=20, verbose_name='Телефон'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['created_at'], name='core_visit_created_4d6338_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['master', 'created_at'], name='core_visit_master__1556bb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='visit',
+            index=models.Index(fields=['status', 'created_at'], name='core_visit_status_d23685_idx'),
+        ),
+        migrations.RunPython(fill_phone_digits, migrations.RunPython.noop),
+    ]
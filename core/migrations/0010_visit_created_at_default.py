@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_visit_phone_digits_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='visit',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False, verbose_name='Дата создания'),
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_visit_created_at_default'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyMasterStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('visits', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('completed', models.PositiveIntegerField(default=0, verbose_name='Выполнено')),
+                ('cancelled', models.PositiveIntegerField(default=0, verbose_name='Отменено')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.master', verbose_name='Мастер')),
+            ],
+            options={
+                'verbose_name': 'Статистика мастера за день',
+                'verbose_name_plural': 'Статистика мастеров по дням',
+                'constraints': [models.UniqueConstraint(fields=('day', 'master'), name='unique_daily_master_stat')],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyServiceStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(verbose_name='День')),
+                ('visits', models.PositiveIntegerField(default=0, verbose_name='Записей')),
+                ('completed', models.PositiveIntegerField(default=0, verbose_name='Выполнено')),
+                ('cancelled', models.PositiveIntegerField(default=0, verbose_name='Отменено')),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Выручка')),
+                ('service', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.service', verbose_name='Услуга')),
+            ],
+            options={
+                'verbose_name': 'Статистика услуги за день',
+                'verbose_name_plural': 'Статистика услуг по дням',
+                'constraints': [models.UniqueConstraint(fields=('day', 'service'), name='unique_daily_service_stat')],
+            },
+        ),
+    ]
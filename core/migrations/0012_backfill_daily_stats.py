@@ -0,0 +1,48 @@
+from django.db import migrations
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+
+
+def stat_values(prefix, price):
+    # Копия core.rollups.stat_values на момент миграции
+    return {
+        'visits': Count(f'{prefix}id'),
+        'completed': Count(f'{prefix}id', filter=Q(**{f'{prefix}status': 3})),
+        'cancelled': Count(f'{prefix}id', filter=Q(**{f'{prefix}status': 2})),
+        'revenue': Coalesce(
+            Sum(price, filter=Q(**{f'{prefix}status': 3})), 0,
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    }
+
+
+def backfill(apps, schema_editor):
+    Visit = apps.get_model('core', 'Visit')
+    DailyMasterStat = apps.get_model('core', 'DailyMasterStat')
+    DailyServiceStat = apps.get_model('core', 'DailyServiceStat')
+
+    DailyMasterStat.objects.bulk_create(
+        DailyMasterStat(**row)
+        for row in Visit.objects.annotate(day=TruncDate('created_at'))
+        .values('day', 'master_id')
+        .annotate(**stat_values('', 'total_price'))
+        .order_by()
+    )
+    DailyServiceStat.objects.bulk_create(
+        DailyServiceStat(**row)
+        for row in Visit.services.through.objects.annotate(day=TruncDate('visit__created_at'))
+        .values('day', 'service_id')
+        .annotate(**stat_values('visit__', 'service__price'))
+        .order_by()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_daily_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
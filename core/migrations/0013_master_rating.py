@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:24
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_backfill_daily_stats'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MasterRating',
+            fields=[
+                ('master', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='rating_stats', serialize=False, to='core.master', verbose_name='Мастер')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Отзывов')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')),
+                ('r1', models.PositiveIntegerField(default=0, verbose_name='Оценок 1')),
+                ('r2', models.PositiveIntegerField(default=0, verbose_name='Оценок 2')),
+                ('r3', models.PositiveIntegerField(default=0, verbose_name='Оценок 3')),
+                ('r4', models.PositiveIntegerField(default=0, verbose_name='Оценок 4')),
+                ('r5', models.PositiveIntegerField(default=0, verbose_name='Оценок 5')),
+            ],
+            options={
+                'verbose_name': 'Рейтинг мастера',
+                'verbose_name_plural': 'Рейтинги мастеров',
+            },
+        ),
+    ]
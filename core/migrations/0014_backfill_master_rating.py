@@ -0,0 +1,38 @@
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill(apps, schema_editor):
+    # Копия core.ratings.rebuild_master_ratings на момент миграции
+    Review = apps.get_model('core', 'Review')
+    MasterRating = apps.get_model('core', 'MasterRating')
+
+    ratings = {}
+    for row in (
+        Review.objects.filter(status__in=(0, 2))
+        .values('master_id', 'rating')
+        .annotate(n=Count('id'))
+        .order_by()
+    ):
+        stats = ratings.setdefault(row['master_id'], {f'r{rating}': 0 for rating in range(1, 6)})
+        stats[f"r{row['rating']}"] = row['n']
+    MasterRating.objects.bulk_create(
+        MasterRating(
+            master_id=master_id,
+            count=sum(stats.values()),
+            total=sum(int(key[1:]) * n for key, n in stats.items()),
+            **stats,
+        )
+        for master_id, stats in ratings.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_master_rating'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop),
+    ]
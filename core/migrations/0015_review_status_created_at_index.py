@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_backfill_master_rating'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['status', 'created_at'], name='core_review_status_1a7233_idx'),
+        ),
+    ]
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_review_status_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='service',
+            name='duration',
+            field=models.PositiveSmallIntegerField(default=30, verbose_name='Длительность, мин'),
+        ),
+        migrations.AddField(
+            model_name='visit',
+            name='start_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Время визита'),
+        ),
+        migrations.CreateModel(
+            name='VisitSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField(verbose_name='Начало')),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.master', verbose_name='Мастер')),
+                ('visit', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='core.visit', verbose_name='Запись')),
+            ],
+            options={
+                'verbose_name': 'Занятое время',
+                'verbose_name_plural': 'Занятое время',
+                'constraints': [models.UniqueConstraint(fields=('master', 'start'), name='unique_visit_slot')],
+            },
+        ),
+        migrations.CreateModel(
+            name='WorkingHours',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Понедельник'), (1, 'Вторник'), (2, 'Среда'), (3, 'Четверг'), (4, 'Пятница'), (5, 'Суббота'), (6, 'Воскресенье')], verbose_name='День недели')),
+                ('start', models.TimeField(verbose_name='Начало')),
+                ('end', models.TimeField(verbose_name='Конец')),
+                ('master', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='working_hours', to='core.master', verbose_name='Мастер')),
+            ],
+            options={
+                'verbose_name': 'Рабочее время',
+                'verbose_name_plural': 'Рабочее время',
+                'ordering': ['weekday'],
+                'constraints': [models.UniqueConstraint(fields=('master', 'weekday'), name='unique_working_hours')],
+            },
+        ),
+    ]
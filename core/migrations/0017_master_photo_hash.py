@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_scheduling'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='master',
+            name='photo_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='Хэш фотографии'),
+        ),
+    ]
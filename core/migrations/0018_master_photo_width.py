@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_master_photo_hash'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='master',
+            name='photo_width',
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True, verbose_name='Ширина фотографии'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_master_photo_width'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='review',
+            name='moderation_attempts',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Попыток автомодерации'),
+        ),
+        migrations.AddField(
+            model_name='review',
+            name='next_moderation_at',
+            field=models.DateTimeField(blank=True, default=django.utils.timezone.now, editable=False, null=True, verbose_name='Следующая автомодерация'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['status', 'next_moderation_at'], name='core_review_status_974a09_idx'),
+        ),
+    ]
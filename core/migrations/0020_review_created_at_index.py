@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_review_moderation_attempts'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['created_at'], name='core_review_created_25a366_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_review_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='notification',
+            name='status',
+            field=models.IntegerField(choices=[(0, 'В очереди'), (1, 'Отправлено'), (2, 'Ошибка'), (3, 'Отправляется')], default=0, verbose_name='Статус'),
+        ),
+    ]
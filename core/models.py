@@ -1,8 +1,76 @@
 
 from django.db import models
 from django.core.validators import MinLengthValidator
+from django.utils import timezone
+from datetime import datetime, time, timedelta
+import re
 
 
+def normalize_phone(phone):
+    """
+    Телефон -> только цифры в едином формате: '+7 (999) 123-45-67',
+    '8 999 123 45 67' и '9991234567' превращаются в '79991234567'
+    """
+    digits = re.sub(r'\D', '', phone or '')
+    if len(digits) == 11 and digits.startswith('8'):
+        digits = '7' + digits[1:]
+    elif len(digits) == 10 and digits.startswith('9'):
+        digits = '7' + digits
+    return digits
+
+
+class VisitQuerySet(models.QuerySet):
+    """Фильтры списка записей: общие для админки и выгрузки (manage.py export_visits)"""
+
+    # Ценовые категории фильтра PriceRangeFilter: (больше, не больше)
+    PRICE_RANGES = {
+        'low': (None, 1000),
+        'medium': (1000, 3000),
+        'high': (3000, None),
+    }
+    # С какого количества записей клиент считается постоянным
+    REGULAR_VISITS = 3
+
+    def price_range(self, value):
+        if value not in self.PRICE_RANGES:
+            return self
+        # total_price хранится в самой записи (с индексом), считать сумму не нужно
+        above, up_to = self.PRICE_RANGES[value]
+        queryset = self
+        if above is not None:
+            queryset = queryset.filter(total_price__gt=above)
+        if up_to is not None:
+            queryset = queryset.filter(total_price__lte=up_to)
+        return queryset
+
+    def regular_clients(self, value):
+        """value: 'yes' - постоянные клиенты, 'no' - остальные"""
+        # Телефоны берем из ClientStats по индексу вместо GROUP BY по всем записям
+        if value == 'yes':
+            phones = ClientStats.objects.filter(visit_count__gte=self.REGULAR_VISITS)
+        elif value == 'no':
+            phones = ClientStats.objects.filter(visit_count__lt=self.REGULAR_VISITS)
+        else:
+            return self
+        return self.filter(phone_digits__in=phones.values('phone'))
+
+    def created_between(self, date_from=None, date_to=None):
+        """
+        Записи, созданные в дни с date_from по date_to включительно. Сравнение
+        с началом дня в часовом поясе проекта, а не created_at__date: условие
+        на сам столбец использует индекс (status, created_at)
+        """
+        queryset = self
+        if date_from:
+            queryset = queryset.filter(created_at__gte=self.day_start(date_from))
+        if date_to:
+            queryset = queryset.filter(created_at__lt=self.day_start(date_to + timedelta(days=1)))
+        return queryset
+
+    @staticmethod
+    def day_start(day):
+        return timezone.make_aware(datetime.combine(day, time.min))
+
 
 # Класс для записи на стрижку
 class Visit(models.Model):
@@ -16,18 +84,56 @@ class Visit(models.Model):
 
     name = models.CharField(max_length=100, verbose_name='Имя')
     phone = models.CharField(max_length=20, verbose_name='Телефон')
+    # Телефон без форматирования (normalize_phone), заполняется в save().
+    # По нему ищут записи и считают постоянных клиентов
+    phone_digits = models.CharField(max_length=20, blank=True, editable=False, db_index=True, verbose_name='Телефон (цифры)')
     comment = models.TextField(blank=True, verbose_name='Комментарий')
-    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    # default, а не auto_now_add: при импорте (core/imports.py) сохраняется исходная дата
+    created_at = models.DateTimeField(default=timezone.now, editable=False, verbose_name='Дата создания')
     status = models.IntegerField(choices=STATUS_CHOICES, default=0, verbose_name='Статус')
     master = models.ForeignKey('Master', on_delete=models.CASCADE, verbose_name='Мастер')
     services = models.ManyToManyField('Service', verbose_name='Услуги')
+    # Сумма цен услуг. Хранится в записи, чтобы фильтровать и сортировать по индексу,
+    # поддерживается сигналами (core/aggregates.py)
+    total_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, editable=False, db_index=True, verbose_name='Общая сумма')
+    # Время визита. Занятое время мастера хранится в VisitSlot (core/scheduling.py)
+    start_at = models.DateTimeField(null=True, blank=True, verbose_name='Время визита')
+
+    objects = VisitQuerySet.as_manager()
 
     def __str__(self):
         return f'{self.name} - {self.phone}'
 
+    def save(self, *args, **kwargs):
+        self.phone_digits = normalize_phone(self.phone)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'phone' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'phone_digits'}
+        super().save(*args, **kwargs)
+
     class Meta:
         verbose_name = "Запись"
         verbose_name_plural = "Записи"
+        indexes = [
+            # Список заявок: сортировка по дате, фильтры по мастеру и статусу
+            models.Index(fields=['created_at']),
+            models.Index(fields=['master', 'created_at']),
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+
+# Сколько записей у клиента с данным телефоном (Visit.phone_digits).
+# Поддерживается сигналами, нужна для фильтра "Постоянные клиенты"
+class ClientStats(models.Model):
+    phone = models.CharField(max_length=20, unique=True, verbose_name='Телефон')
+    visit_count = models.PositiveIntegerField(default=0, db_index=True, verbose_name='Количество записей')
+
+    def __str__(self):
+        return f'{self.phone} - {self.visit_count}'
+
+    class Meta:
+        verbose_name = 'Статистика клиента'
+        verbose_name_plural = 'Статистика клиентов'
 
 
 # Класс для мастеров
@@ -37,6 +143,10 @@ class Master(models.Model):
     phone = models.CharField(max_length=20, verbose_name='Телефон')
     address = models.CharField(max_length=255, verbose_name='Домашний адрес')
     photo = models.ImageField(upload_to='masters/photos/', blank=True, null=True, verbose_name='Фотография')
+    # Хэш содержимого фото: по нему лежат уменьшенные копии (core/images.py)
+    photo_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name='Хэш фотографии')
+    # Ширина оригинала: копии шире него не делаются
+    photo_width = models.PositiveIntegerField(null=True, blank=True, editable=False, verbose_name='Ширина фотографии')
     services = models.ManyToManyField('Service', related_name='masters', verbose_name='Услуги')
 
     def __str__(self):
@@ -52,6 +162,7 @@ class Service(models.Model):
     name = models.CharField(max_length=200, verbose_name='Название')
     description = models.TextField(verbose_name='Описание')
     price = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='Цена')
+    duration = models.PositiveSmallIntegerField(default=30, verbose_name='Длительность, мин')
 
     def __str__(self):
         return self.name
@@ -98,7 +209,175 @@ class Review(models.Model):
     rating = models.IntegerField(choices=RAITING_CHOICES, verbose_name='Рейтинг')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
     status = models.IntegerField(choices=STATUS_CHOICES, default=1, verbose_name='Статус')
-    
+    # Когда отзыв прошел автомодерацию (пусто - еще ждет воркер moderate_reviews)
+    moderated_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата автомодерации')
+    # Попытки автомодерации без ответа модели и время следующей (пусто - попытки
+    # кончились, отзыв ждет ручной проверки)
+    moderation_attempts = models.PositiveIntegerField(default=0, editable=False, verbose_name='Попыток автомодерации')
+    next_moderation_at = models.DateTimeField(default=timezone.now, null=True, blank=True, editable=False, verbose_name='Следующая автомодерация')
+
+    # Статусы, в которых отзыв виден посетителям и учитывается в рейтинге мастера
+    VISIBLE_STATUSES = (0, 2)
+
     class Meta:
         verbose_name = 'Отзыв'
         verbose_name_plural = 'Отзывы'
+        indexes = [
+            # Лента опубликованных отзывов: фильтр по статусу, сортировка по дате
+            models.Index(fields=['status', 'created_at']),
+            # Список отзывов в админке: все статусы, сортировка по дате
+            models.Index(fields=['created_at']),
+            # Воркер модерации выбирает отзывы по статусу и времени следующей попытки
+            models.Index(fields=['status', 'next_moderation_at']),
+        ]
+
+
+# Очередь уведомлений в Telegram (outbox).
+# Сигналы только кладут сюда сообщение, а отправкой занимается
+# отдельный процесс: python manage.py send_notifications
+class Notification(models.Model):
+    STATUS_CHOICES = [
+        (0, 'В очереди'),
+        (1, 'Отправлено'),
+        (2, 'Ошибка'),
+        (3, 'Отправляется'),
+    ]
+
+    text = models.TextField(verbose_name='Текст')
+    chat_id = models.CharField(max_length=64, verbose_name='ID чата')
+    status = models.IntegerField(choices=STATUS_CHOICES, default=0, verbose_name='Статус')
+    attempts = models.PositiveIntegerField(default=0, verbose_name='Попыток')
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name='Следующая попытка')
+    last_error = models.TextField(blank=True, verbose_name='Последняя ошибка')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name='Дата отправки')
+
+    def __str__(self):
+        return f'{self.get_status_display()} - {self.created_at}'
+
+    class Meta:
+        verbose_name = 'Уведомление'
+        verbose_name_plural = 'Уведомления'
+        # Воркер выбирает сообщения по статусу и времени следующей попытки
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+
+# Кэш вердиктов автомодерации по хэшу нормализованного текста отзыва,
+# чтобы одинаковые отзывы (спам, дубли) не отправлялись в Mistral повторно
+class ModerationVerdict(models.Model):
+    text_hash = models.CharField(max_length=64, unique=True, verbose_name='Хэш текста')
+    verdict = models.BooleanField(verbose_name='Отзыв корректный')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='Дата создания')
+
+    def __str__(self):
+        return f'{self.text_hash[:12]} - {self.verdict}'
+
+    class Meta:
+        verbose_name = 'Вердикт модерации'
+        verbose_name_plural = 'Вердикты модерации'
+
+
+# Дневная статистика по мастерам и услугам (core/rollups.py).
+# Поддерживается сигналами, панель аналитики в админке читает только эти таблицы.
+# Выручка - сумма по выполненным записям (статус "Выполнена")
+class DailyMasterStat(models.Model):
+    day = models.DateField(verbose_name='День')
+    master = models.ForeignKey('Master', on_delete=models.CASCADE, verbose_name='Мастер')
+    visits = models.PositiveIntegerField(default=0, verbose_name='Записей')
+    completed = models.PositiveIntegerField(default=0, verbose_name='Выполнено')
+    cancelled = models.PositiveIntegerField(default=0, verbose_name='Отменено')
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Выручка')
+
+    def __str__(self):
+        return f'{self.day} - {self.master}'
+
+    class Meta:
+        verbose_name = 'Статистика мастера за день'
+        verbose_name_plural = 'Статистика мастеров по дням'
+        constraints = [models.UniqueConstraint(fields=['day', 'master'], name='unique_daily_master_stat')]
+
+
+class DailyServiceStat(models.Model):
+    day = models.DateField(verbose_name='День')
+    service = models.ForeignKey('Service', on_delete=models.CASCADE, verbose_name='Услуга')
+    visits = models.PositiveIntegerField(default=0, verbose_name='Записей')
+    completed = models.PositiveIntegerField(default=0, verbose_name='Выполнено')
+    cancelled = models.PositiveIntegerField(default=0, verbose_name='Отменено')
+    revenue = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name='Выручка')
+
+    def __str__(self):
+        return f'{self.day} - {self.service}'
+
+    class Meta:
+        verbose_name = 'Статистика услуги за день'
+        verbose_name_plural = 'Статистика услуг по дням'
+        constraints = [models.UniqueConstraint(fields=['day', 'service'], name='unique_daily_service_stat')]
+
+
+# Рейтинг мастера по видимым отзывам (Review.VISIBLE_STATUSES): количество,
+# сумма оценок и количество каждой оценки. Поддерживается сигналами и массовыми
+# действиями через core/ratings.py, проверка: manage.py check_denormalized
+class MasterRating(models.Model):
+    master = models.OneToOneField('Master', on_delete=models.CASCADE, primary_key=True, related_name='rating_stats', verbose_name='Мастер')
+    count = models.PositiveIntegerField(default=0, verbose_name='Отзывов')
+    total = models.PositiveIntegerField(default=0, verbose_name='Сумма оценок')
+    r1 = models.PositiveIntegerField(default=0, verbose_name='Оценок 1')
+    r2 = models.PositiveIntegerField(default=0, verbose_name='Оценок 2')
+    r3 = models.PositiveIntegerField(default=0, verbose_name='Оценок 3')
+    r4 = models.PositiveIntegerField(default=0, verbose_name='Оценок 4')
+    r5 = models.PositiveIntegerField(default=0, verbose_name='Оценок 5')
+
+    @property
+    def average(self):
+        return round(self.total / self.count, 1) if self.count else None
+
+    def __str__(self):
+        return f'{self.master} - {self.average} ({self.count})'
+
+    class Meta:
+        verbose_name = 'Рейтинг мастера'
+        verbose_name_plural = 'Рейтинги мастеров'
+
+
+# Рабочее время мастера по дням недели (0 - понедельник). Нет строки - выходной
+class WorkingHours(models.Model):
+    WEEKDAY_CHOICES = [
+        (0, 'Понедельник'),
+        (1, 'Вторник'),
+        (2, 'Среда'),
+        (3, 'Четверг'),
+        (4, 'Пятница'),
+        (5, 'Суббота'),
+        (6, 'Воскресенье'),
+    ]
+
+    master = models.ForeignKey('Master', on_delete=models.CASCADE, related_name='working_hours', verbose_name='Мастер')
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, verbose_name='День недели')
+    start = models.TimeField(verbose_name='Начало')
+    end = models.TimeField(verbose_name='Конец')
+
+    def __str__(self):
+        return f'{self.master} - {self.get_weekday_display()} {self.start:%H:%M}-{self.end:%H:%M}'
+
+    class Meta:
+        verbose_name = 'Рабочее время'
+        verbose_name_plural = 'Рабочее время'
+        ordering = ['weekday']
+        constraints = [models.UniqueConstraint(fields=['master', 'weekday'], name='unique_working_hours')]
+
+
+# Занятые интервалы мастера (core/scheduling.py): запись на N минут занимает
+# N / SLOT_MINUTES строк. Уникальность (мастер, начало) не дает двум записям
+# занять одно время даже при одновременных запросах
+class VisitSlot(models.Model):
+    master = models.ForeignKey('Master', on_delete=models.CASCADE, verbose_name='Мастер')
+    start = models.DateTimeField(verbose_name='Начало')
+    visit = models.ForeignKey('Visit', on_delete=models.CASCADE, related_name='slots', verbose_name='Запись')
+
+    def __str__(self):
+        return f'{self.master} - {self.start}'
+
+    class Meta:
+        verbose_name = 'Занятое время'
+        verbose_name_plural = 'Занятое время'
+        constraints = [models.UniqueConstraint(fields=['master', 'start'], name='unique_visit_slot')]
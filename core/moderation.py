@@ -0,0 +1,141 @@
+"""
+Фоновая модерация отзывов.
+
+Отзыв сохраняется сразу со статусом "Не проверен", а воркер
+(manage.py moderate_reviews) пачками отправляет новые отзывы в Mistral
+с ограничением на число одновременных запросов и таймаутом,
+после чего записывает статусы одним bulk_update.
+
+Отзывы, по которым модель не ответила, откладываются с экспоненциальной
+задержкой, как сообщения в очереди уведомлений: они не занимают начало
+очереди на каждом проходе. После MAX_ATTEMPTS попыток отзыв остается
+"Не проверен" для ручной модерации.
+"""
+import asyncio
+import logging
+from collections import Counter
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+
+from .catalog import bump_version
+from .models import Review
+from .notifications import enqueue_notification, retry_delay
+from .ratings import apply_rating_changes
+from .utlils import cached_verdicts, check_review_async, remember_verdicts, review_text_hash
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 8
+
+
+def pending_reviews():
+    """Новые отзывы, которые еще не проходили автомодерацию и которые пора проверить"""
+    return Review.objects.filter(
+        status=1, moderated_at__isnull=True, next_moderation_at__lte=timezone.now()
+    ).order_by('next_moderation_at', 'id')
+
+
+async def moderate_batch(reviews, client, concurrency=5, timeout=30):
+    """
+    Проверить пачку отзывов, возвращает {review.id: True/False}.
+    Сначала вердикты ищутся в кэше (фильтр, память, БД), одинаковые тексты
+    отправляются в модель один раз, не больше concurrency запросов сразу.
+    Отзывы, по которым модель не ответила, в результат не попадают
+    и будут проверены на следующем проходе.
+    """
+    keys = {review.id: review_text_hash(review.text) for review in reviews}
+    known = await sync_to_async(cached_verdicts)([review.text for review in reviews])
+
+    # Уникальные тексты, которых нет в кэше
+    to_check = {}
+    for review in reviews:
+        key = keys[review.id]
+        if key not in known:
+            to_check.setdefault(key, review.text)
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check(key, text):
+        async with semaphore:
+            try:
+                return key, await check_review_async(text, client, timeout)
+            except Exception as e:
+                logger.error(f"Ошибка модерации отзыва {key[:12]}: {e}")
+                return key, None
+
+    results = await asyncio.gather(*(check(key, text) for key, text in to_check.items()))
+    answered = {key: verdict for key, verdict in results if verdict is not None}
+    if answered:
+        await sync_to_async(remember_verdicts)(answered)
+    known.update(answered)
+    return {review.id: known[keys[review.id]] for review in reviews if keys[review.id] in known}
+
+
+def review_message(review):
+    return f"""
+*Новый отзыв*
+
+*Имя:* {review.name}
+*Отзыв:* {review.text or 'не указан'}
+*Дата создания:* {review.created_at}
+*Ссылка на админ-панель:* http://127.0.0.1:8000/admin/core/review/{review.id}/change/
+-------------------------------------------------------------
+"""
+
+
+@transaction.atomic
+def apply_verdicts(reviews, verdicts):
+    """Записать статусы одним запросом и поставить уведомления об одобренных в очередь"""
+    now = timezone.now()
+    checked = []
+    for review in reviews:
+        if review.id not in verdicts:
+            continue
+        # Прошел проверку - статус 2 (Одобрен), иначе 3 (Отклонен)
+        review.status = 2 if verdicts[review.id] else 3
+        review.moderated_at = now
+        checked.append(review)
+    # Снимаем с выборки только отзывы, которые все еще ждут модерации:
+    # админ мог успеть поменять статус вручную, пока ждали ответ модели
+    still_pending = set(
+        pending_reviews().filter(id__in=[r.id for r in checked]).values_list('id', flat=True)
+    )
+    checked = [review for review in checked if review.id in still_pending]
+    Review.objects.bulk_update(checked, ['status', 'moderated_at'])
+    # bulk_update не отправляет сигналы: одобренные отзывы добавляем в рейтинг
+    # и в ленту отзывов сами
+    approved = Counter(
+        (review.master_id, review.rating) for review in checked if review.status in Review.VISIBLE_STATUSES
+    )
+    apply_rating_changes(approved)
+    if approved:
+        bump_version('reviews')
+    for review in checked:
+        if review.status == 2:
+            enqueue_notification(review_message(review))
+    return checked
+
+
+def postpone(reviews):
+    """Отзывы без ответа модели: следующая попытка позже, после MAX_ATTEMPTS - только вручную"""
+    now = timezone.now()
+    for review in reviews:
+        review.moderation_attempts += 1
+        review.next_moderation_at = (
+            now + retry_delay(review.moderation_attempts) if review.moderation_attempts < MAX_ATTEMPTS else None
+        )
+    Review.objects.bulk_update(reviews, ['moderation_attempts', 'next_moderation_at'])
+
+
+async def moderate_pending(client, batch_size=20, concurrency=5, timeout=30):
+    """Один проход воркера. Возвращает (проверено, одобрено, без ответа)"""
+    reviews = [r async for r in pending_reviews()[:batch_size]]
+    if not reviews:
+        return 0, 0, 0
+    verdicts = await moderate_batch(reviews, client, concurrency, timeout)
+    checked = await sync_to_async(apply_verdicts)(reviews, verdicts)
+    await sync_to_async(postpone)([review for review in reviews if review.id not in verdicts])
+    approved = sum(1 for review in checked if review.status == 2)
+    return len(checked), approved, len(reviews) - len(verdicts)
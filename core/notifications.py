@@ -0,0 +1,119 @@
+"""
+Очередь уведомлений в Telegram (outbox).
+
+Сигналы вызывают enqueue_notification() и сразу возвращают управление,
+запись в очередь идет в той же транзакции, что и сохранение записи/отзыва.
+Отправкой занимается воркер (manage.py send_notifications): он пачками
+забирает сообщения из очереди и отправляет их через один долгоживущий
+клиент telegram.Bot, повторяя неудачные попытки с экспоненциальной задержкой.
+
+Перед отправкой воркер забирает сообщение себе условным UPDATE (статус
+"В очереди" -> "Отправляется"), поэтому два воркера (или воркер и ручной
+запуск) не отправят одно сообщение дважды. Если воркер упал посреди
+отправки, сообщение возвращается в работу через CLAIM_TIMEOUT.
+"""
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Notification
+from .telegram_bot import send_telegram_message
+
+logger = logging.getLogger(__name__)
+
+# После стольких неудачных попыток сообщение помечается как ошибочное
+MAX_ATTEMPTS = 8
+# Задержка перед повтором: 5с, 10с, 20с ... но не больше 10 минут
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 600
+# Сообщение "Отправляется" дольше этого считается брошенным и забирается снова
+CLAIM_TIMEOUT = timedelta(minutes=5)
+
+# Внутри suppress_notifications() сигналы не ставят сообщения в очередь
+notifications_suppressed = ContextVar('notifications_suppressed', default=False)
+
+
+@contextmanager
+def suppress_notifications():
+    """Массовые операции (импорт) отправляют одно итоговое сообщение вместо сообщения на каждую запись"""
+    token = notifications_suppressed.set(True)
+    try:
+        yield
+    finally:
+        notifications_suppressed.reset(token)
+
+
+def enqueue_notification(message, chat_id=None):
+    """Положить сообщение в очередь на отправку"""
+    return Notification.objects.create(
+        text=message,
+        chat_id=chat_id or settings.YOUR_PERSONAL_CHAT_ID or '',
+    )
+
+
+def retry_delay(attempts):
+    """Задержка перед следующей попыткой после attempts неудачных"""
+    seconds = RETRY_BASE_SECONDS * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, RETRY_MAX_SECONDS))
+
+
+def pending_notifications():
+    """Сообщения, которые пора отправить (в том числе брошенные упавшим воркером)"""
+    return Notification.objects.filter(
+        status__in=(0, 3), next_attempt_at__lte=timezone.now()
+    ).order_by('next_attempt_at', 'id')
+
+
+async def queue_depth():
+    """Количество сообщений, ожидающих отправки"""
+    return await Notification.objects.filter(status__in=(0, 3)).acount()
+
+
+async def claim(notification):
+    """
+    Забрать сообщение себе. UPDATE выполняется, только если строка не изменилась
+    с момента чтения: второй воркер, прочитавший ту же строку, получит 0 строк.
+    """
+    claimed = await Notification.objects.filter(
+        pk=notification.pk,
+        status=notification.status,
+        next_attempt_at=notification.next_attempt_at,
+    ).aupdate(status=3, next_attempt_at=timezone.now() + CLAIM_TIMEOUT)
+    return claimed == 1
+
+
+async def dispatch_batch(bot, batch_size=50):
+    """
+    Отправить одну пачку сообщений через уже открытый клиент bot.
+    Возвращает пару (отправлено, ошибок).
+    """
+    batch = [n async for n in pending_notifications()[:batch_size]]
+    sent = failed = 0
+    for notification in batch:
+        if not await claim(notification):
+            # Сообщение уже забрал другой воркер
+            continue
+        try:
+            await send_telegram_message(
+                settings.TELEGRAM_BOT_TOKEN, notification.chat_id, notification.text, bot=bot
+            )
+        except Exception as e:
+            failed += 1
+            attempts = notification.attempts + 1
+            fields = {'attempts': attempts, 'last_error': str(e)}
+            if attempts >= MAX_ATTEMPTS:
+                fields['status'] = 2
+            else:
+                fields['status'] = 0
+                fields['next_attempt_at'] = timezone.now() + retry_delay(attempts)
+            await Notification.objects.filter(pk=notification.pk).aupdate(**fields)
+        else:
+            sent += 1
+            await Notification.objects.filter(pk=notification.pk).aupdate(
+                status=1, attempts=notification.attempts + 1, sent_at=timezone.now()
+            )
+    return sent, failed
@@ -0,0 +1,172 @@
+"""
+Постраничный вывод по курсору (keyset pagination).
+
+Вместо OFFSET n следующая страница выбирается условием "после последней
+показанной строки": (created_at, id) < (курсор). Такой запрос идет по индексу
+и стоит O(размер страницы) на любой глубине, а общее количество строк
+считается отдельно и кэшируется, чтобы не выполнять COUNT(*) на каждом запросе.
+Курсор - это значения ключей крайней строки, закодированные в base64 для URL.
+"""
+import base64
+import hashlib
+import json
+
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+
+CURSOR_VAR = "cursor"
+
+
+class KeysetPage:
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+
+class KeysetPaginator:
+    """
+    ordering - поля ключа в порядке сортировки, последнее должно быть уникальным
+    (обычно id), например ("-created_at", "-id").
+    count_timeout - сколько секунд хранить в кэше общее количество строк.
+    """
+
+    def __init__(self, queryset, per_page, ordering=("-created_at", "-id"), count_timeout=60):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self.fields = [name.lstrip("-") for name in ordering]
+        self.count_timeout = count_timeout
+
+    @property
+    def count(self):
+        """Количество строк, закэшированное по тексту запроса"""
+        sql, params = self.queryset.query.sql_with_params()
+        key = "keyset-count:" + hashlib.md5(f"{sql}{params}".encode()).hexdigest()
+        return cache.get_or_set(key, self.queryset.count, self.count_timeout)
+
+    def encode_cursor(self, direction, values):
+        values = [value.isoformat() if hasattr(value, "isoformat") else value for value in values]
+        data = json.dumps([direction, values], default=str)
+        return base64.urlsafe_b64encode(data.encode()).decode()
+
+    def decode_cursor(self, cursor):
+        """
+        (направление, значения ключа) или None, если курсора нет или он испорчен.
+        Курсор приходит из URL, поэтому любой мусор дает первую страницу, а не 500
+        """
+        if not cursor:
+            return None
+        try:
+            direction, values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            model = self.queryset.model
+            values = [
+                model._meta.get_field(name).to_python(value)
+                for name, value in zip(self.fields, values, strict=True)
+            ]
+        except (ValueError, TypeError, LookupError, ValidationError):
+            return None
+        # NULL в условии сравнения - ошибка запроса, у настоящего курсора его нет
+        if direction not in ("next", "prev") or None in values:
+            return None
+        return direction, values
+
+    def after(self, values, ordering):
+        """Условие "строка идет после values" для заданного порядка сортировки"""
+        condition = Q()
+        equal = Q()
+        for name, value in zip(ordering, values):
+            field = name.lstrip("-")
+            lookup = "lt" if name.startswith("-") else "gt"
+            condition |= equal & Q(**{f"{field}__{lookup}": value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def page(self, cursor=None):
+        position = self.decode_cursor(cursor)
+        ordering = self.ordering
+        backwards = position is not None and position[0] == "prev"
+        if backwards:
+            # Назад - идем в обратном порядке и разворачиваем результат
+            ordering = [name[1:] if name.startswith("-") else f"-{name}" for name in ordering]
+
+        queryset = self.queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.after(position[1], ordering))
+        # Сначала берем только ключи (по индексу), на одну строку больше страницы,
+        # чтобы узнать, есть ли продолжение
+        keys = list(queryset.values_list(*self.fields)[: self.per_page + 1])
+        has_more = len(keys) > self.per_page
+        keys = keys[: self.per_page]
+        if backwards:
+            keys.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        object_list = self.queryset.filter(pk__in=[key[-1] for key in keys]).order_by(*self.ordering)
+        return KeysetPage(
+            object_list,
+            self,
+            self.encode_cursor("next", keys[-1]) if keys and has_next else None,
+            self.encode_cursor("prev", keys[0]) if keys and has_previous else None,
+        )
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Список объектов в админке с переходом по курсору.
+    Курсор используется, пока список отсортирован по умолчанию (keyset_ordering);
+    если пользователь выбрал сортировку по колонке, работает обычная пагинация.
+    Порядок ключа берется из ModelAdmin.keyset_ordering.
+    Ссылки рисует шаблон admin/<app>/<model>/pagination.html.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self.keyset_page = None
+        super().__init__(request, *args, **kwargs)
+        # Ссылки сортировки и фильтров не должны тащить за собой курсор
+        self.params.pop(CURSOR_VAR, None)
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def get_results(self, request):
+        if ORDER_VAR in request.GET:
+            return super().get_results(request)
+
+        ordering = getattr(self.model_admin, "keyset_ordering", ("-created_at", "-id"))
+        paginator = KeysetPaginator(self.queryset, self.list_per_page, ordering)
+        page = paginator.page(self.cursor)
+        self.keyset_page = page
+        self.paginator = paginator
+        self.result_list = page.object_list
+        self.result_count = paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = False
+        self.first_url = self.get_query_string(remove=[CURSOR_VAR])
+        self.next_url = page.next_cursor and self.get_query_string({CURSOR_VAR: page.next_cursor})
+        self.previous_url = page.previous_cursor and self.get_query_string(
+            {CURSOR_VAR: page.previous_cursor}
+        )
@@ -88,4 +88,35 @@ True
 Отзыв:
 {review_text}
 
-"""
\ No newline at end of file
+"""
+
+# Шаблоны быстрого фильтра перед обращением к Mistral.
+# Проверяются по нормализованному тексту (нижний регистр, ё -> е,
+# знаки препинания заменены пробелами).
+# Совпадение = отзыв отклоняется сразу, без вызова модели.
+PREFILTER_PATTERNS = [
+    # Мат и оскорбления (корни слов)
+    r"\bх[уy][йеияю]",
+    r"\bпизд",
+    r"\b(за|вы|по|на|от|раз|до)?[её]б(а|л|у|ну|ись)",
+    r"\bбля",
+    r"\bмуда[кч]",
+    r"\bпид[оа]р",
+    r"\bгандон",
+    r"\bшлюх",
+    r"\bсук[аиу]\b",
+    r"\bтвар[иь]\b",
+    # Реклама
+    r"\bпромокод",
+    r"\bподписывайтесь\b",
+]
+
+# Ссылки проверяются по исходному тексту в нижнем регистре: после нормализации
+# точка пропадает, и обычное "Lada ru" не отличить от "lada.ru".
+# Нужна схема или домен целиком (точка без пробелов вокруг).
+PREFILTER_LINK_PATTERNS = [
+    r"\bhttps?://",
+    r"\bwww\.\w",
+    r"\bt\.me/",
+    r"\b[a-zа-я0-9-]+\.(ru|com|net|org|рф)\b",
+]
@@ -0,0 +1,250 @@
+"""
+Ограничение частоты POST-запросов к формам и подавление повторных записей.
+
+Оба middleware стоят после CsrfViewMiddleware и проверяют запрос в
+process_view, то есть после проверки CSRF: поддельная отправка с чужого сайта
+не расходует лимиты посетителя, не занимает ключ повтора и не получит
+"Спасибо" вместо настоящей записи. Проверка CSRF, сессии и пользователь не
+обращаются к БД, пока их не прочитает представление, поэтому 429 по-прежнему
+отдается без запросов к БД.
+
+RateLimitMiddleware отвечает 429 раньше, чем запрос дойдет до формы. Для
+каждого пути из settings.RATELIMIT_RULES заданы "ведра токенов" (token bucket)
+по IP и по нормализованному телефону: capacity запросов подряд, дальше - не
+чаще capacity за period секунд.
+
+Состояние ведер хранится в памяти процесса (MemoryBackend) или в общем кэше
+(CacheBackend, settings.RATELIMIT_BACKEND = 'cache'), если воркеров несколько.
+
+DuplicateBookingMiddleware схлопывает одинаковые отправки формы записи
+одного клиента (двойной клик, повтор после таймаута) в одну запись. Он стоит
+перед RateLimitMiddleware: повтор формы не расходует лимит. Пока первая отправка
+обрабатывается и еще settings.BOOKING_DEDUP_WINDOW секунд после успеха,
+такая же отправка не создает новую запись: после успеха она получает
+редирект на страницу "Спасибо", а пока первая не завершилась - 409 (первая
+еще может не пройти, например если время уже заняли).
+"""
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.shortcuts import redirect
+
+from .models import normalize_phone
+
+
+class TokenBucket:
+    def __init__(self, capacity, period):
+        self.capacity = capacity
+        self.period = period
+        self.rate = capacity / period
+
+    def take(self, state, now):
+        """(разрешено, новое состояние, через сколько секунд появится токен)"""
+        tokens, updated = state or (self.capacity, now)
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        if tokens >= 1:
+            return True, (tokens - 1, now), 0
+        return False, (tokens, now), (1 - tokens) / self.rate
+
+
+class MemoryBackend:
+    """
+    Ведра в словаре процесса: быстро, но у каждого воркера свои лимиты.
+    Ведер не больше MAX_KEYS: при переборе телефонов забываются самые давние
+    """
+
+    MAX_KEYS = 10000
+    # Через час без запросов ведро точно наполнено, его можно забыть
+    MAX_AGE = 60 * 60
+
+    def __init__(self):
+        # Порядок - по последнему запросу, впереди самые давние
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, key, bucket):
+        now = time.monotonic()
+        with self.lock:
+            allowed, state, retry_after = bucket.take(self.buckets.pop(key, None), now)
+            self.buckets[key] = state
+            self.prune(now)
+        return allowed, retry_after
+
+    def prune(self, now):
+        # Наполнившееся ведро ничем не отличается от отсутствующего
+        while self.buckets:
+            _, updated = next(iter(self.buckets.values()))
+            if len(self.buckets) <= self.MAX_KEYS and now - updated < self.MAX_AGE:
+                break
+            self.buckets.popitem(last=False)
+
+
+class CacheBackend:
+    """
+    Ведра в общем кэше Django (Redis, memcached): лимиты общие для всех воркеров.
+    Чтение и запись ведра защищены блокировкой через cache.add; если ее не
+    удалось получить, запрос считается превысившим лимит - так бывает только
+    при потоке одновременных запросов с одного ключа.
+    """
+
+    LOCK_ATTEMPTS = 5
+    LOCK_WAIT = 0.002
+
+    def __init__(self, alias="default"):
+        self.cache = caches[alias]
+
+    def take(self, key, bucket):
+        lock = f"{key}:lock"
+        for _ in range(self.LOCK_ATTEMPTS):
+            if self.cache.add(lock, 1, 1):
+                break
+            time.sleep(self.LOCK_WAIT)
+        else:
+            return False, 1
+        try:
+            now = time.time()
+            allowed, state, retry_after = bucket.take(self.cache.get(key), now)
+            self.cache.set(key, state, int(bucket.period) + 1)
+        finally:
+            self.cache.delete(lock)
+        return allowed, retry_after
+
+
+BACKENDS = {
+    "memory": MemoryBackend,
+    "cache": lambda: CacheBackend(settings.RATELIMIT_CACHE_ALIAS),
+}
+
+
+def client_ip(request):
+    """IP клиента; за прокси - из заголовка settings.RATELIMIT_IP_HEADER (например HTTP_X_REAL_IP)"""
+    header = getattr(settings, "RATELIMIT_IP_HEADER", None)
+    if header and request.META.get(header):
+        return request.META[header].split(",")[0].strip()
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def request_keys(request):
+    """Значения, по которым считаются лимиты: {'ip': ..., 'phone': ...}"""
+    return {
+        "ip": client_ip(request),
+        "phone": normalize_phone(request.POST.get("phone", "")),
+    }
+
+
+class SyncAsyncMiddleware:
+    """
+    Общая часть: process_view() до представления (после проверки CSRF), after()
+    после; под ASGI - в отдельном потоке
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        self.after(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        await sync_to_async(self.after)(request, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        return None
+
+    def after(self, request, response):
+        pass
+
+
+class RateLimitMiddleware(SyncAsyncMiddleware):
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.backend = BACKENDS[settings.RATELIMIT_BACKEND]()
+        self.rules = {
+            path: {kind: TokenBucket(*limit) for kind, limit in limits.items()}
+            for path, limits in settings.RATELIMIT_RULES.items()
+        }
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not settings.RATELIMIT_ENABLED or request.method != "POST":
+            return None
+        buckets = self.rules.get(request.path)
+        if not buckets:
+            return None
+        keys = request_keys(request)
+        for kind, bucket in buckets.items():
+            if not keys.get(kind):
+                continue
+            allowed, retry_after = self.backend.take(f"ratelimit:{request.path}:{kind}:{keys[kind]}", bucket)
+            if not allowed:
+                response = HttpResponse(
+                    "Слишком много запросов, попробуйте позже", status=429, content_type="text/plain; charset=utf-8"
+                )
+                response["Retry-After"] = max(1, round(retry_after))
+                return response
+        return None
+
+
+def booking_fingerprint(request):
+    """Хэш клиента и содержимого формы записи: одинаковые отправки одного клиента дают одинаковый хэш"""
+    data = {
+        # Одинаковые данные от разных клиентов - разные записи
+        "ip": client_ip(request),
+        "name": " ".join(request.POST.get("name", "").lower().split()),
+        "phone": normalize_phone(request.POST.get("phone", "")),
+        "comment": " ".join(request.POST.get("comment", "").split()),
+        "master": request.POST.get("master", ""),
+        "services": sorted(request.POST.getlist("services")),
+        "start_at": request.POST.get("start_at", ""),
+    }
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+class DuplicateBookingMiddleware(SyncAsyncMiddleware):
+    PENDING = "pending"
+    DONE = "done"
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method != "POST" or request.path not in settings.BOOKING_PATHS:
+            return None
+        cache = caches[settings.RATELIMIT_CACHE_ALIAS]
+        request.booking_key = f"booking:{booking_fingerprint(request)}"
+        # add атомарен: из одновременных одинаковых отправок проходит одна
+        if cache.add(request.booking_key, self.PENDING, settings.BOOKING_DEDUP_WINDOW):
+            return None
+        key, request.booking_key = request.booking_key, None
+        if cache.get(key) == self.DONE:
+            return redirect("thanks")
+        # Первая отправка еще обрабатывается и может не пройти - "Спасибо" рано
+        response = HttpResponse(
+            "Такая запись уже отправлена и обрабатывается", status=409, content_type="text/plain; charset=utf-8"
+        )
+        response["Retry-After"] = 1
+        return response
+
+    def after(self, request, response):
+        key = getattr(request, "booking_key", None)
+        if not key:
+            return
+        cache = caches[settings.RATELIMIT_CACHE_ALIAS]
+        if response.status_code == 302:
+            cache.set(key, self.DONE, settings.BOOKING_DEDUP_WINDOW)
+        else:
+            # Форма с ошибками: исправленную или повторную отправку не блокируем
+            cache.delete(key)
@@ -0,0 +1,142 @@
+"""
+Рейтинги мастеров (MasterRating) по видимым отзывам.
+
+Когда отзыв становится видимым или перестает им быть, в строке мастера
+меняются счетчики на +1/-1 через F()-выражения, без пересчета по всем отзывам.
+Обычные save()/delete() обрабатывают сигналы (core/signals.py). Массовые
+изменения статуса (экшены админки, автомодерация) идут через set_review_status()
+или apply_rating_changes(), потому что queryset.update() и bulk_update()
+сигналов не отправляют.
+
+Для главной страницы рейтинги кэшируются под версией 'ratings', она же входит
+в PAGE_CACHE_VERSIONS, поэтому страница обновляется сразу после изменения.
+"""
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+
+from .catalog import bump_version, get_version
+from .models import MasterRating, Review
+
+RATINGS = range(1, 6)
+
+
+def rating_row(counts):
+    """Поля MasterRating из {оценка: количество}"""
+    row = {f"r{rating}": counts.get(rating, 0) for rating in RATINGS}
+    row["count"] = sum(counts.values())
+    row["total"] = sum(rating * count for rating, count in counts.items())
+    return row
+
+
+def actual_ratings(master_ids=None, using="default"):
+    """{id мастера: поля MasterRating}, посчитанные по отзывам"""
+    reviews = Review.objects.using(using).filter(status__in=Review.VISIBLE_STATUSES)
+    if master_ids is not None:
+        reviews = reviews.filter(master_id__in=master_ids)
+    counts = {}
+    for row in reviews.values("master_id", "rating").annotate(n=Count("id")).order_by():
+        counts.setdefault(row["master_id"], {})[row["rating"]] = row["n"]
+    return {master_id: rating_row(by_rating) for master_id, by_rating in counts.items()}
+
+
+def refresh_master_ratings(master_ids):
+    """Пересчитать рейтинги указанных мастеров по отзывам"""
+    master_ids = set(master_ids)
+    if not master_ids:
+        return
+    rows = actual_ratings(master_ids)
+    MasterRating.objects.filter(master_id__in=master_ids - set(rows)).delete()
+    MasterRating.objects.bulk_create(
+        [MasterRating(master_id=master_id, **row) for master_id, row in rows.items()],
+        update_conflicts=True,
+        unique_fields=["master"],
+        update_fields=["count", "total", *(f"r{rating}" for rating in RATINGS)],
+    )
+    bump_version("ratings")
+
+
+def rebuild_master_ratings(using="default"):
+    MasterRating.objects.using(using).all().delete()
+    MasterRating.objects.using(using).bulk_create(
+        MasterRating(master_id=master_id, **row) for master_id, row in actual_ratings(using=using).items()
+    )
+    bump_version("ratings")
+
+
+def apply_rating_changes(changes):
+    """changes: {(id мастера, оценка): +n/-n} - сколько отзывов стало видимыми/скрытыми"""
+    missing = set()
+    for (master_id, rating), delta in changes.items():
+        if not delta:
+            continue
+        updated = MasterRating.objects.filter(master_id=master_id).update(
+            count=F("count") + delta,
+            total=F("total") + delta * rating,
+            **{f"r{rating}": F(f"r{rating}") + delta},
+        )
+        if not updated:
+            # Строки еще нет (первый отзыв мастера) - считаем целиком
+            missing.add(master_id)
+    refresh_master_ratings(missing)
+    if any(changes.values()):
+        bump_version("ratings")
+
+
+def review_changes(old, new):
+    """
+    Изменение рейтингов при переходе отзыва из состояния old в new.
+    Состояние - (id мастера, оценка, статус) или None (отзыва нет).
+    """
+    changes = Counter()
+    for state, sign in ((old, -1), (new, 1)):
+        if state and state[2] in Review.VISIBLE_STATUSES:
+            changes[state[0], state[1]] += sign
+    return changes
+
+
+def set_review_status(queryset, status):
+    """queryset.update(status=status) с обновлением рейтингов, возвращает число отзывов"""
+    with transaction.atomic():
+        becomes_visible = status in Review.VISIBLE_STATUSES
+        visible = Q(status__in=Review.VISIBLE_STATUSES)
+        # Рейтинг меняют только отзывы, у которых меняется видимость
+        changing = queryset.exclude(visible) if becomes_visible else queryset.filter(visible)
+        sign = 1 if becomes_visible else -1
+        changes = Counter(
+            {
+                (row["master_id"], row["rating"]): sign * row["n"]
+                for row in changing.values("master_id", "rating").annotate(n=Count("id")).order_by()
+            }
+        )
+        updated = queryset.update(status=status)
+        apply_rating_changes(changes)
+    if changes:
+        # Изменился и состав ленты опубликованных отзывов (core/reviews.py)
+        bump_version("reviews")
+    return updated
+
+
+def wrong_master_ratings():
+    """Мастера, у которых сохраненный рейтинг не совпадает с отзывами: {id: (сохранено, должно быть)}"""
+    fields = ["count", "total", *(f"r{rating}" for rating in RATINGS)]
+    stored = {row.pop("master_id"): row for row in MasterRating.objects.values("master_id", *fields)}
+    actual = actual_ratings()
+    empty = dict.fromkeys(fields, 0)
+    return {
+        master_id: (stored.get(master_id, empty), actual.get(master_id, empty))
+        for master_id in set(stored) | set(actual)
+        if stored.get(master_id, empty) != actual.get(master_id, empty)
+    }
+
+
+def get_ratings():
+    """{id мастера: MasterRating} для главной страницы, из кэша"""
+    key = f"ratings:{get_version('ratings')}"
+    ratings = cache.get(key)
+    if ratings is None:
+        ratings = {rating.master_id: rating for rating in MasterRating.objects.all()}
+        cache.set(key, ratings, None)
+    return ratings
@@ -0,0 +1,44 @@
+"""
+Лента опубликованных отзывов (статусы Review.VISIBLE_STATUSES) для главной
+страницы и страницы /reviews/.
+
+Отзывы выбираются по курсору (created_at, id) через индекс (status, created_at),
+а готовый HTML страницы ленты кэшируется под версиями 'reviews' и 'catalog'
+(в карточке отзыва есть имя мастера). Версию 'reviews' увеличивают сигналы
+Review и массовые изменения статуса (core/ratings.set_review_status,
+автомодерация), поэтому новый опубликованный отзыв виден сразу.
+"""
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .catalog import get_version
+from .models import Review
+from .pagination import KeysetPaginator
+
+PER_PAGE = 6
+CACHE_TIMEOUT = 60 * 60 * 24
+
+
+def published_reviews():
+    return Review.objects.filter(status__in=Review.VISIBLE_STATUSES).select_related('master')
+
+
+def reviews_feed(cursor=None, per_page=PER_PAGE):
+    """
+    Страница ленты из кэша: {'html': ..., 'next_cursor': ..., 'previous_cursor': ...}.
+    Испорченный курсор дает первую страницу.
+    """
+    paginator = KeysetPaginator(published_reviews(), per_page)
+    if paginator.decode_cursor(cursor) is None:
+        cursor = None
+    key = f"reviews:{get_version('reviews')}:{get_version('catalog')}:{per_page}:{cursor or ''}"
+    feed = cache.get(key)
+    if feed is None:
+        page = paginator.page(cursor)
+        feed = {
+            'html': render_to_string('includes/reviews.html', {'reviews': list(page)}),
+            'next_cursor': page.next_cursor,
+            'previous_cursor': page.previous_cursor,
+        }
+        cache.set(key, feed, CACHE_TIMEOUT)
+    return feed
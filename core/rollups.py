@@ -0,0 +1,207 @@
+"""
+Дневные сводки по мастерам и услугам: DailyMasterStat и DailyServiceStat.
+
+Строка сводки (день, мастер) или (день, услуга) пересчитывается целиком
+запросом к записям только этого дня - так же, как пересчитываются
+денормализованные значения в core/aggregates.py. Сигналы (core/signals.py)
+пересчитывают только затронутые дни, rebuild_daily_stats() - все сразу
+(manage.py rebuild_daily_stats). День считается в TIME_ZONE проекта.
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db.models import Count, DecimalField, Q, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import DailyMasterStat, DailyServiceStat, Visit
+
+COMPLETED = 3
+CANCELLED = 2
+
+STAT_FIELDS = ["visits", "completed", "cancelled", "revenue"]
+
+
+def stat_values(visit_prefix="", price="total_price"):
+    """Агрегаты для строки сводки; visit_prefix - путь к записи ('visit__' для связей с услугами)"""
+    visit_id = f"{visit_prefix}id"
+    status = f"{visit_prefix}status"
+    return {
+        "visits": Count(visit_id),
+        "completed": Count(visit_id, filter=Q(**{status: COMPLETED})),
+        "cancelled": Count(visit_id, filter=Q(**{status: CANCELLED})),
+        "revenue": Coalesce(
+            Sum(price, filter=Q(**{status: COMPLETED})), 0,
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+    }
+
+
+def day_range(day):
+    """Начало и конец дня: диапазон по created_at использует индексы записи"""
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+def group_by_day(buckets):
+    days = defaultdict(set)
+    for day, pk in buckets:
+        days[day].add(pk)
+    return days
+
+
+def save_stats(model, key, day, ids, rows):
+    """Заменить строки сводки model за день day для объектов ids на rows"""
+    model.objects.filter(day=day, **{f"{key}_id__in": ids}).exclude(
+        **{f"{key}_id__in": [row[f"{key}_id"] for row in rows]}
+    ).delete()
+    model.objects.bulk_create(
+        [model(day=day, **row) for row in rows],
+        update_conflicts=True,
+        unique_fields=["day", key],
+        update_fields=STAT_FIELDS,
+    )
+
+
+def refresh_master_days(buckets):
+    """Пересчитать сводку для пар (день, id мастера)"""
+    for day, master_ids in group_by_day(buckets).items():
+        start, end = day_range(day)
+        rows = list(
+            Visit.objects.filter(created_at__gte=start, created_at__lt=end, master_id__in=master_ids)
+            .values("master_id")
+            .annotate(**stat_values())
+            .order_by()
+        )
+        save_stats(DailyMasterStat, "master", day, master_ids, rows)
+
+
+def refresh_service_days(buckets):
+    """Пересчитать сводку для пар (день, id услуги)"""
+    through = Visit.services.through
+    for day, service_ids in group_by_day(buckets).items():
+        start, end = day_range(day)
+        rows = list(
+            through.objects.filter(
+                visit__created_at__gte=start, visit__created_at__lt=end, service_id__in=service_ids
+            )
+            .values("service_id")
+            .annotate(**stat_values("visit__", "service__price"))
+            .order_by()
+        )
+        save_stats(DailyServiceStat, "service", day, service_ids, rows)
+
+
+def master_buckets(visits):
+    return set(
+        visits.annotate(day=TruncDate("created_at")).values_list("day", "master_id").distinct().order_by()
+    )
+
+
+def service_buckets(visits):
+    return set(
+        Visit.services.through.objects.filter(visit__in=visits)
+        .annotate(day=TruncDate("visit__created_at"))
+        .values_list("day", "service_id")
+        .distinct()
+        .order_by()
+    )
+
+
+def refresh_daily_stats(visits):
+    """Пересчитать сводки всех дней, мастеров и услуг, которых касаются записи visits"""
+    refresh_master_days(master_buckets(visits))
+    refresh_service_days(service_buckets(visits))
+
+
+def actual_master_stats(using="default"):
+    return (
+        Visit.objects.using(using).annotate(day=TruncDate("created_at"))
+        .values("day", "master_id")
+        .annotate(**stat_values())
+        .order_by()
+    )
+
+
+def actual_service_stats(using="default"):
+    return (
+        Visit.services.through.objects.using(using).annotate(day=TruncDate("visit__created_at"))
+        .values("day", "service_id")
+        .annotate(**stat_values("visit__", "service__price"))
+        .order_by()
+    )
+
+
+def rebuild_daily_stats(using="default"):
+    DailyMasterStat.objects.using(using).all().delete()
+    DailyServiceStat.objects.using(using).all().delete()
+    DailyMasterStat.objects.using(using).bulk_create(
+        DailyMasterStat(**row) for row in actual_master_stats(using)
+    )
+    DailyServiceStat.objects.using(using).bulk_create(
+        DailyServiceStat(**row) for row in actual_service_stats(using)
+    )
+
+
+def wrong_daily_stats():
+    """Количество строк сводок, которые не совпадают с пересчетом: (мастера, услуги)"""
+
+    def mismatches(model, key, actual):
+        stored = {
+            (row["day"], row[key]): tuple(row[field] for field in STAT_FIELDS)
+            for row in model.objects.values("day", key, *STAT_FIELDS)
+        }
+        expected = {
+            (row["day"], row[key]): tuple(row[field] for field in STAT_FIELDS) for row in actual
+        }
+        return sum(
+            stored.get(bucket) != expected.get(bucket) for bucket in set(stored) | set(expected)
+        )
+
+    return (
+        mismatches(DailyMasterStat, "master_id", actual_master_stats()),
+        mismatches(DailyServiceStat, "service_id", actual_service_stats()),
+    )
+
+
+def dashboard_data(days=30):
+    """Данные для графиков панели аналитики за последние days дней, только из сводок"""
+    since = timezone.localdate() - timedelta(days=days - 1)
+    totals = {
+        row["day"]: row
+        for row in DailyMasterStat.objects.filter(day__gte=since)
+        .values("day")
+        .annotate(**{field: Sum(field) for field in STAT_FIELDS})
+        .order_by()
+    }
+    calendar = [since + timedelta(days=i) for i in range(days)]
+    empty = dict.fromkeys(STAT_FIELDS, 0)
+    masters = (
+        DailyMasterStat.objects.filter(day__gte=since)
+        .values("master_id", "master__first_name", "master__last_name")
+        .annotate(**{field: Sum(field) for field in STAT_FIELDS})
+        .order_by("-revenue")
+    )
+    services = (
+        DailyServiceStat.objects.filter(day__gte=since)
+        .values("service_id", "service__name")
+        .annotate(**{field: Sum(field) for field in STAT_FIELDS})
+        .order_by("-revenue")[:10]
+    )
+    return {
+        "days": [day.strftime("%d.%m") for day in calendar],
+        "revenue": [float(totals.get(day, empty)["revenue"]) for day in calendar],
+        "visits": [totals.get(day, empty)["visits"] for day in calendar],
+        "completed": [totals.get(day, empty)["completed"] for day in calendar],
+        "cancelled": [totals.get(day, empty)["cancelled"] for day in calendar],
+        "masters": {
+            "labels": [f"{row['master__first_name']} {row['master__last_name']}" for row in masters],
+            "revenue": [float(row["revenue"]) for row in masters],
+            "visits": [row["visits"] for row in masters],
+        },
+        "services": {
+            "labels": [row["service__name"] for row in services],
+            "revenue": [float(row["revenue"]) for row in services],
+            "visits": [row["visits"] for row in services],
+        },
+    }
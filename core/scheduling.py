@@ -0,0 +1,165 @@
+"""
+Расписание мастеров: свободное время и бронирование.
+
+Рабочий день мастера (WorkingHours) делится на интервалы по SLOT_MINUTES минут.
+Запись занимает столько интервалов подряд, сколько нужно на сумму
+длительностей ее услуг (Service.duration), и на каждый интервал создается
+строка VisitSlot. Уникальный индекс (master, start) делает бронирование
+атомарным: из двух одновременных записей на одно время вставка второй
+падает с IntegrityError, и она получает SlotTaken. Проверять "свободно ли"
+перед вставкой не нужно - это решает база.
+
+free_slots() читает рабочее время мастера и занятые интервалы за период
+двумя запросами по индексам, остальное считается в памяти. Длительности
+услуг берутся из кэша каталога (core/catalog.py).
+
+После изменения занятого времени отправляется сигнал slots_changed - по нему
+обновляется кэш свободного времени (core/availability.py).
+"""
+import math
+from datetime import datetime, timedelta
+
+from django.db import IntegrityError, transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .catalog import get_catalog
+from .models import VisitSlot, WorkingHours
+
+SLOT_MINUTES = 15
+SLOT = timedelta(minutes=SLOT_MINUTES)
+DAYS_AHEAD = 14
+
+# Занятое время мастера изменилось: master_id, days - затронутые дни
+slots_changed = Signal()
+
+
+class SlotTaken(Exception):
+    """Время занято, уже прошло или не попадает в рабочее время мастера"""
+
+
+def visit_length(service_ids):
+    """Сколько интервалов подряд занимают услуги"""
+    durations = {service.pk: service.duration for service in get_catalog()['services']}
+    minutes = sum(durations.get(pk, 0) for pk in service_ids)
+    return max(1, math.ceil(minutes / SLOT_MINUTES))
+
+
+def working_periods(master_id, first_day, days):
+    """Рабочее время мастера по дням: [(начало, конец)] в часовом поясе проекта"""
+    hours = {row.weekday: row for row in WorkingHours.objects.filter(master_id=master_id)}
+    periods = []
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        row = hours.get(day.weekday())
+        if row:
+            periods.append(working_period(day, row))
+    return periods
+
+
+def working_period(day, hours):
+    """(начало, конец) рабочего дня по строке WorkingHours"""
+    return (
+        timezone.make_aware(datetime.combine(day, hours.start)),
+        timezone.make_aware(datetime.combine(day, hours.end)),
+    )
+
+
+def day_slots(start, end):
+    """Начала интервалов рабочего дня"""
+    slots = []
+    while start + SLOT <= end:
+        slots.append(start)
+        start += SLOT
+    return slots
+
+
+def busy_slots(master_id, start, end):
+    return set(
+        VisitSlot.objects.filter(master_id=master_id, start__gte=start, start__lt=end)
+        .values_list('start', flat=True)
+    )
+
+
+def free_slots(master_id, service_ids, days=DAYS_AHEAD, now=None):
+    """Время, на которое можно записаться к мастеру на эти услуги в ближайшие days дней"""
+    now = now or timezone.now()
+    length = visit_length(service_ids)
+    periods = working_periods(master_id, timezone.localdate(now), days)
+    if not periods:
+        return []
+    busy = busy_slots(master_id, periods[0][0], periods[-1][1])
+    result = []
+    for start, end in periods:
+        slots = day_slots(start, end)
+        for i in range(len(slots) - length + 1):
+            if slots[i] > now and busy.isdisjoint(slots[i:i + length]):
+                result.append(slots[i])
+    return result
+
+
+def visit_slots(master_id, start, length, now=None):
+    """Интервалы, которые займет запись с началом start, или SlotTaken"""
+    now = now or timezone.now()
+    start = timezone.localtime(start)
+    if start <= now:
+        raise SlotTaken('Это время уже прошло')
+    periods = working_periods(master_id, start.date(), 1)
+    if not periods:
+        raise SlotTaken('У мастера в этот день выходной')
+    day_start, day_end = periods[0]
+    if start < day_start or start + length * SLOT > day_end or (start - day_start) % SLOT:
+        raise SlotTaken('Мастер в это время не работает')
+    return [start + i * SLOT for i in range(length)]
+
+
+def check_free(visit_id, master_id, start, length):
+    """SlotTaken, если время занято другой записью или недоступно (для проверки формы до сохранения)"""
+    starts = visit_slots(master_id, start, length)
+    if VisitSlot.objects.filter(master_id=master_id, start__in=starts).exclude(visit_id=visit_id).exists():
+        raise SlotTaken('Это время уже занято, выберите другое')
+
+
+def reserve(visit):
+    """
+    Занять время записи (visit.start_at) в расписании мастера.
+    Вызывается после сохранения услуг записи. SlotTaken - время недоступно.
+    """
+    if visit.start_at is None:
+        return
+    service_ids = [service.pk for service in visit.services.all()]
+    starts = visit_slots(visit.master_id, visit.start_at, visit_length(service_ids))
+    try:
+        # Точка сохранения: ошибка вставки не должна ломать внешнюю транзакцию
+        with transaction.atomic():
+            VisitSlot.objects.bulk_create(
+                VisitSlot(master_id=visit.master_id, start=start, visit=visit) for start in starts
+            )
+    except IntegrityError:
+        raise SlotTaken('Это время уже занято, выберите другое')
+    slots_changed.send(VisitSlot, master_id=visit.master_id, days={start.date() for start in starts})
+
+
+def release(visit, after=None):
+    """Освободить время записи: все (отмена) или начиная с after (выполнена раньше срока)"""
+    slots = VisitSlot.objects.filter(visit=visit)
+    if after is not None:
+        slots = slots.filter(start__gte=after)
+    # Интервалы могут принадлежать прежнему мастеру записи
+    changed = {}
+    for master_id, start in slots.values_list('master_id', 'start'):
+        changed.setdefault(master_id, set()).add(timezone.localdate(start))
+    if changed:
+        slots.delete()
+        for master_id, days in changed.items():
+            slots_changed.send(VisitSlot, master_id=master_id, days=days)
+
+
+def rebook(visit):
+    """
+    Занять время записи заново: ее вернули из отмененных или перевели к
+    другому мастеру. Прошедшее время не занимается. SlotTaken - время недоступно
+    """
+    release(visit)
+    if visit.start_at > timezone.now():
+        reserve(visit)
@@ -0,0 +1,110 @@
+"""
+Поиск записей по имени и телефону для списка заявок.
+
+- Телефон: поиск по префиксу нормализованного номера (Visit.phone_digits)
+  через диапазон строк, который использует обычный индекс на любой БД.
+- Имя: на SQLite - полнотекстовый индекс FTS5 (таблица core_visit_fts),
+  на PostgreSQL - триграммный GIN-индекс, с которым работает ILIKE '%...%'.
+  Индексы создаются функцией ensure_search_indexes после каждого migrate.
+"""
+import re
+
+from django.db import connection, connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "core_visit_fts"
+
+SQLITE_FTS_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+        USING fts5(name, content='core_visit', content_rowid='id')""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON core_visit BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON core_visit BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name ON core_visit BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name) VALUES ('delete', old.id, old.name);
+        INSERT INTO {FTS_TABLE}(rowid, name) VALUES (new.id, new.name);
+    END""",
+]
+
+POSTGRES_TRGM_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    # Выражение совпадает с тем, что Django генерирует для name__icontains
+    """CREATE INDEX IF NOT EXISTS core_visit_name_trgm
+        ON core_visit USING gin ((UPPER("name"::text)) gin_trgm_ops)""",
+]
+
+
+def ensure_search_indexes(using="default", **kwargs):
+    """
+    Создать индексы для поиска по имени, если их нет.
+    Вызывается из post_migrate, а не из миграции: при изменении таблицы
+    core_visit Django на SQLite пересоздает ее, и триггеры FTS пропадают.
+    Если триггеры пришлось создать заново, индекс перестраивается целиком.
+    """
+    conn = connections[using]
+    if "core_visit" not in conn.introspection.table_names():
+        return
+    with conn.cursor() as cursor:
+        if conn.vendor == "sqlite":
+            cursor.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+                [f"{FTS_TABLE}_%"],
+            )
+            triggers_ok = cursor.fetchone()[0] == 3
+            for sql in SQLITE_FTS_SQL:
+                cursor.execute(sql)
+            if not triggers_ok:
+                cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+        elif conn.vendor == "postgresql":
+            for sql in POSTGRES_TRGM_SQL:
+                cursor.execute(sql)
+
+
+def phone_prefix_q(digits):
+    """
+    Префикс номера как диапазон: '7999' -> '7999' <= phone_digits < '8000'.
+    В отличие от LIKE 'x%' такое условие использует индекс на любой БД.
+    Номер без кода страны (999..., 8999...) ищем и с семеркой впереди.
+    """
+    prefixes = {digits}
+    if digits.startswith("8"):
+        prefixes.add("7" + digits[1:])
+    elif digits.startswith("9"):
+        prefixes.add("7" + digits)
+    q = Q()
+    for prefix in prefixes:
+        condition = Q(phone_digits__gte=prefix)
+        if prefix.strip("9"):
+            condition &= Q(phone_digits__lt=str(int(prefix) + 1).zfill(len(prefix)))
+        q |= condition
+    return q
+
+
+def name_q(query):
+    words = [word for word in re.findall(r"\w+", query) if not word.isdigit()]
+    if not words:
+        return Q()
+    if connection.vendor == "sqlite":
+        # Каждое слово - префикс токена: "иван пет" найдет "Иван Петров"
+        match = " ".join(f'"{word}"*' for word in words)
+        return Q(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]))
+    return Q(name__icontains=query)
+
+
+def search_visits(queryset, query):
+    """Отфильтровать записи по строке поиска: имя и/или телефон"""
+    query = query.strip()
+    digits = re.sub(r"\D", "", query)
+    has_letters = re.search(r"[^\W\d_]", query) is not None
+    condition = Q()
+    if has_letters:
+        condition |= name_q(query)
+    if digits:
+        condition |= phone_prefix_q(digits)
+    if not condition:
+        return queryset
+    return queryset.filter(condition)
@@ -0,0 +1,250 @@
+"""
+Генератор данных реального объема для нагрузочных тестов (manage.py seed_scale)
+и бенчмарков (core/bench.py).
+
+- Детерминирован: одинаковый seed на пустой базе дает одинаковые данные.
+- Строки вставляются пачками "сырой" вставкой, как в core/fixtures.py: без
+  save() и сигналов. Поэтому дата отзыва (auto_now_add) не перезаписывается
+  текущим временем. id задаются при генерации, связи записей с услугами
+  вставляются той же пачкой, в памяти не больше одной пачки.
+- Распределения: у клиента (телефона) обычно несколько записей, часть
+  клиентов - постоянные и ходят к "своему" мастеру; статусы - в основном
+  выполненные; оценки смещены к 4-5; даты создания - за несколько лет, с
+  ростом числа записей к настоящему времени.
+- Суммы записей считаются при генерации, остальные денормализованные данные
+  (статистика клиентов, дневные сводки, рейтинги) пересчитывает finish().
+"""
+import random
+from datetime import time, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .aggregates import rebuild_client_stats
+from .catalog import bump_version
+from .fixtures import reset_sequences
+from .models import Master, Review, Service, Visit, WorkingHours, normalize_phone
+from .ratings import rebuild_master_ratings
+from .rollups import rebuild_daily_stats
+
+FIRST_NAMES = [
+    "Иван", "Петр", "Алексей", "Дмитрий", "Сергей", "Андрей", "Михаил", "Никита", "Артем", "Олег",
+    "Павел", "Роман", "Егор", "Кирилл", "Максим", "Антон", "Денис", "Глеб", "Тимур", "Руслан",
+]
+LAST_NAMES = [
+    "Иванов", "Петров", "Сидоров", "Смирнов", "Кузнецов", "Попов", "Соколов", "Лебедев",
+    "Козлов", "Новиков", "Морозов", "Волков", "Алексеев", "Федоров", "Семенов", "Егоров",
+    "Павлов", "Степанов", "Николаев", "Орлов", "Андреев", "Макаров", "Захаров", "Зайцев",
+]
+SERVICE_NAMES = [
+    "Мужская стрижка", "Стрижка машинкой", "Моделирование бороды", "Королевское бритье",
+    "Детская стрижка", "Камуфляж седины", "Укладка", "Стрижка + борода",
+]
+REVIEW_TEXTS = [
+    "Отличная стрижка, мастер внимательный, все сделал быстро и аккуратно.",
+    "Хорошее место, приятная атмосфера, но пришлось немного подождать.",
+    "Стрижка нормальная, но бороду можно было оформить аккуратнее.",
+    "Хожу сюда уже год, всегда доволен результатом и отношением.",
+]
+COMMENTS = ["Покороче на висках", "Буду с сыном", "Перезвоните, пожалуйста", "Как в прошлый раз"]
+
+# (значения, веса)
+VISIT_STATUSES = ([3, 2, 1, 0], [70, 10, 10, 10])
+SERVICES_PER_VISIT = ([1, 2, 3], [70, 25, 5])
+RATINGS = ([1, 2, 3, 4, 5], [3, 4, 10, 33, 50])
+REVIEW_STATUSES = ([0, 1, 2, 3], [60, 15, 15, 10])
+# Доля записей постоянного клиента к "своему" мастеру
+OWN_MASTER_SHARE = 0.7
+# Клиентов в среднем втрое меньше, чем записей
+VISITS_PER_CLIENT = 3
+
+
+def next_id(model):
+    return (model._base_manager.aggregate(max_id=Max("pk"))["max_id"] or 0) + 1
+
+
+def insert_rows(model, objects):
+    """Вставить объекты с заданными pk без save() и сигналов (raw, как loaddata)"""
+    if not objects:
+        return
+    fields = model._meta.local_concrete_fields
+    batch_size = connection.ops.bulk_batch_size(fields, objects) or len(objects)
+    for start in range(0, len(objects), batch_size):
+        model._base_manager._insert(objects[start:start + batch_size], fields=fields, raw=True)
+
+
+def period(years, end=None):
+    """(начало, конец) периода генерации; конец по умолчанию - начало сегодняшнего дня,
+    чтобы повторный запуск в тот же день давал те же даты"""
+    if end is None:
+        end = timezone.localtime().replace(hour=0, minute=0, second=0, microsecond=0)
+    return end - timedelta(days=365 * years), end
+
+
+def spread(position, first, last):
+    """
+    Дата для доли position (0..1) от всех строк: ранние строки реже, поздние
+    чаще - число записей в месяц растет вместе с барбершопом
+    """
+    return first + (last - first) * position ** 0.75
+
+
+def seed_catalog(masters=6, services=12, working_hours=False):
+    """
+    Каталог как в живом барбершопе: у каждого мастера половина услуг (хотя бы
+    одна), по кругу со сдвигом на номер мастера
+    """
+    service_list = Service.objects.bulk_create(
+        Service(
+            name=f"{SERVICE_NAMES[i % len(SERVICE_NAMES)]} {i // len(SERVICE_NAMES) + 1}",
+            description="Описание услуги",
+            price=Decimal(500 + 100 * i),
+            duration=30 + 15 * (i % 3),
+        )
+        for i in range(services)
+    )
+    master_list = Master.objects.bulk_create(
+        Master(
+            first_name=FIRST_NAMES[i % len(FIRST_NAMES)],
+            last_name=LAST_NAMES[i % len(LAST_NAMES)],
+            phone=f"+7999{i:07d}",
+            address="-",
+        )
+        for i in range(masters)
+    )
+    per_master = min(services, max(1, services // 2))
+    Master.services.through.objects.bulk_create(
+        Master.services.through(master_id=master.pk, service_id=service_list[(i + k) % services].pk)
+        for i, master in enumerate(master_list)
+        for k in range(per_master)
+    )
+    if working_hours:
+        # Понедельник-суббота с 10 до 20
+        WorkingHours.objects.bulk_create(
+            WorkingHours(master=master, weekday=weekday, start=time(10), end=time(20))
+            for master in master_list
+            for weekday in range(6)
+        )
+    return master_list, service_list
+
+
+def client(number, seed):
+    """(имя, телефон) клиента по номеру: у одного клиента всегда один телефон"""
+    digits = f"{(number * 2654435761 + seed) % 10**9:09d}"
+    name = f"{FIRST_NAMES[number % len(FIRST_NAMES)]} {LAST_NAMES[number // len(FIRST_NAMES) % len(LAST_NAMES)]}"
+    # Телефоны записаны по-разному, как их вводят посетители
+    if number % 3 == 0:
+        return name, f"8 9{digits[:2]} {digits[2:5]}-{digits[5:7]}-{digits[7:]}"
+    return name, f"+7 9{digits}"
+
+
+def seed_visits(count, masters, seed=1, years=3, end=None, chunk_size=10000, on_chunk=None):
+    """
+    count записей с услугами за years лет до end. masters - мастера
+    (объекты или id), услуги записи выбираются из услуг ее мастера.
+    on_chunk(создано) вызывается после каждой пачки
+    """
+    rng = random.Random(seed)
+    master_ids = [getattr(master, "pk", master) for master in masters]
+    master_services = {master_id: [] for master_id in master_ids}
+    prices = {}
+    for master_id, service_id, price in Master.services.through.objects.filter(
+        master_id__in=master_ids
+    ).values_list("master_id", "service_id", "service__price"):
+        master_services[master_id].append(service_id)
+        prices[service_id] = price
+    # Загрузка мастеров неравномерная
+    master_weights = [rng.uniform(0.5, 1.5) for _ in master_ids]
+    clients = max(1, count // VISITS_PER_CLIENT)
+    first, last = period(years, end)
+    Through = Visit.services.through
+    visit_id, through_id = next_id(Visit), next_id(Through)
+
+    created = 0
+    while created < count:
+        size = min(chunk_size, count - created)
+        visits, links = [], []
+        for i in range(created, created + size):
+            # Номер клиента с перекосом к малым: первые клиенты - постоянные
+            number = int(clients * rng.random() ** 2.5)
+            name, phone = client(number, seed)
+            if rng.random() < OWN_MASTER_SHARE:
+                master_id = master_ids[number % len(master_ids)]
+            else:
+                master_id = rng.choices(master_ids, master_weights)[0]
+            services = master_services[master_id]
+            chosen = rng.sample(services, min(len(services), rng.choices(*SERVICES_PER_VISIT)[0]))
+            visits.append(
+                Visit(
+                    id=visit_id,
+                    name=name,
+                    phone=phone,
+                    phone_digits=normalize_phone(phone),
+                    comment=rng.choice(COMMENTS) if rng.random() < 0.1 else "",
+                    created_at=spread((i + rng.random()) / count, first, last),
+                    status=rng.choices(*VISIT_STATUSES)[0],
+                    master_id=master_id,
+                    total_price=sum((prices[service_id] for service_id in chosen), Decimal(0)),
+                )
+            )
+            for service_id in chosen:
+                links.append(Through(id=through_id, visit_id=visit_id, service_id=service_id))
+                through_id += 1
+            visit_id += 1
+        with transaction.atomic():
+            insert_rows(Visit, visits)
+            insert_rows(Through, links)
+        created += size
+        if on_chunk:
+            on_chunk(created)
+    reset_sequences([Visit, Through])
+
+
+def seed_reviews(count, masters, seed=1, years=3, end=None, chunk_size=10000):
+    """Отзывы с перекосом оценок к 4-5 и смесью статусов; у каждого мастера свой средний уровень"""
+    rng = random.Random(seed)
+    master_ids = [getattr(master, "pk", master) for master in masters]
+    # Уровень мастера (-1..+1) сдвигает его оценки: одни чаще получают пятерки, другие - тройки
+    skill = {master_id: rng.uniform(-1, 1) for master_id in master_ids}
+    first, last = period(years, end)
+    review_id = next_id(Review)
+
+    created = 0
+    while created < count:
+        size = min(chunk_size, count - created)
+        reviews = []
+        for i in range(created, created + size):
+            master_id = rng.choice(master_ids)
+            rating = rng.choices(*RATINGS)[0]
+            rating = min(5, max(1, round(rating + skill[master_id] * rng.random())))
+            status = rng.choices(*REVIEW_STATUSES)[0]
+            created_at = spread((i + rng.random()) / count, first, last)
+            reviews.append(
+                Review(
+                    id=review_id,
+                    name=rng.choice(FIRST_NAMES),
+                    text=rng.choice(REVIEW_TEXTS),
+                    master_id=master_id,
+                    rating=rating,
+                    created_at=created_at,
+                    status=status,
+                    # Непроверенные ждут воркер moderate_reviews
+                    moderated_at=None if status == 1 else created_at + timedelta(minutes=rng.randrange(1, 60)),
+                )
+            )
+            review_id += 1
+        with transaction.atomic():
+            insert_rows(Review, reviews)
+        created += size
+    reset_sequences([Review])
+
+
+def finish():
+    """Пересчитать денормализованные данные и сбросить кэши после генерации"""
+    rebuild_client_stats()
+    rebuild_daily_stats()
+    rebuild_master_ratings()
+    for name in ("catalog", "reviews", "schedule", "availability"):
+        bump_version(name)
@@ -0,0 +1,240 @@
+"""
+Отдача статики (STATIC_URL) и загруженных файлов (MEDIA_URL) без представлений.
+
+StaticFilesMiddleware стоит в начале MIDDLEWARE: запрос к файлу не проходит
+сессии, CSRF и кэш страниц, а остальные запросы - только сравнение префикса.
+
+- Файлы с хэшем в имени (статика после collectstatic, core/storage.py, и
+  варианты фото мастеров, core/images.py) никогда не меняются по тому же
+  адресу и отдаются с Cache-Control: immutable на год. Остальные - на час,
+  с ETag и Last-Modified для проверки (304).
+- Если клиент принимает br/gzip и рядом лежит готовая .br/.gz копия,
+  отдается она.
+- Поддерживается запрос части файла (Range, один диапазон) - видео и
+  докачка больших файлов.
+- settings.SENDFILE = 'nginx' или 'apache': тело файла отдает веб-сервер
+  (X-Accel-Redirect / X-Sendfile), воркер Django только выбирает файл и
+  заголовки. Для nginx внутренние location-ы задает settings.SENDFILE_LOCATIONS.
+
+При DEBUG статика ищется через finders в STATICFILES_DIRS, как у runserver.
+"""
+import mimetypes
+import os
+import re
+import stat
+from urllib.parse import quote, unquote
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, HttpResponse, HttpResponseNotFound, HttpResponseNotModified
+from django.utils._os import safe_join
+from django.utils.http import http_date, parse_http_date_safe
+
+from .images import VARIANTS_DIR
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, max-age=3600"
+# main.3f2a1b9c0d4e.css - имя, которое дает ManifestStaticFilesStorage
+HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+CHUNK_SIZE = 1 << 16
+
+
+def is_immutable(kind, name):
+    if kind == "static":
+        return bool(HASHED_NAME_RE.search(name))
+    return name.startswith(VARIANTS_DIR + "/")
+
+
+def accepted_encodings(request):
+    accepted = set()
+    for item in request.headers.get("Accept-Encoding", "").split(","):
+        coding, _, params = item.strip().partition(";")
+        if params.strip().replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def parse_range(header, size):
+    """(начало, конец включительно) для заголовка Range; None - отдать файл целиком; ValueError - 416"""
+    match = RANGE_RE.match(header.strip())
+    if not match or match.groups() == ("", ""):
+        # Несколько диапазонов и нестандартные единицы не поддерживаем - это разрешено RFC 9110
+        return None
+    first, last = match.groups()
+    if first == "":
+        length = int(last)
+        if length == 0:
+            raise ValueError
+        return max(0, size - length), size - 1
+    first = int(first)
+    last = min(int(last), size - 1) if last else size - 1
+    if first >= size or first > last:
+        raise ValueError
+    return first, last
+
+
+def read_range(path, first, length):
+    with open(path, "rb") as file:
+        file.seek(first)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+class StaticFilesMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        urls = [(self.url_path(settings.STATIC_URL), "static"), (self.url_path(settings.MEDIA_URL), "media")]
+        self.prefixes = [(prefix, kind) for prefix, kind in urls if prefix and prefix != "/"]
+
+    @staticmethod
+    def url_path(url):
+        """Путь из STATIC_URL/MEDIA_URL: 'static/' -> '/static/', 'https://cdn/x/' -> '' (не наш)"""
+        if not url or "://" in url or url.startswith("//"):
+            return ""
+        return "/" + url.strip("/") + "/"
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.serve(request)
+        if response is None:
+            response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        # Остальные запросы идут дальше без перехода в синхронный поток
+        if not self.match(request):
+            return await self.get_response(request)
+        return await sync_to_async(self.serve)(request)
+
+    def match(self, request):
+        if request.method not in ("GET", "HEAD"):
+            return None
+        for prefix, kind in self.prefixes:
+            if request.path.startswith(prefix):
+                return kind, unquote(request.path[len(prefix):])
+        return None
+
+    def find(self, kind, name):
+        """Абсолютный путь к файлу или None"""
+        root = settings.STATIC_ROOT if kind == "static" else settings.MEDIA_ROOT
+        path = None
+        if kind == "static" and settings.DEBUG:
+            path = finders.find(name)
+        if path is None and root:
+            try:
+                path = safe_join(root, name)
+            except SuspiciousFileOperation:
+                return None
+        return path
+
+    def serve(self, request):
+        matched = self.match(request)
+        if not matched:
+            return None
+        kind, name = matched
+        path = self.find(kind, name)
+        try:
+            stats = os.stat(path) if path else None
+        except OSError:
+            stats = None
+        if stats is None or not stat.S_ISREG(stats.st_mode):
+            return HttpResponseNotFound("Файл не найден", content_type="text/plain; charset=utf-8")
+
+        content_type, encoding = mimetypes.guess_type(name)
+        content_type = content_type or "application/octet-stream"
+        headers = {
+            "Cache-Control": IMMUTABLE if is_immutable(kind, name) else REVALIDATE,
+            "Last-Modified": http_date(stats.st_mtime),
+        }
+        range_header = request.headers.get("Range")
+        content_encoding = encoding
+        if kind == "static" and not encoding:
+            accepted = accepted_encodings(request)
+            for coding, suffix in ENCODINGS:
+                try:
+                    compressed = os.stat(path + suffix)
+                except OSError:
+                    continue
+                headers["Vary"] = "Accept-Encoding"
+                # Для запроса части файла сжатая копия не подходит
+                if coding in accepted and not range_header:
+                    path, name, stats, content_encoding = path + suffix, name + suffix, compressed, coding
+                    break
+        etag = f'"{stats.st_mtime_ns:x}-{stats.st_size:x}{"-" + content_encoding if content_encoding else ""}"'
+        headers["ETag"] = etag
+
+        if self.not_modified(request, etag, stats.st_mtime):
+            response = HttpResponseNotModified()
+            for header, value in headers.items():
+                response[header] = value
+            return response
+
+        if getattr(settings, "SENDFILE", ""):
+            response = self.sendfile(kind, name, path)
+        else:
+            response = self.file_response(request, path, stats.st_size, etag, range_header)
+            if response.status_code == 416:
+                return response
+        response["Content-Type"] = content_type
+        if content_encoding:
+            response["Content-Encoding"] = content_encoding
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    @staticmethod
+    def not_modified(request, etag, mtime):
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match is not None:
+            return if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]
+        modified_since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+        return modified_since is not None and int(mtime) <= modified_since
+
+    @staticmethod
+    def file_response(request, path, size, etag, range_header):
+        byte_range = None
+        # If-Range: часть файла только если он не изменился с прошлой загрузки
+        if range_header and request.headers.get("If-Range", etag) == etag:
+            try:
+                byte_range = parse_range(range_header, size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response["Content-Range"] = f"bytes */{size}"
+                return response
+        if byte_range is None:
+            # FileResponse отдает файл через wsgi.file_wrapper (sendfile у gunicorn)
+            response = FileResponse(open(path, "rb"))
+            response["Content-Length"] = size
+        else:
+            first, last = byte_range
+            response = FileResponse(read_range(path, first, last - first + 1), status=206)
+            response["Content-Range"] = f"bytes {first}-{last}/{size}"
+            response["Content-Length"] = last - first + 1
+        response["Accept-Ranges"] = "bytes"
+        # FileResponse добавляет Content-Disposition с именем файла, для .gz-копии - неверным
+        response.headers.pop("Content-Disposition", None)
+        return response
+
+    @staticmethod
+    def sendfile(kind, name, path):
+        """Пустой ответ с указанием веб-серверу, какой файл отдать; Range и 206 он обработает сам"""
+        response = HttpResponse()
+        if settings.SENDFILE == "nginx":
+            response["X-Accel-Redirect"] = settings.SENDFILE_LOCATIONS[kind] + quote(name)
+        else:
+            response["X-Sendfile"] = path
+        return response
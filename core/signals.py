@@ -1,39 +1,19 @@
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
-from core.utlils import check_review
-from .models import Review, Visit
-from .telegram_bot import send_telegram_message
-from barber.settings import TELEGRAM_BOT_TOKEN, YOUR_PERSONAL_CHAT_ID
-import asyncio
+from django.utils import timezone
 
-@receiver(post_save, sender=Review)
-def review_post_save(sender, instance, created, **kwargs):
-    if created:
-        review = instance
-        
-        # Получаем текст отзыва
-        review_text = review.text
-
-        # Проверяем отзыв
-        if check_review(review_text):
-            # Если прошли проверку, меняем status на  2
-            review.status = 2
-            # Формируем ТГ сообщение
-            message = f"""
-*Новый отзыв* 
-
-*Имя:* {review.name} 
-*Отзыв:* {review.text or 'не указан'}
-*Дата создания:* {review.created_at}
-*Ссылка на админ-панель:* http://127.0.0.1:8000/admin/core/review/{review.id}/change/
--------------------------------------------------------------
-"""
-            # Отправляем ТГ сообщение
-            asyncio.run(send_telegram_message(TELEGRAM_BOT_TOKEN, YOUR_PERSONAL_CHAT_ID, message))
-        else:
-            # Если не прошли проверку, меняем status на  3
-            review.status = 3
-        review.save()
+from .aggregates import refresh_client_stats, refresh_visit_totals
+from .availability import refresh_on_commit
+from .catalog import bump_version
+from .images import refresh_master_photo
+from .models import Master, Review, Service, Visit, WorkingHours
+from .notifications import enqueue_notification, notifications_suppressed
+from .ratings import apply_rating_changes, review_changes
+from .rollups import master_buckets, refresh_daily_stats, refresh_master_days, refresh_service_days
+from .scheduling import rebook, release, slots_changed
+
+# Новые отзывы больше не проверяются в post_save: они сохраняются со статусом
+# "Не проверен", а модерацию выполняет воркер moderate_reviews (core/moderation.py)
 
 
 @receiver(m2m_changed, sender=Visit.services.through)
@@ -41,10 +21,12 @@ def send_telegram_notification(sender, instance, action, **kwargs):
     """
     Обработчик сигнала m2m_changed для модели Visit.
     Он обрабатывает добавление КАЖДОЙ услуги в запись на консультацию.
-    Отправка ОДНОГО сообщения в телеграмм выполняется в первом условии
+    Постановка ОДНОГО сообщения в очередь телеграмм выполняется в первом условии,
+    отправляет его воркер send_notifications
     http://127.0.0.1:8000/admin/core/visit/5/change/
     """
-    if action == 'post_add' and kwargs.get('pk_set'):
+    # reverse - услуге добавили записи (service.visit_set.add), это не новая запись
+    if action == 'post_add' and kwargs.get('pk_set') and not kwargs.get('reverse') and not notifications_suppressed.get():
         services = [service.name for service in instance.services.all()]
         # print(f"УСЛУГИ: {services}")
         message = f"""
@@ -59,4 +41,249 @@ def send_telegram_notification(sender, instance, action, **kwargs):
 *Ссылка на админ-панель:* http://127.0.0.1:8000/admin/core/visit/{instance.id}/change/
 -------------------------------------------------------------
 """
-        asyncio.run(send_telegram_message(TELEGRAM_BOT_TOKEN, YOUR_PERSONAL_CHAT_ID, message))
\ No newline at end of file
+        enqueue_notification(message)
+
+
+@receiver(post_save, sender=Master)
+@receiver(post_delete, sender=Master)
+@receiver(post_save, sender=Service)
+@receiver(post_delete, sender=Service)
+@receiver(m2m_changed, sender=Master.services.through)
+def invalidate_catalog(sender, **kwargs):
+    """Любое изменение мастеров или услуг сбрасывает кэш каталога главной страницы"""
+    if kwargs.get('action', 'post_').startswith('post_'):
+        bump_version('catalog')
+
+
+@receiver(pre_save, sender=Master)
+def remember_master_photo(sender, instance, raw, **kwargs):
+    instance._old_photo = None
+    if instance.pk and not raw:
+        instance._old_photo = Master.objects.filter(pk=instance.pk).values_list('photo', flat=True).first()
+
+
+@receiver(post_save, sender=Master)
+def update_master_photo(sender, instance, raw, **kwargs):
+    """Новое фото мастера сразу пережимается в варианты для srcset (core/images.py)"""
+    if raw:
+        return
+    if (instance.photo.name or '') != (instance._old_photo or '') or (instance.photo and not instance.photo_width):
+        refresh_master_photo(instance)
+
+
+@receiver(pre_save, sender=Visit)
+def remember_visit_state(sender, instance, raw, **kwargs):
+    """Запоминаем значения полей до сохранения, чтобы пересчитать и старые агрегаты"""
+    instance._old_state = None
+    if instance.pk and not raw:
+        instance._old_state = (
+            Visit.objects.filter(pk=instance.pk)
+            .values('phone_digits', 'master_id', 'status', 'created_at')
+            .first()
+        )
+
+
+@receiver(post_save, sender=Visit)
+def update_client_stats(sender, instance, created, raw, **kwargs):
+    """Счетчик записей клиента: новая запись или смена телефона"""
+    if raw:
+        return
+    old = instance._old_state
+    if created:
+        refresh_client_stats([instance.phone_digits])
+    elif old and old['phone_digits'] != instance.phone_digits:
+        refresh_client_stats([instance.phone_digits, old['phone_digits']])
+
+
+@receiver(post_delete, sender=Visit)
+def update_client_stats_on_delete(sender, instance, **kwargs):
+    refresh_client_stats([instance.phone_digits])
+
+
+@receiver(post_save, sender=Visit)
+def update_visit_slots(sender, instance, raw, **kwargs):
+    """
+    Время мастера следует за статусом и мастером записи (core/scheduling.py):
+    отмененная запись освобождает время, выполненная раньше срока - оставшееся
+    время, а возвращенная в работу или переведенная к другому мастеру занимает
+    его заново. SlotTaken откатывает сохранение, админка проверяет время заранее
+    (VisitAdminForm)
+    """
+    if raw or not instance.start_at:
+        return
+    old = instance._old_state
+    if instance.status == 2:
+        release(instance)
+    elif instance.status == 3:
+        release(instance, after=timezone.now())
+    elif old and (old['status'] in (2, 3) or old['master_id'] != instance.master_id):
+        rebook(instance)
+
+
+# Кэш свободного времени (core/availability.py)
+
+
+@receiver(slots_changed)
+def update_availability(sender, master_id, days, **kwargs):
+    refresh_on_commit(master_id, days)
+
+
+@receiver(post_delete, sender=Visit)
+def update_availability_on_delete(sender, instance, **kwargs):
+    # Интервалы VisitSlot удаляются каскадом вместе с записью
+    if instance.start_at:
+        refresh_on_commit(instance.master_id, [timezone.localdate(instance.start_at)])
+
+
+@receiver(post_save, sender=WorkingHours)
+@receiver(post_delete, sender=WorkingHours)
+def invalidate_schedule(sender, **kwargs):
+    """Рабочее время мастера изменилось - все карты свободного времени устарели"""
+    bump_version('schedule')
+    bump_version('availability')
+
+
+@receiver(m2m_changed, sender=Visit.services.through)
+def update_visit_total(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Пересчет Visit.total_price при изменении услуг записи.
+    reverse=True - изменение со стороны услуги (service.visit_set.add(...))
+    """
+    if action == 'pre_clear' and reverse:
+        # После очистки связей уже не узнать, каких записей она касалась
+        instance._cleared_visit_ids = list(instance.visit_set.values_list('pk', flat=True))
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_visit_totals(Visit.objects.filter(pk=instance.pk))
+        instance.refresh_from_db(fields=['total_price'])
+    elif action == 'post_clear':
+        refresh_visit_totals(Visit.objects.filter(pk__in=instance._cleared_visit_ids))
+    else:
+        refresh_visit_totals(Visit.objects.filter(pk__in=pk_set))
+
+
+@receiver(post_save, sender=Service)
+def update_totals_on_price_change(sender, instance, created, raw, **kwargs):
+    """Цена услуги могла измениться - пересчитываем записи с этой услугой"""
+    if not created and not raw:
+        refresh_visit_totals(Visit.objects.filter(services=instance))
+
+
+@receiver(pre_delete, sender=Service)
+def remember_service_visits(sender, instance, **kwargs):
+    # Связи с записями удаляются каскадом без m2m_changed
+    instance._visit_ids = list(instance.visit_set.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Service)
+def update_totals_on_service_delete(sender, instance, **kwargs):
+    refresh_visit_totals(Visit.objects.filter(pk__in=instance._visit_ids))
+
+
+# Дневные сводки (core/rollups.py). Обработчики m2m_changed и изменения услуг
+# объявлены после пересчета total_price выше и поэтому вызываются после него
+
+
+@receiver(post_save, sender=Visit)
+def update_daily_stats(sender, instance, created, raw, **kwargs):
+    if raw:
+        return
+    old = instance._old_state
+    day = timezone.localdate(instance.created_at)
+    if created or not old:
+        refresh_master_days({(day, instance.master_id)})
+        return
+    if (old['master_id'], old['status'], old['created_at']) == (
+        instance.master_id, instance.status, instance.created_at
+    ):
+        return
+    old_day = timezone.localdate(old['created_at'])
+    refresh_master_days({(day, instance.master_id), (old_day, old['master_id'])})
+    if (old['status'], old['created_at']) != (instance.status, instance.created_at):
+        service_ids = instance.services.values_list('pk', flat=True)
+        refresh_service_days({(d, pk) for pk in service_ids for d in (day, old_day)})
+
+
+@receiver(pre_delete, sender=Visit)
+def remember_visit_services(sender, instance, **kwargs):
+    # Связи с услугами удаляются раньше, чем сработает post_delete
+    instance._service_ids = list(instance.services.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Visit)
+def update_daily_stats_on_delete(sender, instance, **kwargs):
+    day = timezone.localdate(instance.created_at)
+    refresh_master_days({(day, instance.master_id)})
+    refresh_service_days({(day, pk) for pk in instance._service_ids})
+
+
+@receiver(m2m_changed, sender=Visit.services.through)
+def update_daily_stats_on_services(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        # Какие связи удаляются, после очистки уже не узнать
+        if reverse:
+            instance._cleared_visits = list(Visit.objects.filter(services=instance).values_list('pk', flat=True))
+        else:
+            instance._cleared_services = list(instance.services.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        visit_ids = instance._cleared_visits if action == 'post_clear' else pk_set
+        buckets = master_buckets(Visit.objects.filter(pk__in=visit_ids))
+        refresh_master_days(buckets)
+        refresh_service_days({(day, instance.pk) for day, _ in buckets})
+    else:
+        service_ids = instance._cleared_services if action == 'post_clear' else pk_set
+        day = timezone.localdate(instance.created_at)
+        refresh_master_days({(day, instance.master_id)})
+        refresh_service_days({(day, pk) for pk in service_ids})
+
+
+@receiver(post_save, sender=Service)
+def update_daily_stats_on_price_change(sender, instance, created, raw, **kwargs):
+    if not created and not raw:
+        refresh_daily_stats(Visit.objects.filter(services=instance))
+
+
+@receiver(post_delete, sender=Service)
+def update_daily_stats_on_service_delete(sender, instance, **kwargs):
+    # Строки DailyServiceStat удалены каскадом, остаются выручка и записи мастеров
+    refresh_master_days(master_buckets(Visit.objects.filter(pk__in=instance._visit_ids)))
+
+
+# Рейтинги мастеров (core/ratings.py)
+
+
+@receiver(pre_save, sender=Review)
+def remember_review_state(sender, instance, raw, **kwargs):
+    instance._old_state = None
+    if instance.pk and not raw:
+        instance._old_state = (
+            Review.objects.filter(pk=instance.pk).values_list('master_id', 'rating', 'status').first()
+        )
+
+
+@receiver(post_save, sender=Review)
+def update_master_rating(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    new = (instance.master_id, instance.rating, instance.status)
+    apply_rating_changes(review_changes(instance._old_state, new))
+
+
+@receiver(post_delete, sender=Review)
+def update_master_rating_on_delete(sender, instance, **kwargs):
+    apply_rating_changes(review_changes((instance.master_id, instance.rating, instance.status), None))
+
+
+@receiver(post_save, sender=Review)
+@receiver(post_delete, sender=Review)
+def invalidate_reviews(sender, instance, **kwargs):
+    """Ленту отзывов (core/reviews.py) сбрасывает изменение только опубликованного отзыва"""
+    if kwargs.get('raw'):
+        return
+    old = getattr(instance, '_old_state', None)
+    if instance.status in Review.VISIBLE_STATUSES or (old and old[2] in Review.VISIBLE_STATUSES):
+        bump_version('reviews')
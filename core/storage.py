@@ -0,0 +1,56 @@
+"""
+Хранилище статики для продакшена: имена с хэшем содержимого (manifest) и
+заранее сжатые копии.
+
+collectstatic копирует файлы в STATIC_ROOT, дает им имена вида
+main.3f2a1b9c0d4e.css (ManifestStaticFilesStorage) и рядом кладет
+main.3f2a1b9c0d4e.css.gz и .br (если установлен пакет Brotli). Сжатие
+выполняется один раз при сборке, а не на каждом запросе; отдает копии
+StaticFilesMiddleware (core/serving.py) или nginx (gzip_static/brotli_static).
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Растровые картинки и woff-шрифты уже сжаты, повторное сжатие почти ничего не дает
+COMPRESS_EXTENSIONS = {".css", ".js", ".mjs", ".map", ".svg", ".json", ".txt", ".html", ".xml", ".ico", ".ttf", ".eot"}
+MIN_SIZE = 256
+
+
+def compressors():
+    """[(расширение копии, функция сжатия)]"""
+    result = [(".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0))]
+    if brotli is not None:
+        result.insert(0, (".br", lambda data: brotli.compress(data, quality=11)))
+    return result
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        for name in set(self.hashed_files.values()):
+            self.compress(name)
+
+    def compress(self, name):
+        if not any(name.endswith(extension) for extension in COMPRESS_EXTENSIONS):
+            return
+        with self.open(name) as file:
+            data = file.read()
+        if len(data) < MIN_SIZE:
+            return
+        for suffix, compress in compressors():
+            compressed = compress(data)
+            # Копия, которая почти не меньше оригинала, не стоит лишнего заголовка Vary
+            if len(compressed) < len(data) * 0.95:
+                if self.exists(name + suffix):
+                    self.delete(name + suffix)
+                self._save(name + suffix, ContentFile(compressed))
+
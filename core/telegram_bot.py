@@ -11,9 +11,12 @@ load_dotenv()
 # Настройка логирования
 logging.basicConfig(level=logging.DEBUG)
 
-async def send_telegram_message(token, chat_id, message, parse_mode="Markdown"):
+async def send_telegram_message(token, chat_id, message, parse_mode="Markdown", bot=None):
+    # Воркер очереди передает сюда свой долгоживущий клиент,
+    # чтобы не создавать новый Bot на каждое сообщение
     try:
-        bot = telegram.Bot(token=token)
+        if bot is None:
+            bot = telegram.Bot(token=token)
         await bot.send_message(chat_id=chat_id, text=message, parse_mode=parse_mode)
         logging.info(f'Сообщение "{message}" отправлено в чат {chat_id}')
     except Exception as e:
@@ -0,0 +1,27 @@
+from django import template
+
+from ..images import picture_sources, variant_url, variant_widths
+
+register = template.Library()
+
+# Карточка мастера: треть контейнера на широких экранах, почти вся ширина на телефоне
+MASTER_SIZES = "(min-width: 768px) 30vw, 80vw"
+
+
+@register.inclusion_tag("includes/master_photo.html")
+def master_photo(master, css_class="master-photo", sizes=MASTER_SIZES):
+    """
+    <picture> с вариантами фото мастера разной ширины и формата: браузер сам
+    выбирает подходящий. Пока вариантов нет (photo_hash пуст) - оригинал.
+    """
+    context = {"master": master, "css_class": css_class, "sizes": sizes}
+    if master.photo and master.photo_hash and master.photo_width:
+        widths = variant_widths(master.photo_width)
+        *sources, (_, jpeg_srcset) = picture_sources(master.photo_hash, widths)
+        context.update(
+            sources=sources,
+            srcset=jpeg_srcset,
+            # Для браузеров без srcset - вторая по ширине копия
+            src=variant_url(master.photo_hash, widths[min(1, len(widths) - 1)], "jpg"),
+        )
+    return context
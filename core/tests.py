@@ -1,3 +1,1448 @@
-from django.test import TestCase
+import base64
+import csv
+import gzip
+import json
+import os
+import re
+import shutil
+import statistics
+import tempfile
+import threading
+import time as timer
+import zipfile
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
+from xml.etree import ElementTree
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings as django_settings
+from django.contrib import messages
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from PIL import Image
+
+from .aggregates import wrong_client_stats, wrong_visit_totals
+from .availability import DAY_OFF, build_maps, first_free, next_free, valid_until
+from .bench import seed_catalog, seed_reviews, seed_visits
+from .catalog import bump_version, get_version
+from .exports import COLUMNS, csv_safe, export_rows, export_visits, xlsx_stream
+from .fixtures import load_dump
+from .images import FORMATS
+from .imports import import_visits
+from .models import (
+    ClientStats, DailyMasterStat, DailyServiceStat, Master, MasterRating, Notification, Review, Service, Visit,
+    VisitSlot, WorkingHours,
+)
+from .moderation import moderate_pending
+from .notifications import (
+    CLAIM_TIMEOUT, MAX_ATTEMPTS, RETRY_MAX_SECONDS, claim, dispatch_batch, enqueue_notification, retry_delay,
+)
+from .pagination import KeysetPaginator
+from .ratelimit import MemoryBackend, TokenBucket, booking_fingerprint
+from .ratings import rebuild_master_ratings, set_review_status, wrong_master_ratings
+from .reviews import reviews_feed
+from .rollups import rebuild_daily_stats, wrong_daily_stats
+from .scheduling import SLOT, SlotTaken, free_slots, reserve
+from .search import search_visits
+from .utlils import FakeMistral, moderation_stats, prefilter_reject
+
+
+class VisitAdminChangelistTest(TestCase):
+    """Список записей в админке: число запросов не зависит от числа строк"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        cls.master = Master.objects.create(
+            first_name="Иван", last_name="Петров", phone="+79990000000", address="-"
+        )
+        cls.services = [
+            Service.objects.create(name="Стрижка", description="-", price=Decimal("1500")),
+            Service.objects.create(name="Борода", description="-", price=Decimal("700")),
+        ]
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_visits(self, count):
+        for i in range(count):
+            visit = Visit.objects.create(name=f"Клиент {i}", phone=f"+7999{i:07d}", master=self.master)
+            visit.services.set(self.services)
+
+    def changelist_queries(self, **params):
+        # Количество строк кэшируется пагинатором, сравниваем запросы без кэша
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/admin/core/visit/", params)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.create_visits(3)
+        few = self.changelist_queries()
+        self.create_visits(40)
+        many = self.changelist_queries()
+        self.assertEqual(few, many)
+
+    def test_query_count_with_sorting_and_filters(self):
+        self.create_visits(3)
+        few = self.changelist_queries(o="6", price_range="medium", q="Стрижка")
+        self.create_visits(40)
+        many = self.changelist_queries(o="6", price_range="medium", q="Стрижка")
+        self.assertEqual(few, many)
+
+    def test_total_price_not_inflated_by_search(self):
+        self.create_visits(2)
+        response = self.client.get("/admin/core/visit/", {"q": "Стрижка"})
+        totals = [visit.total_price for visit in response.context["cl"].result_list]
+        self.assertEqual(totals, [Decimal("2200")] * 2)
+
+
+class VisitSearchTest(TestCase):
+    """Поиск записей: префиксы слов имени (FTS5 на SQLite) и префикс номера телефона"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.master = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        cls.ivan = Visit.objects.create(name="Иван Петров", phone="+7 (999) 123-45-67", master=cls.master)
+        cls.maria = Visit.objects.create(name="Мария Иванова", phone="8 912 000-11-22", master=cls.master)
+
+    def search(self, query):
+        return set(search_visits(Visit.objects.all(), query).values_list("name", flat=True))
+
+    def test_name_prefixes(self):
+        self.assertEqual(self.search("иван"), {"Иван Петров", "Мария Иванова"})
+        self.assertEqual(self.search("Пет"), {"Иван Петров"})
+        self.assertEqual(self.search("петров ив"), {"Иван Петров"})
+        # Ищется начало слова, а не любая его часть
+        self.assertEqual(self.search("ров"), set())
+        self.assertEqual(self.search("   "), {"Иван Петров", "Мария Иванова"})
+
+    def test_index_follows_changes(self):
+        visit = Visit.objects.create(name="Олег Сидоров", phone="+79995556677", master=self.master)
+        self.assertEqual(self.search("олег"), {"Олег Сидоров"})
+        visit.name = "Павел Сидоров"
+        visit.save()
+        self.assertEqual(self.search("олег"), set())
+        self.assertEqual(self.search("павел"), {"Павел Сидоров"})
+        # queryset.update() и bulk_create() сигналов не отправляют, индекс обновляют триггеры
+        Visit.objects.filter(pk=visit.pk).update(name="Глеб Сидоров")
+        Visit.objects.bulk_create([Visit(name="Ольга Смирнова", phone="+79990000001", master=self.master)])
+        self.assertEqual(self.search("павел"), set())
+        self.assertEqual(self.search("глеб"), {"Глеб Сидоров"})
+        self.assertEqual(self.search("ольга"), {"Ольга Смирнова"})
+        visit.delete()
+        self.assertEqual(self.search("сидоров"), set())
+
+    def test_phone_prefix(self):
+        for query in ("+7 999 123", "8 (999) 12", "999-123-45-67", "79991234567"):
+            with self.subTest(query):
+                self.assertEqual(self.search(query), {"Иван Петров"})
+        self.assertEqual(self.search("+7 912"), {"Мария Иванова"})
+        self.assertEqual(self.search("7"), {"Иван Петров", "Мария Иванова"})
+        # Середина номера не ищется - только начало
+        self.assertEqual(self.search("1234567"), set())
+        self.assertEqual(self.search("99912345678"), set())
+
+
+class KeysetPaginationTest(TestCase):
+    """Курсоры страниц: переходы при одинаковых датах, испорченный курсор, кэш количества"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        master = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        created = timezone.now() - timedelta(days=1)
+        # Пять записей с одной датой - порядок между ними задает id
+        cls.visits = [
+            Visit.objects.create(name=f"Клиент {i}", phone="+79991112233", master=master, created_at=created + timedelta(hours=i // 5))
+            for i in range(7)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def paginator(self):
+        return KeysetPaginator(Visit.objects.all(), 3)
+
+    def test_pages_with_equal_dates(self):
+        paginator = self.paginator()
+        pages = [paginator.page()]
+        while pages[-1].has_next():
+            pages.append(paginator.page(pages[-1].next_cursor))
+        ids = [[visit.pk for visit in page] for page in pages]
+        self.assertEqual(sum(ids, []), list(Visit.objects.order_by("-created_at", "-id").values_list("pk", flat=True)))
+        self.assertEqual([len(page) for page in ids], [3, 3, 1])
+        self.assertFalse(pages[0].has_previous())
+        # Назад с последней страницы - та же предпоследняя страница
+        back = paginator.page(pages[2].previous_cursor)
+        self.assertEqual([visit.pk for visit in back], ids[1])
+        self.assertTrue(back.has_next())
+        self.assertEqual([visit.pk for visit in paginator.page(back.previous_cursor)], ids[0])
+
+    def test_cursor_round_trip(self):
+        paginator = self.paginator()
+        visit = self.visits[0]
+        cursor = paginator.encode_cursor("next", [visit.created_at, visit.pk])
+        self.assertEqual(paginator.decode_cursor(cursor), ("next", [visit.created_at, visit.pk]))
+
+    def test_invalid_cursor_gives_first_page(self):
+        def encoded(data):
+            return base64.urlsafe_b64encode(json.dumps(data).encode()).decode()
+
+        first = [visit.pk for visit in self.paginator().page()]
+        when = self.visits[0].created_at.isoformat()
+        cursors = [
+            "!!!", "привет", encoded("not a list"), encoded(5), encoded(["next", [when]]),
+            encoded(["next", [when, "abc"]]), encoded(["next", ["вчера", 1]]), encoded(["sideways", [when, 1]]),
+            encoded(["next", [None, None]]), encoded(["next", [[1], {"a": 1}]]), encoded({"a": 1, "b": 2}),
+            base64.urlsafe_b64encode(b"\xff\xfe").decode(),
+        ]
+        self.client.force_login(self.admin)
+        for cursor in cursors:
+            with self.subTest(cursor):
+                self.assertIsNone(self.paginator().decode_cursor(cursor))
+                self.assertEqual([visit.pk for visit in self.paginator().page(cursor)], first)
+                self.assertEqual(self.client.get("/visits/", {"cursor": cursor}).status_code, 200)
+                self.assertEqual(self.client.get("/admin/core/visit/", {"cursor": cursor}).status_code, 200)
+
+    def test_count_is_cached(self):
+        self.assertEqual(self.paginator().count, 7)
+        Visit.objects.create(name="Новый", phone="+79990000001", master=self.visits[0].master)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.paginator().count, 7)
+        self.assertEqual(len(queries), 0)
+        # Другой запрос (фильтр) - свой счетчик
+        self.assertEqual(KeysetPaginator(Visit.objects.filter(name="Новый"), 3).count, 1)
+        cache.clear()
+        self.assertEqual(self.paginator().count, 8)
+
+
+class MasterPhotoTest(TestCase):
+    """Варианты фото мастера: без увеличения маленьких фото, нечитаемое фото не ломает сохранение"""
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        cache.clear()
+        caches["pages"].clear()
+
+    def upload(self, width, height):
+        buffer = BytesIO()
+        Image.new("RGB", (width, height), "gray").save(buffer, "JPEG")
+        return default_storage.save("masters/photos/photo.jpg", ContentFile(buffer.getvalue()))
+
+    def test_small_photo_is_not_upscaled(self):
+        master = Master.objects.create(first_name="Иван", last_name="Петров", phone="-", address="-", photo=self.upload(300, 400))
+        master.refresh_from_db()
+        self.assertEqual(master.photo_width, 300)
+        variants = default_storage.listdir(f"masters/variants/{master.photo_hash}")[1]
+        self.assertEqual(len(variants), 2 * len(FORMATS))
+        with Image.open(default_storage.open(f"masters/variants/{master.photo_hash}/300.jpg")) as image:
+            self.assertEqual(image.width, 300)
+        html = self.client.get("/").content.decode()
+        self.assertIn("300.jpg 300w", html)
+        self.assertNotIn("640w", html)
+
+    def test_missing_photo_does_not_break_save(self):
+        with self.assertLogs("core.images", "ERROR"):
+            master = Master.objects.create(first_name="Иван", last_name="Петров", phone="-", address="-", photo="masters/photos/lost.jpg")
+            master.save()
+        master.refresh_from_db()
+        self.assertEqual(master.photo_hash, "")
+        self.assertIn("masters/photos/lost.jpg", self.client.get("/").content.decode())
+
+
+class FakeBot:
+    """Клиент Telegram без сети: запоминает сообщения или падает с ошибкой"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.messages = []
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.error:
+            raise self.error
+        self.messages.append((chat_id, text))
+
+
+class NotificationTest(TestCase):
+    """Очередь уведомлений: запись в транзакции, повторы с задержкой, одна отправка на сообщение"""
+
+    def test_enqueue_rolled_back_with_transaction(self):
+        master = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        service = Service.objects.create(name="Стрижка", description="-", price=Decimal("1500"))
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            visit = Visit.objects.create(name="Клиент", phone="+79991112233", master=master)
+            visit.services.add(service)
+            self.assertEqual(Notification.objects.count(), 1)
+            raise RuntimeError
+        self.assertFalse(Notification.objects.exists())
+
+    def test_success(self):
+        notification = enqueue_notification("Привет", chat_id="42")
+        bot = FakeBot()
+        self.assertEqual(async_to_sync(dispatch_batch)(bot), (1, 0))
+        self.assertEqual(bot.messages, [("42", "Привет")])
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), (1, 1))
+        self.assertIsNotNone(notification.sent_at)
+        # Отправленное сообщение больше не выбирается
+        self.assertEqual(async_to_sync(dispatch_batch)(bot), (0, 0))
+
+    def test_retry_and_give_up(self):
+        notification = enqueue_notification("Привет", chat_id="42")
+        bot = FakeBot(RuntimeError("сеть недоступна"))
+        before = timezone.now()
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(async_to_sync(dispatch_batch)(bot), (0, 1))
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), (0, 1))
+        self.assertEqual(notification.last_error, "сеть недоступна")
+        self.assertGreaterEqual(notification.next_attempt_at, before + retry_delay(1))
+        # Повтор еще не наступил
+        self.assertEqual(async_to_sync(dispatch_batch)(bot), (0, 0))
+
+        Notification.objects.filter(pk=notification.pk).update(attempts=MAX_ATTEMPTS - 1, next_attempt_at=timezone.now())
+        with self.assertLogs(level="ERROR"):
+            self.assertEqual(async_to_sync(dispatch_batch)(bot), (0, 1))
+        notification.refresh_from_db()
+        self.assertEqual((notification.status, notification.attempts), (2, MAX_ATTEMPTS))
+        self.assertEqual(retry_delay(20), timedelta(seconds=RETRY_MAX_SECONDS))
+
+    def test_claimed_message_is_sent_once(self):
+        notification = enqueue_notification("Привет", chat_id="42")
+        # Оба воркера прочитали строку, забирает ее только первый
+        stale = Notification.objects.get(pk=notification.pk)
+        self.assertTrue(async_to_sync(claim)(notification))
+        self.assertFalse(async_to_sync(claim)(stale))
+        bot = FakeBot()
+        self.assertEqual(async_to_sync(dispatch_batch)(bot), (0, 0))
+        self.assertEqual(bot.messages, [])
+
+    def test_abandoned_claim_is_retaken(self):
+        notification = enqueue_notification("Привет", chat_id="42")
+        Notification.objects.filter(pk=notification.pk).update(status=3, next_attempt_at=timezone.now() - CLAIM_TIMEOUT)
+        bot = FakeBot()
+        self.assertEqual(async_to_sync(dispatch_batch)(bot), (1, 0))
+        self.assertEqual(len(bot.messages), 1)
+
+
+@override_settings(DEBUG=False, SENDFILE="")
+class StaticServingTest(TestCase):
+    """Отдача статики: Range, готовые .gz копии, X-Accel-Redirect, 304 и сборка collectstatic"""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        settings = override_settings(STATIC_ROOT=self.root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.data = "".join(f".rule-{i} {{ color: red; }}\n" for i in range(60)).encode()
+        self.write("css/site.css", self.data)
+        self.write("css/site.css.gz", gzip.compress(self.data))
+        self.write("css/site.0123456789ab.css", self.data)
+
+    def write(self, name, data):
+        path = Path(self.root, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+
+    def get(self, path, **headers):
+        response = self.client.get(path, **{f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()})
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_range(self):
+        response, body = self.get("/static/css/site.css", range="bytes=10-19", accept_encoding="gzip")
+        self.assertEqual((response.status_code, body), (206, self.data[10:20]))
+        self.assertEqual(response["Content-Range"], f"bytes 10-19/{len(self.data)}")
+        # Для части файла сжатая копия не подходит
+        self.assertNotIn("Content-Encoding", response)
+        response, body = self.get("/static/css/site.css", range="bytes=-5")
+        self.assertEqual((response.status_code, body), (206, self.data[-5:]))
+        response, _ = self.get("/static/css/site.css", range=f"bytes={len(self.data)}-")
+        self.assertEqual((response.status_code, response["Content-Range"]), (416, f"bytes */{len(self.data)}"))
+        # Файл изменился с прошлой загрузки - отдается целиком
+        response, body = self.get("/static/css/site.css", range="bytes=10-19", if_range='"old"')
+        self.assertEqual((response.status_code, body), (200, self.data))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+
+    def test_precompressed(self):
+        response, body = self.get("/static/css/site.css", accept_encoding="br, gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(body), self.data)
+        self.assertEqual(response["Content-Type"], "text/css")
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertTrue(response["ETag"].endswith('-gzip"'))
+        self.assertNotIn("Content-Disposition", response)
+        for accept in ("gzip;q=0", ""):
+            response, body = self.get("/static/css/site.css", accept_encoding=accept)
+            self.assertEqual(body, self.data)
+            self.assertNotIn("Content-Encoding", response)
+            self.assertEqual(response["Vary"], "Accept-Encoding")
+
+    def test_cache_headers(self):
+        response, _ = self.get("/static/css/site.0123456789ab.css")
+        self.assertEqual(response["Cache-Control"], "public, max-age=31536000, immutable")
+        response, _ = self.get("/static/css/site.css")
+        self.assertEqual(response["Cache-Control"], "public, max-age=3600")
+        self.assertEqual(self.get("/static/css/site.css", if_none_match=response["ETag"])[0].status_code, 304)
+        self.assertEqual(self.get("/static/css/site.css", if_modified_since=response["Last-Modified"])[0].status_code, 304)
+        self.assertEqual(self.get("/static/css/missing.css")[0].status_code, 404)
+        self.assertEqual(self.get("/static/%2e%2e/manage.py")[0].status_code, 404)
+
+    def test_sendfile(self):
+        with self.settings(SENDFILE="nginx"):
+            response, body = self.get("/static/css/site.css", accept_encoding="gzip")
+        self.assertEqual(body, b"")
+        self.assertEqual(response["X-Accel-Redirect"], "/protected/static/css/site.css.gz")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertEqual(response["Content-Type"], "text/css")
+        with self.settings(SENDFILE="apache"):
+            response, body = self.get("/static/css/site.css")
+        self.assertEqual(response["X-Sendfile"], str(Path(self.root, "css/site.css")))
+
+    def test_collectstatic_compresses_and_reports_missing_files(self):
+        storages = {**django_settings.STORAGES, "staticfiles": {"BACKEND": "core.storage.CompressedManifestStaticFilesStorage"}}
+        with self.settings(STORAGES=storages):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            hashed = staticfiles_storage.stored_name("css/main.css")
+            self.assertRegex(hashed, r"^css/main\.[0-9a-f]{12}\.css$")
+            with open(Path(self.root, hashed + ".gz"), "rb") as file:
+                self.assertEqual(gzip.decompress(file.read()), Path(self.root, hashed).read_bytes())
+            # Файла нет в manifest - ошибка сборки видна, а не скрыта ссылкой без хэша
+            with self.assertRaises(ValueError):
+                staticfiles_storage.url("images/missing.png")
+
+
+class FailingMistral(FakeMistral):
+    """Модель, которая не отвечает на отзывы с текстом failing"""
+
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = failing
+
+    async def complete_async(self, messages, **kwargs):
+        if any(self.failing in str(message.get("content", "")) for message in messages):
+            raise TimeoutError("нет ответа")
+        return await super().complete_async(**kwargs)
+
+
+class ModerationTest(TestCase):
+    """Отзывы без ответа модели откладываются и не держат очередь"""
+
+    def setUp(self):
+        self.master = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+
+    def review(self, text):
+        return Review.objects.create(name="Клиент", text=text, master=self.master, rating=5)
+
+    def test_failing_review_is_postponed(self):
+        stuck = self.review("Модель на этот отзыв про стрижку бороды почему-то не отвечает")
+        fresh = self.review("Отличный мастер, стрижка получилась ровно такой, как хотел")
+        client = FailingMistral("не отвечает")
+        with self.assertLogs("core.moderation", "ERROR"):
+            self.assertEqual(async_to_sync(moderate_pending)(client, batch_size=1), (0, 0, 1))
+        self.assertEqual(async_to_sync(moderate_pending)(client, batch_size=1), (1, 1, 0))
+        fresh.refresh_from_db()
+        stuck.refresh_from_db()
+        self.assertEqual(fresh.status, 2)
+        self.assertEqual((stuck.status, stuck.moderation_attempts), (1, 1))
+        self.assertGreater(stuck.next_moderation_at, timezone.now())
+
+    def test_prefilter_links(self):
+        for text in ("Пишите на barber.ru", "https://t.me/abc", "Заходите: www.site", "t.me/barber", "мастер.рф"):
+            self.assertTrue(prefilter_reject(text), text)
+        for text in ("Приехал на Lada ru номерах", "Стрижка Top com по скидке, все ok. Net, не жалею"):
+            self.assertFalse(prefilter_reject(text), text)
+
+    def test_stats_are_shared(self):
+        """Счетчики кэша модерации лежат в общем кэше и видны команде --stats"""
+        cache.clear()
+        text = "Счетчики: мастер подстриг аккуратно, пришел бы еще раз"
+        self.review("Запись со скидкой на barber.ru")
+        self.review(text)
+        async_to_sync(moderate_pending)(FakeMistral(), batch_size=10)
+        self.review(text)
+        async_to_sync(moderate_pending)(FakeMistral(), batch_size=10)
+        self.assertEqual(moderation_stats(), {"prefilter": 1, "memory_hit": 1, "db_hit": 0, "miss": 1})
+        out = StringIO()
+        call_command("moderate_reviews", "--stats", stdout=out)
+        self.assertIn("фильтр 1, память 1, БД 0, запросов к модели 1", out.getvalue())
+
+
+class SchedulingTest(TransactionTestCase):
+    """Бронирование времени: одно время не может достаться двум записям"""
+
+    def setUp(self):
+        cache.clear()
+        self.master = Master.objects.create(
+            first_name="Иван", last_name="Петров", phone="+79990000000", address="-"
+        )
+        self.haircut = Service.objects.create(name="Стрижка", description="-", price=Decimal("1500"), duration=45)
+        for weekday in range(7):
+            WorkingHours.objects.create(master=self.master, weekday=weekday, start=time(10), end=time(20))
+        tomorrow = timezone.localdate() + timedelta(days=1)
+        self.start = timezone.make_aware(datetime.combine(tomorrow, time(12)))
+
+    def book(self, start, name="Клиент"):
+        with transaction.atomic():
+            visit = Visit.objects.create(name=name, phone="+79991112233", master=self.master, start_at=start)
+            visit.services.set([self.haircut])
+            reserve(visit)
+        return visit
+
+    def test_overlapping_visit_is_rejected(self):
+        self.book(self.start)
+        # Стрижка занимает 45 минут: 12:30 пересекается с 12:00-12:45
+        with self.assertRaises(SlotTaken):
+            self.book(self.start + timedelta(minutes=30))
+        self.book(self.start + timedelta(minutes=45))
+        self.assertEqual(Visit.objects.count(), 2)
+
+    def test_free_slots_exclude_booked_time(self):
+        self.book(self.start)
+        slots = free_slots(self.master.pk, [self.haircut.pk])
+        for busy in (-30, -15, 0, 15, 30):
+            self.assertNotIn(self.start + timedelta(minutes=busy), slots)
+        self.assertIn(self.start + timedelta(minutes=45), slots)
+        self.assertIn(self.start - timedelta(minutes=45), slots)
+
+    def test_cancelled_visit_releases_time(self):
+        visit = self.book(self.start)
+        visit.status = 2
+        visit.save()
+        self.assertIn(self.start, free_slots(self.master.pk, [self.haircut.pk]))
+        self.book(self.start)
+
+    def test_restored_visit_takes_time_again(self):
+        visit = self.book(self.start)
+        visit.status = 2
+        visit.save()
+        visit.status = 1
+        visit.save()
+        self.assertNotIn(self.start, free_slots(self.master.pk, [self.haircut.pk]))
+        with self.assertRaises(SlotTaken):
+            self.book(self.start)
+
+    def test_master_change_moves_time(self):
+        other = Master.objects.create(first_name="Петр", last_name="Иванов", phone="+79990000001", address="-")
+        WorkingHours.objects.create(master=other, weekday=self.start.weekday(), start=time(10), end=time(20))
+        visit = self.book(self.start)
+        visit.master = other
+        visit.save()
+        self.assertIn(self.start, free_slots(self.master.pk, [self.haircut.pk]))
+        self.assertEqual(set(VisitSlot.objects.values_list("master_id", flat=True)), {other.pk})
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_admin_rejects_restoring_visit_on_taken_time(self):
+        visit = self.book(self.start)
+        visit.status = 2
+        visit.save()
+        self.book(self.start, "Другой клиент")
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "password"))
+        response = self.client.post(f"/admin/core/visit/{visit.pk}/change/", {
+            "name": visit.name, "phone": visit.phone, "comment": "", "status": 1,
+            "master": self.master.pk, "services": [self.haircut.pk],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Это время уже занято")
+        visit.refresh_from_db()
+        self.assertEqual(visit.status, 2)
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_async_booking_on_taken_time_leaves_nothing(self):
+        self.book(self.start)
+        notifications = Notification.objects.count()
+        response = self.client.post("/book/", {
+            "name": "Клиент", "phone": "+79991112244", "master": self.master.pk,
+            "services": [self.haircut.pk], "start_at": timezone.localtime(self.start).strftime("%Y-%m-%dT%H:%M"),
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Visit.objects.count(), 1)
+        self.assertEqual(Notification.objects.count(), notifications)
+
+    @override_settings(RATELIMIT_ENABLED=False)
+    def test_async_invalid_form_renders_index_page(self):
+        Review.objects.create(name="Клиент", text="Отличная стрижка, все понравилось, приду еще", master=self.master, rating=5, status=0)
+        data = {"name": "Клиент", "phone": "", "master": self.master.pk, "services": [self.haircut.pk]}
+        sync = self.client.post("/", data)
+        async_ = self.client.post("/book/", data)
+        self.assertEqual((sync.status_code, async_.status_code), (200, 400))
+
+        def page(response):
+            return CSRF_INPUT_RE.sub("", response.content.decode())
+
+        self.assertEqual(page(async_), page(sync))
+        self.assertEqual(async_.context["masters"][0].rating.count, 1)
+        self.assertIsNotNone(async_.context["masters"][0].next_free)
+
+    def test_concurrent_bookings_get_different_results(self):
+        results = []
+        barrier = threading.Barrier(2)
+
+        def worker(name):
+            try:
+                barrier.wait()
+                self.book(self.start, name)
+                results.append("ok")
+            except SlotTaken:
+                results.append("taken")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker, args=(f"Клиент {i}",)) for i in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(results), ["ok", "taken"])
+        self.assertEqual(Visit.objects.count(), 1)
+        self.assertEqual(VisitSlot.objects.count(), 3)
+
+
+class AvailabilityTest(TestCase):
+    """Битовые карты свободного времени и кэш ближайшего времени (core/availability.py)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.master = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        cls.service = Service.objects.create(name="Бритье", description="-", price=Decimal("500"), duration=15)
+        cls.master.services.add(cls.service)
+        # Каждый день с 10 до 11 - четыре интервала
+        for weekday in range(7):
+            WorkingHours.objects.create(master=cls.master, weekday=weekday, start=time(10), end=time(11))
+        cls.tomorrow = timezone.localdate() + timedelta(days=1)
+        cls.day_start = timezone.make_aware(datetime.combine(cls.tomorrow, time(10)))
+        # Завтра занято все, кроме 10:00
+        visit = Visit.objects.create(name="Клиент", phone="+79991112233", master=cls.master)
+        VisitSlot.objects.bulk_create(
+            VisitSlot(master=cls.master, start=cls.day_start + SLOT * i, visit=visit) for i in range(1, 4)
+        )
+
+    def setUp(self):
+        cache.clear()
+        caches["pages"].clear()
+
+    def test_first_free(self):
+        start = self.day_start
+        bits = 0b1110011
+        self.assertEqual(first_free(start, bits, 2, start - SLOT), start)
+        # Начавшийся интервал не предлагается
+        self.assertEqual(first_free(start, bits, 2, start + timedelta(minutes=10)), start + SLOT * 4)
+        self.assertEqual(first_free(start, bits, 3, start - SLOT), start + SLOT * 4)
+        self.assertIsNone(first_free(start, bits, 4, start - SLOT))
+
+    def test_build_maps(self):
+        WorkingHours.objects.filter(weekday=(self.tomorrow + timedelta(days=1)).weekday()).delete()
+        maps = build_maps([self.master.pk], self.tomorrow, 2)
+        self.assertEqual(maps[self.master.pk, self.tomorrow], (self.day_start, 0b0001))
+        self.assertEqual(maps[self.master.pk, self.tomorrow + timedelta(days=1)], DAY_OFF)
+
+    def test_next_free_follows_service_duration(self):
+        now = self.day_start - timedelta(hours=1)
+        self.assertEqual(next_free([self.master.pk], now), {self.master.pk: self.day_start})
+        # 30 минут в свободный интервал 10:00-10:15 уже не помещаются
+        self.service.duration = 30
+        self.service.save()
+        self.assertEqual(next_free([self.master.pk], now), {self.master.pk: self.day_start + timedelta(days=1)})
+
+    def test_cached_home_page_expires_with_next_free(self):
+        response = self.client.get("/")
+        expires = response.wsgi_request.page_cache_expires
+        self.assertEqual(expires, valid_until(next_free([self.master.pk])))
+        self.assertEqual(self.client.get("/")["X-Page-Cache"], "hit")
+        with mock.patch("core.middleware.time") as clock:
+            clock.time.return_value = expires.timestamp() + 1
+            response = self.client.get("/")
+        self.assertEqual(response["X-Page-Cache"], "miss")
+
+
+class ApiTest(TestCase):
+    """Каталог для виджета: ETag на каждую кодировку, 304 без запросов к БД, Vary"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.master = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        cls.service = Service.objects.create(name="Стрижка", description="-", price=Decimal("1500"))
+        cls.master.services.add(cls.service)
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, path, **headers):
+        return self.client.get(path, **{f"HTTP_{name.upper().replace('-', '_')}": value for name, value in headers.items()})
+
+    def test_etag_per_encoding(self):
+        plain = self.get("/api/catalog/")
+        gzipped = self.get("/api/catalog/", accept_encoding="gzip, br;q=0")
+        self.assertNotIn("Content-Encoding", plain)
+        self.assertEqual(gzipped["Content-Encoding"], "gzip")
+        self.assertEqual(json.loads(gzip.decompress(gzipped.content)), json.loads(plain.content))
+        self.assertEqual(gzipped["ETag"], plain["ETag"][:-1] + '-gzip"')
+        for response in (plain, gzipped):
+            self.assertEqual(response["Vary"], "Accept-Encoding")
+            self.assertEqual(response["Cache-Control"], "public, max-age=60, must-revalidate")
+        # Без пакета brotli "br" не выбирается
+        with mock.patch("core.api.brotli", None):
+            self.assertEqual(self.get("/api/catalog/", accept_encoding="br, gzip")["Content-Encoding"], "gzip")
+
+    def test_brotli_etag(self):
+        with mock.patch("core.api.brotli", mock.Mock(compress=lambda data: b"br:" + data)):
+            plain = self.get("/api/catalog/")
+            response = self.get("/api/catalog/", accept_encoding="gzip, br")
+            not_modified = self.get("/api/catalog/", accept_encoding="gzip, br", if_none_match=response["ETag"])
+        self.assertEqual((response["Content-Encoding"], response["ETag"]), ("br", plain["ETag"][:-1] + '-br"'))
+        self.assertEqual(response.content, b"br:" + plain.content)
+        self.assertEqual(not_modified.status_code, 304)
+
+    def test_not_modified(self):
+        etag = self.get("/api/catalog/", accept_encoding="gzip")["ETag"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get("/api/catalog/", accept_encoding="gzip", if_none_match=f'"other", {etag}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(response["Vary"], "Accept-Encoding")
+        self.assertEqual(len(queries), 0)
+        # ETag сжатого ответа не подходит к несжатому
+        self.assertEqual(self.get("/api/catalog/", if_none_match=etag).status_code, 200)
+
+    def test_etag_changes_with_catalog_version(self):
+        etag = self.get("/api/catalog/")["ETag"]
+        bump_version("catalog")
+        response = self.get("/api/catalog/", if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        # Изменение мастера тоже меняет версию (сигналы core/signals.py)
+        etag = response["ETag"]
+        self.master.first_name = "Петр"
+        self.master.save()
+        response = self.get("/api/catalog/", if_none_match=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["masters"][0]["first_name"], "Петр")
+
+    def test_schedule_responses_do_not_vary(self):
+        # Свободное время не сжимается и не зависит от сессии посетителя
+        for path in (f"/api/slots/?master={self.master.pk}&services={self.service.pk}", "/api/next-free/"):
+            with self.subTest(path):
+                plain = self.get(path)
+                gzipped = self.get(path, accept_encoding="gzip")
+                self.assertEqual(plain.status_code, 200)
+                self.assertEqual(gzipped.content, plain.content)
+                self.assertNotIn("Content-Encoding", gzipped)
+                self.assertNotIn("Vary", gzipped)
+                self.assertNotIn("ETag", gzipped)
+        with self.assertLogs("django.request", "WARNING"):
+            self.assertEqual(self.get("/api/slots/?master=x").status_code, 400)
+
+
+CSRF_INPUT_RE = re.compile(r'name="csrfmiddlewaretoken" value="([^"]+)"')
+
+
+@override_settings(RATELIMIT_ENABLED=False)
+class PageCacheTest(TestCase):
+    """Общая копия страницы: у каждого посетителя свой CSRF-токен и свои сообщения"""
+
+    def setUp(self):
+        cache.clear()
+        caches["pages"].clear()
+
+    def csrf_token(self, response):
+        return CSRF_INPUT_RE.search(response.content.decode()).group(1)
+
+    def flash(self, client, text):
+        """Сообщение (messages) для следующего запроса client, как после редиректа"""
+        storage = CookieStorage(RequestFactory().get("/"))
+        storage.add(messages.INFO, text)
+        response = HttpResponse()
+        storage.update(response)
+        client.cookies[storage.cookie_name] = response.cookies[storage.cookie_name].value
+
+    def test_each_client_gets_own_csrf_token(self):
+        first, second = Client(enforce_csrf_checks=True), Client(enforce_csrf_checks=True)
+        miss = first.get("/review/create/")
+        hit = second.get("/review/create/")
+        self.assertEqual((miss["X-Page-Cache"], hit["X-Page-Cache"]), ("miss", "hit"))
+        first_token, second_token = self.csrf_token(miss), self.csrf_token(hit)
+        self.assertNotEqual(first_token, second_token)
+        self.assertNotEqual(first.cookies["csrftoken"].value, second.cookies["csrftoken"].value)
+        # Токен из кэшированной страницы подходит к куке своего посетителя и только к ней
+        self.assertEqual(second.post("/review/create/", {"csrfmiddlewaretoken": second_token}).status_code, 200)
+        with self.assertLogs("django.security.csrf", "WARNING"):
+            self.assertEqual(second.post("/review/create/", {"csrfmiddlewaretoken": first_token}).status_code, 403)
+
+    def test_messages_are_not_shared(self):
+        # Страница, отрендеренная с сообщением, кэшируется без него
+        self.flash(self.client, "Только для первого")
+        response = self.client.get("/")
+        self.assertEqual(response["X-Page-Cache"], "miss")
+        self.assertIn("Только для первого", response.content.decode())
+        other = Client()
+        response = other.get("/")
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertNotIn("Только для первого", response.content.decode())
+
+        # Сообщение подставляется в готовую копию, в кэш не попадает
+        self.flash(self.client, "Снова первому")
+        response = self.client.get("/")
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertIn("Снова первому", response.content.decode())
+        self.assertNotIn("Снова первому", self.client.get("/").content.decode())
+        response = other.get("/")
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertNotIn("Снова первому", response.content.decode())
+
+    def test_authenticated_and_post_bypass_cache(self):
+        self.client.get("/")
+        self.assertEqual(self.client.get("/")["X-Page-Cache"], "hit")
+        self.assertNotIn("X-Page-Cache", self.client.get("/", {"page": 2}))
+        self.assertNotIn("X-Page-Cache", self.client.post("/review/create/", {}))
+        self.client.force_login(User.objects.create_user("staff", password="password"))
+        self.assertNotIn("X-Page-Cache", self.client.get("/"))
+
+    def test_not_modified(self):
+        response = self.client.get("/")
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+        self.assertEqual(response["Cache-Control"], "private, no-cache")
+        self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertEqual(self.client.get("/", HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+        self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH='W/"other"').status_code, 200)
+        # If-None-Match важнее даты
+        response = self.client.get("/", HTTP_IF_NONE_MATCH='W/"other"', HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+        # Без CSRF-куки токен из копии клиента не подойдет - отдается страница
+        self.assertEqual(Client().get("/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # Есть сообщение - его нужно показать
+        self.flash(self.client, "Запись создана")
+        self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        # Данные изменились - другая страница
+        bump_version("catalog")
+        response = self.client.get("/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response["X-Page-Cache"]), (200, "miss"))
+        self.assertNotEqual(response["ETag"], etag)
+
+
+@override_settings(RATELIMIT_ENABLED=True, RATELIMIT_BACKEND="memory")
+class RateLimitTest(TestCase):
+    """Лимиты POST-запросов к формам и подавление повторных отправок записи"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.master = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        cls.haircut = Service.objects.create(name="Стрижка", description="-", price=Decimal("1500"))
+        cls.master.services.add(cls.haircut)
+        for weekday in range(7):
+            WorkingHours.objects.create(master=cls.master, weekday=weekday, start=time(10), end=time(20))
+
+    def setUp(self):
+        cache.clear()
+        start = timezone.make_aware(datetime.combine(timezone.localdate() + timedelta(days=1), time(12)))
+        self.booking = {
+            "name": "Клиент", "phone": "+7 999 111-22-33", "comment": "", "master": self.master.pk,
+            "services": [self.haircut.pk], "start_at": start.strftime("%Y-%m-%dT%H:%M"),
+        }
+
+    def test_limited_request_makes_no_queries(self):
+        review = {"name": "Клиент", "text": "Хорошая стрижка, все понравилось, приду еще раз", "master": self.master.pk, "rating": 5}
+        for _ in range(5):
+            self.client.post("/review/create/", review)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/review/create/", review)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(len(queries), 0)
+
+    def test_duplicate_bookings_make_one_visit(self):
+        first = self.client.post("/", self.booking)
+        second = self.client.post("/", self.booking)
+        self.assertEqual((first.status_code, second.status_code), (302, 302))
+        self.assertEqual(Visit.objects.count(), 1)
+
+    def test_duplicate_of_pending_booking_is_not_confirmed(self):
+        # Первая такая же отправка еще обрабатывается в другом воркере
+        cache.add(f"booking:{booking_fingerprint(RequestFactory().post('/', self.booking))}", "pending", 60)
+        response = self.client.post("/", self.booking)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(Visit.objects.count(), 0)
+
+    def test_same_data_from_different_clients(self):
+        booking = {**self.booking, "start_at": ""}
+        first = self.client.post("/", booking, REMOTE_ADDR="10.0.0.1")
+        second = self.client.post("/", booking, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual((first.status_code, second.status_code), (302, 302))
+        self.assertEqual(Visit.objects.count(), 2)
+
+    def test_forged_post_does_not_take_dedup_key_or_limit(self):
+        client = Client(enforce_csrf_checks=True)
+        with self.assertLogs("django.security.csrf", "WARNING"):
+            for _ in range(5):
+                self.assertEqual(client.post("/", self.booking).status_code, 403)
+        token = CSRF_INPUT_RE.search(client.get("/").content.decode()).group(1)
+        response = client.post("/", {**self.booking, "csrfmiddlewaretoken": token})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Visit.objects.count(), 1)
+
+    def test_memory_backend_is_bounded(self):
+        backend = MemoryBackend()
+        backend.MAX_KEYS = 100
+        bucket = TokenBucket(3, 600)
+        for number in range(1000):
+            backend.take(f"phone:{number}", bucket)
+        self.assertEqual(len(backend.buckets), 100)
+        self.assertIn("phone:999", backend.buckets)
+
+
+class ExportTest(TestCase):
+    """Выгрузка записей: XLSX открывается, формулы из CSV не выполняются"""
+
+    NAMES = ["=HYPERLINK(\"http://x\")", "+1", "-1", "@SUM(A1)", "Обычное <имя> & Ко"]
+
+    def setUp(self):
+        master = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        service = Service.objects.create(name="Стрижка", description="-", price=Decimal("1500"))
+        for name in self.NAMES:
+            Visit.objects.create(name=name, phone="89991112233", master=master).services.add(service)
+
+    def test_csv_safe(self):
+        for value in ("=1+1", "+7", "-5", "@cmd", "\tx", "\rx"):
+            self.assertEqual(csv_safe(value), "'" + value)
+        self.assertEqual(csv_safe("Иван"), "Иван")
+        self.assertEqual(csv_safe(Decimal("-5")), Decimal("-5"))
+
+    def test_csv(self):
+        stream, content_type = export_visits(Visit.objects.all(), "csv")
+        rows = list(csv.reader(StringIO(b"".join(stream).decode("utf-8-sig"))))
+        self.assertEqual(content_type, "text/csv; charset=utf-8")
+        self.assertEqual(rows[0], COLUMNS)
+        self.assertEqual([row[1] for row in rows[1:]], ["'" + name for name in self.NAMES[:4]] + [self.NAMES[4]])
+        self.assertEqual({row[6] for row in rows[1:]}, {"1500.00"})
+
+    def test_xlsx_opens(self):
+        # Маленький flush_every: лист отдается несколькими частями
+        data = b"".join(xlsx_stream(export_rows(Visit.objects.all()), flush_every=2))
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertIn("[Content_Types].xml", archive.namelist())
+            sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+        ns = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+        rows = sheet.findall("s:sheetData/s:row", ns)
+        self.assertEqual(len(rows), len(self.NAMES) + 1)
+        header = [cell.findtext("s:is/s:t", namespaces=ns) for cell in rows[0]]
+        self.assertEqual(header, COLUMNS)
+        names = [row[1].findtext("s:is/s:t", namespaces=ns) for row in rows[1:]]
+        self.assertEqual(names, self.NAMES)
+        # Сумма - число, а не строка
+        self.assertEqual((rows[1][6].get("t"), rows[1][6].findtext("s:v", namespaces=ns)), (None, "1500.00"))
+
+
+class DailyStatsTest(TestCase):
+    """Сигналы поддерживают дневные сводки так же, как полный пересчет rebuild_daily_stats()"""
+
+    def setUp(self):
+        self.ivan = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        self.oleg = Master.objects.create(first_name="Олег", last_name="Сидоров", phone="+79990000001", address="-")
+        self.haircut = Service.objects.create(name="Стрижка", description="-", price=Decimal("1500"))
+        self.beard = Service.objects.create(name="Борода", description="-", price=Decimal("700"))
+        self.visit = Visit.objects.create(name="Клиент", phone="+79991112233", master=self.ivan, status=3)
+        self.visit.services.set([self.haircut, self.beard])
+        self.other = Visit.objects.create(
+            name="Другой", phone="+79992223344", master=self.oleg, created_at=timezone.now() - timedelta(days=1),
+        )
+        self.other.services.set([self.haircut])
+
+    def stats(self):
+        return (
+            sorted(DailyMasterStat.objects.filter(visits__gt=0).values_list("day", "master", "visits", "completed", "cancelled", "revenue")),
+            sorted(DailyServiceStat.objects.filter(visits__gt=0).values_list("day", "service", "visits", "completed", "cancelled", "revenue")),
+        )
+
+    def assertMatchesRebuild(self):
+        self.assertEqual(wrong_daily_stats(), (0, 0))
+        incremental = self.stats()
+        rebuild_daily_stats()
+        self.assertEqual(self.stats(), incremental)
+
+    def test_create(self):
+        self.assertMatchesRebuild()
+        self.assertEqual(DailyMasterStat.objects.get(master=self.ivan).revenue, Decimal("2200"))
+
+    def test_status_change(self):
+        for status in (2, 1, 3):
+            self.visit.status = status
+            self.visit.save()
+            self.assertMatchesRebuild()
+
+    def test_move(self):
+        self.visit.master = self.oleg
+        self.visit.save()
+        self.assertMatchesRebuild()
+        self.visit.created_at -= timedelta(days=2)
+        self.visit.save()
+        self.assertMatchesRebuild()
+
+    def test_service_change(self):
+        self.visit.services.remove(self.beard)
+        self.assertMatchesRebuild()
+        self.other.services.add(self.beard)
+        self.assertMatchesRebuild()
+        self.visit.services.clear()
+        self.assertMatchesRebuild()
+        # С обратной стороны связи
+        self.beard.visit_set.clear()
+        self.assertMatchesRebuild()
+        self.haircut.visit_set.add(self.visit)
+        self.assertMatchesRebuild()
+        self.haircut.price = Decimal("1800")
+        self.haircut.save()
+        self.assertMatchesRebuild()
+
+    def test_delete(self):
+        self.visit.delete()
+        self.assertMatchesRebuild()
+        self.haircut.delete()
+        self.assertMatchesRebuild()
+        self.assertFalse(DailyServiceStat.objects.filter(visits__gt=0).exists())
+
+
+class MasterRatingTest(TestCase):
+    """Приращения рейтингов через F() совпадают с полным пересчетом rebuild_master_ratings()"""
+
+    def setUp(self):
+        self.ivan = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        self.oleg = Master.objects.create(first_name="Олег", last_name="Сидоров", phone="+79990000001", address="-")
+        self.reviews = [
+            Review.objects.create(name="Клиент", text="Отлично", master=self.ivan, rating=rating, status=status)
+            for rating, status in ((5, 0), (4, 2), (2, 1), (1, 3), (5, 1))
+        ]
+
+    def ratings(self):
+        return sorted(MasterRating.objects.filter(count__gt=0).values_list("master", "count", "total", "r1", "r2", "r3", "r4", "r5"))
+
+    def assertMatchesRebuild(self):
+        self.assertEqual(wrong_master_ratings(), {})
+        incremental = self.ratings()
+        rebuild_master_ratings()
+        self.assertEqual(self.ratings(), incremental)
+
+    def test_create(self):
+        self.assertMatchesRebuild()
+        self.assertEqual(MasterRating.objects.get(master=self.ivan).average, 4.5)
+
+    def test_status_flip(self):
+        review = self.reviews[2]
+        for status in (0, 3, 2, 1):
+            review.status = status
+            review.save()
+            self.assertMatchesRebuild()
+
+    def test_set_review_status(self):
+        # Смешанный набор: часть отзывов уже видима, часть станет видимой
+        all_reviews = Review.objects.all()
+        for status in (2, 0, 3, 1, 0):
+            self.assertEqual(set_review_status(all_reviews, status), 5)
+            self.assertMatchesRebuild()
+        self.assertEqual(set_review_status(Review.objects.filter(rating=5), 3), 2)
+        self.assertMatchesRebuild()
+
+    def test_rating_edit(self):
+        for review in self.reviews[:3]:
+            review.rating = 3
+            review.save()
+            self.assertMatchesRebuild()
+
+    def test_master_change(self):
+        for review in self.reviews[:3]:
+            review.master = self.oleg
+            review.save()
+            self.assertMatchesRebuild()
+        self.assertEqual(MasterRating.objects.get(master=self.oleg).count, 2)
+
+    def test_delete(self):
+        for review in self.reviews:
+            review.delete()
+            self.assertMatchesRebuild()
+        self.assertEqual(self.ratings(), [])
+
+
+class ReviewsFeedTest(TestCase):
+    """Кэш ленты отзывов сбрасывают только изменения опубликованных отзывов"""
+
+    def setUp(self):
+        cache.clear()
+        master = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        self.visible = Review.objects.create(name="Клиент", text="Видимый отзыв", master=master, rating=5, status=0)
+        self.hidden = Review.objects.create(name="Клиент", text="Скрытый отзыв", master=master, rating=1, status=1)
+
+    def assertFeedCached(self):
+        """Изменение не сбросило ленту: версия та же, страница берется из кэша без запросов"""
+        self.assertEqual(get_version("reviews"), self.version)
+        with self.assertNumQueries(0):
+            return reviews_feed()["html"]
+
+    def assertFeedChanged(self):
+        self.assertNotEqual(get_version("reviews"), self.version)
+        self.version = get_version("reviews")
+        return reviews_feed()["html"]
+
+    def test_hidden_changes_keep_feed(self):
+        html = reviews_feed()["html"]
+        self.assertIn("Видимый отзыв", html)
+        self.assertNotIn("Скрытый отзыв", html)
+        self.version = get_version("reviews")
+
+        self.hidden.text = "Скрытый отзыв, исправлен"
+        self.hidden.save()
+        self.assertEqual(self.assertFeedCached(), html)
+        self.hidden.status = 3
+        self.hidden.save()
+        self.assertEqual(self.assertFeedCached(), html)
+        set_review_status(Review.objects.filter(pk=self.hidden.pk), 1)
+        self.assertEqual(self.assertFeedCached(), html)
+        self.hidden.delete()
+        self.assertEqual(self.assertFeedCached(), html)
+
+    def test_visible_changes_reset_feed(self):
+        reviews_feed()
+        self.version = get_version("reviews")
+
+        self.visible.text = "Видимый отзыв, исправлен"
+        self.visible.save()
+        self.assertIn("Видимый отзыв, исправлен", self.assertFeedChanged())
+        self.hidden.status = 2
+        self.hidden.save()
+        self.assertIn("Скрытый отзыв", self.assertFeedChanged())
+        # Отзыв скрыли: сброс по старому статусу
+        self.hidden.status = 3
+        self.hidden.save()
+        self.assertNotIn("Скрытый отзыв", self.assertFeedChanged())
+        set_review_status(Review.objects.filter(pk=self.visible.pk), 1)
+        self.assertIn("Отзывов пока нет", self.assertFeedChanged())
+        set_review_status(Review.objects.filter(pk=self.visible.pk), 0)
+        self.assertIn("Видимый отзыв", self.assertFeedChanged())
+        self.visible.delete()
+        self.assertIn("Отзывов пока нет", self.assertFeedChanged())
+
+
+class ImportVisitsTest(TestCase):
+    """Массовый импорт дает те же денормализованные данные, что и создание записей через сигналы"""
+
+    def setUp(self):
+        self.master = Master.objects.create(first_name="Иван", last_name="Петров", phone="+79990000000", address="-")
+        self.haircut = Service.objects.create(name="Стрижка", description="-", price=Decimal("1500"))
+        self.beard = Service.objects.create(name="Борода", description="-", price=Decimal("700"))
+        self.rows = [
+            {"name": "Клиент", "phone": "+7 999 111-22-33", "master": self.master.pk,
+             "services": f"{self.haircut.pk};{self.beard.pk}", "status": 3, "created_at": "2024-03-01T10:00:00+03:00"},
+            {"name": "Клиент", "phone": "8 (999) 111-22-33", "master": self.master.pk,
+             "services": [self.beard.pk], "status": 1, "created_at": "2024-03-01T12:00:00+03:00"},
+            {"name": "Другой", "phone": "+79992223344", "master": self.master.pk,
+             "services": [self.haircut.pk], "status": 2, "created_at": "2024-03-02T11:00:00+03:00"},
+        ]
+
+    def snapshot(self):
+        return (
+            sorted(Visit.objects.values_list("phone", "status", "total_price", "phone_digits")),
+            dict(ClientStats.objects.filter(visit_count__gt=0).values_list("phone", "visit_count")),
+            sorted(DailyMasterStat.objects.filter(visits__gt=0).values_list("day", "master", "visits", "completed", "cancelled", "revenue")),
+            sorted(DailyServiceStat.objects.filter(visits__gt=0).values_list("day", "service", "visits", "completed", "cancelled", "revenue")),
+        )
+
+    def test_matches_signals(self):
+        for row in self.rows:
+            services = row["services"]
+            if isinstance(services, str):
+                services = [int(pk) for pk in services.split(";")]
+            visit = Visit.objects.create(
+                name=row["name"], phone=row["phone"], master=self.master, status=row["status"],
+                created_at=datetime.fromisoformat(row["created_at"]),
+            )
+            visit.services.set(services)
+        expected = self.snapshot()
+        Visit.objects.all().delete()
+        Notification.objects.all().delete()
+
+        result = import_visits(self.rows + [{"name": "", "master": self.master.pk, "services": "1"}])
+        self.assertEqual((result.imported, result.skipped), (3, 1))
+        self.assertEqual(self.snapshot(), expected)
+        self.assertFalse(wrong_visit_totals().exists())
+        self.assertEqual(wrong_client_stats(), {})
+        self.assertEqual(wrong_daily_stats(), (0, 0))
+        # Одно итоговое уведомление вместо сообщения на каждую запись
+        notification = Notification.objects.get()
+        self.assertIn("Загружено: 3", notification.text)
+        self.assertIn("Пропущено с ошибками: 1", notification.text)
+
+
+class DumpLoaderTest(TestCase):
+    """Повторная загрузка дампа обновляет строки и пересчитывает денормализованные данные"""
+
+    def setUp(self):
+        created = "2024-03-01T10:00:00Z"
+        self.dump = [
+            {"model": "core.service", "pk": 1, "fields": {"name": "Стрижка", "description": "-", "price": "1500.00", "duration": 30}},
+            {"model": "core.service", "pk": 2, "fields": {"name": "Борода", "description": "-", "price": "700.00", "duration": 30}},
+            {"model": "core.master", "pk": 1, "fields": {"first_name": "Иван", "last_name": "Петров", "phone": "+79990000000", "address": "-", "services": [1, 2]}},
+            {"model": "core.visit", "pk": 1, "fields": {"name": "Клиент", "phone": "+7 999 111-22-33", "created_at": created, "status": 3, "master": 1, "services": [1, 2]}},
+            {"model": "core.visit", "pk": 2, "fields": {"name": "Клиент", "phone": "8 (999) 111-22-33", "created_at": created, "status": 1, "master": 1, "services": [2]}},
+            {"model": "core.review", "pk": 1, "fields": {"name": "Клиент", "text": "Отличная стрижка, все понравилось", "master": 1, "rating": 5, "created_at": created, "status": 0}},
+        ]
+        file = tempfile.NamedTemporaryFile("w", suffix=".json", encoding="utf-8", delete=False)
+        file.close()
+        self.path = file.name
+        self.addCleanup(os.unlink, self.path)
+
+    def load(self):
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(self.dump, file, ensure_ascii=False)
+        loaded = load_dump(self.path)
+        self.assertEqual(sum(loaded.values()), len(self.dump))
+
+    def assertRebuilt(self):
+        self.assertFalse(wrong_visit_totals().exists())
+        self.assertEqual(wrong_client_stats(), {})
+        self.assertEqual(wrong_daily_stats(), (0, 0))
+        self.assertEqual(wrong_master_ratings(), {})
+
+    def test_load_twice_upserts(self):
+        self.load()
+        self.load()
+        counts = [model.objects.count() for model in (Service, Master, Visit, Review)]
+        self.assertEqual(counts, [2, 1, 2, 1])
+        self.assertEqual(Visit.objects.get(pk=1).total_price, Decimal("2200"))
+        self.assertEqual(ClientStats.objects.get().visit_count, 2)
+        self.assertRebuilt()
+
+        # Цена услуги, состав записи и оценка меняются в новом дампе
+        self.dump[0]["fields"]["price"] = "1800.00"
+        self.dump[4]["fields"]["services"] = [1]
+        self.dump[5]["fields"]["rating"] = 3
+        self.load()
+        self.assertEqual(Service.objects.get(pk=1).price, Decimal("1800"))
+        self.assertEqual(list(Visit.objects.get(pk=2).services.values_list("pk", flat=True)), [1])
+        self.assertEqual(Visit.objects.get(pk=2).total_price, Decimal("1800"))
+        self.assertEqual(MasterRating.objects.get(master_id=1).average, 3)
+        self.assertRebuilt()
+
+    def test_old_dump_keeps_new_columns(self):
+        self.load()
+        moderated = timezone.now()
+        Review.objects.update(moderated_at=moderated, moderation_attempts=2, next_moderation_at=None)
+        Master.objects.update(photo_hash="abc", photo_width=640)
+        Visit.objects.filter(pk=2).update(start_at=moderated)
+        # В дампе нет этих полей: при повторной загрузке они не сбрасываются
+        self.dump[2]["fields"]["address"] = "Новый адрес"
+        self.load()
+        review = Review.objects.get()
+        self.assertEqual((review.moderated_at, review.moderation_attempts, review.next_moderation_at), (moderated, 2, None))
+        master = Master.objects.get()
+        self.assertEqual((master.photo_hash, master.photo_width, master.address), ("abc", 640, "Новый адрес"))
+        self.assertEqual(Visit.objects.get(pk=2).start_at, moderated)
+        self.assertEqual(Visit.objects.get(pk=2).phone_digits, "79991112233")
+
+
+BASELINE_PATH = Path(__file__).with_name("perf_baseline.json")
+# Полный просмотр большой таблицы в плане SQLite (SCAN без индекса)
+FULL_SCAN_RE = re.compile(r"\bSCAN (core_visit|core_review|core_visit_services)\b(?! USING)")
+
+
+@override_settings(RATELIMIT_ENABLED=False)
+class PerformanceTest(TestCase):
+    """
+    Регрессии производительности на данных реального объема: число запросов
+    к БД на страницу (бюджет), отсутствие полных просмотров больших таблиц и
+    время ответа относительно эталона core/perf_baseline.json. Сеть не нужна:
+    Telegram и Mistral заменены заглушками.
+
+    Время зависит от машины и ее загрузки, поэтому в обычном прогоне
+    проверяются только запросы. Сравнение с эталоном (тест падает, если
+    страница стала медленнее больше чем в threshold раз, PERF_THRESHOLD
+    переопределяет):
+        PERF_TIMINGS=1 manage.py test core.tests.PerformanceTest
+    Записать новый эталон после осознанного изменения:
+        PERF_UPDATE_BASELINE=1 manage.py test core.tests.PerformanceTest
+    """
+
+    VISITS = 5000
+    REVIEWS = 1000
+    REPEAT = 5
+    # Запросов на страницу без кэша, из них два - сессия и пользователь
+    QUERY_BUDGETS = {
+        "index": 9,
+        "visit_list": 6,
+        "visit_list_search": 6,
+        "visit_admin": 8,
+        "review_admin": 8,
+    }
+    PAGES = {
+        "index": ("/", {}),
+        "visit_list": ("/visits/", {}),
+        "visit_list_search": ("/visits/", {"q": "Иван"}),
+        "visit_admin": ("/admin/core/visit/", {}),
+        "review_admin": ("/admin/core/review/", {}),
+    }
+    timings = {}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        cls.masters, cls.services = seed_catalog()
+        seed_visits(cls.VISITS, cls.masters)
+        seed_reviews(cls.REVIEWS, cls.masters)
+        rebuild_master_ratings()
+        WorkingHours.objects.bulk_create(
+            WorkingHours(master=master, weekday=weekday, start=time(8), end=time(22))
+            for master in cls.masters
+            for weekday in range(7)
+        )
+        cls.PAGES = {**cls.PAGES, "visit_list_search": ("/visits/", {"q": "Иван", "master": cls.masters[0].pk})}
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if os.getenv("PERF_UPDATE_BASELINE") == "1" and cls.timings:
+            baseline = cls.load_baseline()
+            baseline["timings_ms"].update({name: round(ms, 2) for name, ms in cls.timings.items()})
+            BASELINE_PATH.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n", encoding="utf-8")
+
+    @staticmethod
+    def timings_enabled():
+        return os.getenv("PERF_TIMINGS") == "1" or os.getenv("PERF_UPDATE_BASELINE") == "1"
+
+    @staticmethod
+    def load_baseline():
+        return json.loads(BASELINE_PATH.read_text(encoding="utf-8"))
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        self.clear_caches()
+        # Уведомления и модерация выполняются воркерами, но сеть не должна понадобиться и случайно
+        patches = [
+            mock.patch("core.notifications.send_telegram_message", mock.AsyncMock()),
+            mock.patch("core.utlils.get_mistral_client", return_value=FakeMistral()),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    @staticmethod
+    def clear_caches():
+        cache.clear()
+        caches["pages"].clear()
+
+    def get_page(self, name):
+        path, params = self.PAGES[name]
+        response = self.client.get(path, params)
+        self.assertEqual(response.status_code, 200, name)
+        return response
+
+    def check_timing(self, name, ms):
+        """Сравнить время (мс) с эталоном; при PERF_UPDATE_BASELINE=1 только запомнить"""
+        if not self.timings_enabled():
+            return
+        self.timings[name] = ms
+        if os.getenv("PERF_UPDATE_BASELINE") == "1":
+            return
+        baseline = self.load_baseline()
+        threshold = float(os.getenv("PERF_THRESHOLD", baseline["threshold"]))
+        expected = baseline["timings_ms"].get(name)
+        if expected is None:
+            self.fail(f"Нет эталона для {name}, запустите с PERF_UPDATE_BASELINE=1")
+        self.assertLessEqual(
+            ms, expected * threshold, f"{name}: {ms:.1f} мс, эталон {expected} мс (допуск x{threshold})"
+        )
+
+    def test_query_budgets(self):
+        for name, budget in self.QUERY_BUDGETS.items():
+            with self.subTest(name):
+                self.clear_caches()
+                with CaptureQueriesContext(connection) as queries:
+                    self.get_page(name)
+                self.assertLessEqual(
+                    len(queries), budget,
+                    f"{name}: {len(queries)} запросов при бюджете {budget}:\n"
+                    + "\n".join(query["sql"] for query in queries),
+                )
+
+    def test_no_full_scans(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("План запроса разбирается только для SQLite")
+        for name in self.PAGES:
+            self.clear_caches()
+            with CaptureQueriesContext(connection) as queries:
+                self.get_page(name)
+            with connection.cursor() as cursor:
+                for query in queries:
+                    sql = query["sql"]
+                    if not sql.startswith("SELECT"):
+                        continue
+                    cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+                    plan = "\n".join(row[-1] for row in cursor.fetchall())
+                    with self.subTest(name, sql=sql):
+                        self.assertIsNone(FULL_SCAN_RE.search(plan), plan)
+
+    def test_page_timings(self):
+        if not self.timings_enabled():
+            self.skipTest("Время проверяется только с PERF_TIMINGS=1")
+        for name in self.PAGES:
+            durations = []
+            for _ in range(self.REPEAT):
+                self.clear_caches()
+                start = timer.perf_counter()
+                self.get_page(name)
+                durations.append((timer.perf_counter() - start) * 1000)
+            with self.subTest(name):
+                self.check_timing(name, statistics.median(durations))
+
+    def test_booking_throughput(self):
+        master = self.masters[0]
+        service = master.services.first()
+        day = timezone.localdate() + timedelta(days=1)
+        visits = Visit.objects.count()
+        start = timer.perf_counter()
+        for i in range(self.REPEAT * 4):
+            start_at = datetime.combine(day, time(8)) + timedelta(minutes=30 * i)
+            response = self.client.post("/", {
+                "name": f"Клиент {i}",
+                "phone": f"+7999000{i:04d}",
+                "comment": "",
+                "master": master.pk,
+                "services": [service.pk],
+                "start_at": start_at.strftime("%Y-%m-%dT%H:%M"),
+            })
+            self.assertEqual(response.status_code, 302, response.content[:500])
+        elapsed = (timer.perf_counter() - start) * 1000
+        self.assertEqual(Visit.objects.count(), visits + self.REPEAT * 4)
+        self.check_timing("booking_post", elapsed / (self.REPEAT * 4))
+
+    def test_review_throughput(self):
+        reviews = Review.objects.count()
+        start = timer.perf_counter()
+        for i in range(self.REPEAT * 4):
+            response = self.client.post("/review/create/", {
+                "name": f"Клиент {i}",
+                "text": "Отличная стрижка, мастер внимательный, все сделал быстро.",
+                "master": self.masters[i % len(self.masters)].pk,
+                "rating": 5,
+            })
+            self.assertEqual(response.status_code, 302, response.content[:500])
+        elapsed = (timer.perf_counter() - start) * 1000
+        self.assertEqual(Review.objects.count(), reviews + self.REPEAT * 4)
+        self.check_timing("review_post", elapsed / (self.REPEAT * 4))
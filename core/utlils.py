@@ -1,30 +1,201 @@
-import os
+import asyncio
+import hashlib
+import logging
+import re
+from collections import Counter, OrderedDict
+from types import SimpleNamespace
+
 from mistralai import Mistral
 from django.conf import settings
-from .prompts import MISTRAL_REVIEW_PROMPT
+from django.core.cache import cache
+from .prompts import MISTRAL_REVIEW_PROMPT, PREFILTER_LINK_PATTERNS, PREFILTER_PATTERNS
+from .models import ModerationVerdict
+
+logger = logging.getLogger(__name__)
 
 MISTRAL_API_KEY = settings.MISTRAL_API_KEY
 MISTRAL_MODEL = settings.MISTRAL_MODEL
 
-def check_review(review_text):
-    # Инициализация клиента
-    client = Mistral(api_key=MISTRAL_API_KEY)
+# Один клиент на процесс: внутри у него пул HTTP-соединений
+_client = None
+
+
+def get_mistral_client():
+    global _client
+    if _client is None:
+        _client = Mistral(api_key=MISTRAL_API_KEY)
+    return _client
+
+
+def build_messages(review_text):
     prompt = MISTRAL_REVIEW_PROMPT.format(review_text=review_text)
-    chat_response = client.chat.complete(
-        model=MISTRAL_MODEL,
-        messages=[
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ]
-    )
-    response_text = chat_response.choices[0].message.content.lower()
+    return [
+        {
+            "role": "user",
+            "content": prompt
+        }
+    ]
+
+
+def parse_verdict(response_text):
+    """Ответ модели -> True (отзыв корректный) / False"""
+    response_text = response_text.lower()
     # Вывод в консоль ответа
-    print(response_text)
-    if "true" in response_text.lower():
+    logger.debug(response_text)
+    if "true" in response_text:
         return True
-    elif "false" in response_text.lower():
+    elif "false" in response_text:
         return False
     else:
-        return False
\ No newline at end of file
+        return False
+
+
+# Счетчики кэша модерации: сколько отзывов отсеяно фильтром,
+# сколько вердиктов взято из памяти / БД и сколько ушло в Mistral.
+# Хранятся в общем кэше (как лимиты в core/ratelimit.py), поэтому их видит
+# любой процесс: manage.py moderate_reviews --stats
+MODERATION_STATS = ("prefilter", "memory_hit", "db_hit", "miss")
+
+
+def count_moderation(counts):
+    """Прибавить {счетчик: n} к счетчикам кэша модерации"""
+    for name, n in counts.items():
+        if n:
+            key = f"moderation-stats:{name}"
+            cache.add(key, 0, None)
+            cache.incr(key, n)
+
+
+def moderation_stats():
+    """{счетчик: значение} с момента запуска кэша"""
+    values = cache.get_many([f"moderation-stats:{name}" for name in MODERATION_STATS])
+    return {name: values.get(f"moderation-stats:{name}", 0) for name in MODERATION_STATS}
+
+# Все шаблоны фильтра собраны в одно регулярное выражение:
+# текст просматривается за один проход, без вызова модели
+PREFILTER_RE = re.compile("|".join(PREFILTER_PATTERNS), re.IGNORECASE)
+PREFILTER_LINK_RE = re.compile("|".join(PREFILTER_LINK_PATTERNS), re.IGNORECASE)
+
+
+def normalize_review_text(text):
+    """Нижний регистр, ё -> е, все кроме букв и цифр -> один пробел"""
+    text = text.lower().replace("ё", "е")
+    return " ".join(re.findall(r"\w+", text))
+
+
+def review_text_hash(text):
+    return hashlib.sha256(normalize_review_text(text).encode()).hexdigest()
+
+
+def prefilter_reject(text):
+    """True, если отзыв точно некорректный (мат, ссылки, реклама)"""
+    return (
+        PREFILTER_RE.search(normalize_review_text(text)) is not None
+        or PREFILTER_LINK_RE.search(text.lower()) is not None
+    )
+
+
+class VerdictCache:
+    """Ограниченный LRU-кэш вердиктов в памяти процесса: {хэш: вердикт}"""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+    def get(self, key):
+        if key not in self.data:
+            return None
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def set(self, key, verdict):
+        self.data[key] = verdict
+        self.data.move_to_end(key)
+        if len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+
+verdict_cache = VerdictCache()
+
+
+def cached_verdicts(texts):
+    """
+    Вердикты, которые известны без обращения к модели: {хэш: вердикт}.
+    Порядок проверки: фильтр -> кэш в памяти -> таблица ModerationVerdict (один запрос).
+    """
+    found = {}
+    missing = set()
+    stats = Counter()
+    for text in texts:
+        key = review_text_hash(text)
+        if key in found or key in missing:
+            continue
+        if prefilter_reject(text):
+            stats["prefilter"] += 1
+            found[key] = False
+        elif (verdict := verdict_cache.get(key)) is not None:
+            stats["memory_hit"] += 1
+            found[key] = verdict
+        else:
+            missing.add(key)
+    if missing:
+        for key, verdict in ModerationVerdict.objects.filter(text_hash__in=missing).values_list(
+            "text_hash", "verdict"
+        ):
+            stats["db_hit"] += 1
+            verdict_cache.set(key, verdict)
+            found[key] = verdict
+            missing.discard(key)
+    stats["miss"] += len(missing)
+    count_moderation(stats)
+    return found
+
+
+def remember_verdicts(verdicts):
+    """Сохранить ответы модели {хэш: вердикт} в память и в БД"""
+    for key, verdict in verdicts.items():
+        verdict_cache.set(key, verdict)
+    ModerationVerdict.objects.bulk_create(
+        [ModerationVerdict(text_hash=key, verdict=verdict) for key, verdict in verdicts.items()],
+        ignore_conflicts=True,
+    )
+
+
+async def check_review_async(review_text, client=None, timeout=30):
+    """
+    Асинхронная проверка отзыва моделью, timeout в секундах.
+    Кэш здесь не используется: воркер сам проверяет его для всей пачки сразу.
+    """
+    client = client or get_mistral_client()
+    chat_response = await asyncio.wait_for(
+        client.chat.complete_async(
+            model=MISTRAL_MODEL,
+            messages=build_messages(review_text),
+            timeout_ms=int(timeout * 1000),
+        ),
+        timeout,
+    )
+    return parse_verdict(chat_response.choices[0].message.content)
+
+
+class FakeMistral:
+    """
+    Заглушка клиента Mistral для работы без сети и API-ключа.
+    Отвечает одним и тем же вердиктом, delay - имитация задержки модели в секундах.
+    """
+
+    def __init__(self, verdict=True, delay=0):
+        self.verdict = verdict
+        self.delay = delay
+        self.calls = 0
+        self.chat = self
+
+    def _response(self):
+        self.calls += 1
+        message = SimpleNamespace(content=str(self.verdict))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+    async def complete_async(self, **kwargs):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return self._response()
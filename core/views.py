@@ -1,18 +1,27 @@
 
 from django.shortcuts import redirect
 from django.views.generic.edit import CreateView
-from .models import Master, Service, Visit
+from .models import Master, Visit
 from .forms import VisitForm, ReviewForm
+from .availability import next_free, valid_until
+from .catalog import get_catalog
+from .ratings import get_ratings
+from .reviews import reviews_feed
+from .scheduling import SlotTaken, reserve
+from .search import search_visits
+from .pagination import CURSOR_VAR, KeysetPaginator
 from django.views.generic import ListView, TemplateView
 from django.shortcuts import redirect
-from django.db.models import Q
+from django.db import transaction
+from django.views import View
+from asgiref.sync import sync_to_async
 
 MENU = [
     {'title': 'Главная', 'url': '/', 'active': True},
     {'title': 'Мастера', 'url': '#masters', 'active': True},
     {'title': 'Услуги', 'url': '#services', 'active': True},
-    # {'title': 'Отзывы', 'url': '#reviews', 'active': True},
-    # {'title': 'Оставить отзыв', 'url': '/review/create/', 'active': True},
+    {'title': 'Отзывы', 'url': '#reviews', 'active': True},
+    {'title': 'Оставить отзыв', 'url': '/review/create/', 'active': True},
     {'title': 'Запись на стрижку', 'url': '#orderForm', 'active': True},
 ]   
 
@@ -28,14 +37,96 @@ class IndexView(CreateView):
     success_url = 'thanks'
     model = Visit
 
+    def get_form(self, form_class=None):
+        form = super().get_form(form_class)
+        # Варианты выбора берем из кэша каталога, чтобы форма
+        # не делала отдельные запросы за мастерами и услугами
+        catalog = get_catalog()
+        form.fields['master'].choices = [('', form.fields['master'].empty_label)] + [
+            (master.pk, str(master)) for master in catalog['masters']
+        ]
+        form.fields['services'].choices = [
+            (service.pk, str(service)) for service in catalog['services']
+        ]
+        return form
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        catalog = get_catalog()
+        ratings = get_ratings()
+        free = next_free([master.pk for master in catalog['masters']])
+        # Кэш страниц (core/middleware.py) не должен показывать время, которое уже прошло
+        self.request.page_cache_expires = valid_until(free)
+        # Мастера из кэша каталога - копии, рейтинг и время можно добавить прямо в них
+        for master in catalog['masters']:
+            master.rating = ratings.get(master.pk)
+            master.next_free = free.get(master.pk)
         context['menu'] = MENU
-        context['masters'] = Master.objects.all()
-        context['services'] = Service.objects.all()
+        context['masters'] = catalog['masters']
+        context['services'] = catalog['services']
+        # HTML первой страницы отзывов берется из кэша (core/reviews.py)
+        context['reviews'] = reviews_feed()
         return context
 
-
+    def form_valid(self, form):
+        # Запись, ее услуги, занятое время мастера и уведомление в очереди
+        # сохраняются одной транзакцией: если время успели занять, откатывается все
+        try:
+            with transaction.atomic():
+                response = super().form_valid(form)
+                reserve(self.object)
+        except SlotTaken as e:
+            form.add_error('start_at', str(e))
+            return self.form_invalid(form)
+        return response
+
+
+class AsyncBookingView(View):
+    """
+    Асинхронный вариант записи (POST из формы главной страницы) для запуска под ASGI.
+    Проверка формы и сохранение выполняются в потоке через sync_to_async, сам
+    обработчик не блокирует цикл событий. Запись, ее услуги и время мастера
+    сохраняются одной транзакцией, как в IndexView: если время заняли, вместе с
+    записью откатываются уведомление в очереди и пересчитанная статистика.
+    """
+    http_method_names = ['post']
+
+    async def post(self, request, *args, **kwargs):
+        # Форма и страница с ошибками - те же, что у IndexView под WSGI
+        page = IndexView(object=None)
+        page.setup(request, *args, **kwargs)
+        form = await sync_to_async(page.get_form)()
+        # Проверка полей master/services делает запросы к БД
+        if not await sync_to_async(form.is_valid)():
+            return await sync_to_async(self.form_invalid)(page, form)
+
+        try:
+            await sync_to_async(self.save_visit)(form.cleaned_data)
+        except SlotTaken as e:
+            form.add_error('start_at', str(e))
+            return await sync_to_async(self.form_invalid)(page, form)
+        return redirect('thanks')
+
+    @staticmethod
+    def save_visit(data):
+        with transaction.atomic():
+            visit = Visit.objects.create(
+                name=data['name'],
+                phone=data['phone'],
+                comment=data['comment'],
+                master=data['master'],
+                start_at=data['start_at'],
+            )
+            visit.services.set(data['services'])
+            reserve(visit)
+        return visit
+
+    @staticmethod
+    def form_invalid(page, form):
+        response = page.form_invalid(form)
+        response.status_code = 400
+        # Рендер тоже в потоке: шаблон может обращаться к БД
+        return response.render()
 
 
 class VisitListView(ListView):
@@ -46,15 +137,15 @@ class VisitListView(ListView):
 
     def get_queryset(self):
         """Формируем QuerySet с учетом поиска и фильтрации по мастеру"""
-        queryset = Visit.objects.all().order_by('-created_at')
+        queryset = Visit.objects.select_related('master').order_by('-created_at')
 
         # Получаем параметры из GET-запроса
         search_query = self.request.GET.get('q', '')
         master_id = self.request.GET.get('master', '')
 
-        # Фильтрация по поисковому запросу (имя или телефон)
+        # Фильтрация по поисковому запросу (имя или телефон), по индексам
         if search_query:
-            queryset = queryset.filter(Q(name__icontains=search_query) | Q(phone__icontains=search_query))
+            queryset = search_visits(queryset, search_query)
 
         # Фильтрация по мастеру
         if master_id:
@@ -62,6 +153,12 @@ class VisitListView(ListView):
 
         return queryset
 
+    def paginate_queryset(self, queryset, page_size):
+        """Страницы по курсору (created_at, id): глубина страницы не влияет на скорость"""
+        paginator = KeysetPaginator(queryset, page_size)
+        page = paginator.page(self.request.GET.get(CURSOR_VAR))
+        return paginator, page, page.object_list, page.has_other_pages()
+
     def get_context_data(self, **kwargs):
         """Добавляем в контекст список мастеров и текущие фильтры"""
         context = super().get_context_data(**kwargs)
@@ -85,4 +182,15 @@ class ReviewCreateView(CreateView):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context['menu'] = MENU
-        return context
\ No newline at end of file
+        return context
+
+
+class ReviewListView(TemplateView):
+    """Все опубликованные отзывы, страницы по курсору"""
+    template_name = 'review_list.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context['menu'] = MENU
+        context['feed'] = reviews_feed(self.request.GET.get(CURSOR_VAR))
+        return context
@@ -0,0 +1,142 @@
+// Графики панели аналитики (admin/core/dashboard.html) на canvas, без внешних
+// библиотек. Данные - json_script "dashboard-data" из core/rollups.py dashboard_data.
+(function () {
+    "use strict";
+
+    const COLORS = {revenue: "#f39c12", visits: "#3498db", completed: "#00bc8c", cancelled: "#e74c3c"};
+    const TEXT = "#999";
+    const GRID = "rgba(153, 153, 153, 0.3)";
+
+    // Размер canvas по ширине карточки, с учетом плотности пикселей экрана
+    function prepare(canvas, height) {
+        const ratio = window.devicePixelRatio || 1;
+        const width = canvas.parentElement.clientWidth;
+        canvas.style.width = width + "px";
+        canvas.style.height = height + "px";
+        canvas.width = width * ratio;
+        canvas.height = height * ratio;
+        const ctx = canvas.getContext("2d");
+        ctx.setTransform(ratio, 0, 0, ratio, 0, 0);
+        ctx.font = "12px sans-serif";
+        return {ctx, width, height};
+    }
+
+    // Верх шкалы: 1, 2 или 5 * 10^n не меньше value
+    function niceMax(value) {
+        if (value <= 0) {
+            return 1;
+        }
+        const step = Math.pow(10, Math.floor(Math.log10(value)));
+        return [1, 2, 5, 10].map((k) => k * step).find((top) => top >= value);
+    }
+
+    function number(value) {
+        return Math.round(value).toLocaleString("ru-RU");
+    }
+
+    function legend(ctx, items, x, y) {
+        ctx.textAlign = "left";
+        for (const [label, color] of items) {
+            ctx.fillStyle = color;
+            ctx.fillRect(x, y - 9, 12, 10);
+            ctx.fillStyle = TEXT;
+            ctx.fillText(label, x + 16, y);
+            x += ctx.measureText(label).width + 32;
+        }
+    }
+
+    // Выручка столбцами по левой оси, записи линиями по правой
+    function daysChart(canvas, data) {
+        const {ctx, width, height} = prepare(canvas, 320);
+        const left = 70, right = 40, top = 30, bottom = 30;
+        const plotWidth = width - left - right, plotHeight = height - top - bottom;
+        const slot = plotWidth / Math.max(1, data.days.length);
+        const revenueMax = niceMax(Math.max(0, ...data.revenue));
+        const visitsMax = niceMax(Math.max(0, ...data.visits));
+        const y = (value, max) => top + plotHeight - value / max * plotHeight;
+
+        ctx.strokeStyle = GRID;
+        ctx.fillStyle = TEXT;
+        for (let i = 0; i <= 4; i++) {
+            const level = top + plotHeight * i / 4;
+            ctx.beginPath();
+            ctx.moveTo(left, level);
+            ctx.lineTo(left + plotWidth, level);
+            ctx.stroke();
+            ctx.textAlign = "right";
+            ctx.fillText(number(revenueMax * (4 - i) / 4), left - 6, level + 4);
+            ctx.textAlign = "left";
+            ctx.fillText(number(visitsMax * (4 - i) / 4), left + plotWidth + 6, level + 4);
+        }
+
+        ctx.fillStyle = COLORS.revenue;
+        data.revenue.forEach((value, i) => {
+            const barTop = y(value, revenueMax);
+            ctx.fillRect(left + i * slot + slot * 0.15, barTop, slot * 0.7, top + plotHeight - barTop);
+        });
+        ctx.lineWidth = 2;
+        for (const key of ["visits", "completed", "cancelled"]) {
+            ctx.strokeStyle = COLORS[key];
+            ctx.beginPath();
+            data[key].forEach((value, i) => {
+                const x = left + i * slot + slot / 2;
+                if (i) {
+                    ctx.lineTo(x, y(value, visitsMax));
+                } else {
+                    ctx.moveTo(x, y(value, visitsMax));
+                }
+            });
+            ctx.stroke();
+        }
+
+        // Подписи дней - столько, сколько помещается по ширине
+        ctx.fillStyle = TEXT;
+        ctx.textAlign = "center";
+        const every = Math.ceil(data.days.length / Math.max(1, Math.floor(plotWidth / 60)));
+        data.days.forEach((day, i) => {
+            if (i % every === 0) {
+                ctx.fillText(day, left + i * slot + slot / 2, top + plotHeight + 18);
+            }
+        });
+        legend(ctx, [
+            ["Выручка, ₽", COLORS.revenue],
+            ["Записей", COLORS.visits],
+            ["Выполнено", COLORS.completed],
+            ["Отменено", COLORS.cancelled],
+        ], left, 16);
+    }
+
+    // Горизонтальные столбцы выручки с подписями слева
+    function barsChart(canvas, series) {
+        const row = 28;
+        const {ctx, width} = prepare(canvas, Math.max(1, series.labels.length) * row + 20);
+        const labelWidth = Math.max(0, ...series.labels.map((label) => ctx.measureText(label).width));
+        const left = Math.min(width / 3, labelWidth + 10);
+        const plotWidth = width - left - 90;
+        const max = niceMax(Math.max(0, ...series.revenue));
+
+        ctx.textBaseline = "middle";
+        series.labels.forEach((label, i) => {
+            const middle = 10 + i * row + row / 2;
+            const barWidth = plotWidth * series.revenue[i] / max;
+            ctx.fillStyle = TEXT;
+            ctx.textAlign = "right";
+            ctx.fillText(label, left - 8, middle, left - 8);
+            ctx.fillStyle = COLORS.revenue;
+            ctx.fillRect(left, middle - row * 0.35, barWidth, row * 0.7);
+            ctx.fillStyle = TEXT;
+            ctx.textAlign = "left";
+            ctx.fillText(number(series.revenue[i]) + " ₽", left + barWidth + 6, middle);
+        });
+    }
+
+    function draw() {
+        const data = JSON.parse(document.getElementById("dashboard-data").textContent);
+        daysChart(document.getElementById("chart-days"), data);
+        barsChart(document.getElementById("chart-masters"), data.masters);
+        barsChart(document.getElementById("chart-services"), data.services);
+    }
+
+    document.addEventListener("DOMContentLoaded", draw);
+    window.addEventListener("resize", draw);
+})();